@@ -4,6 +4,7 @@ Provides a chat-based UI for the farming operations assistant.
 """
 import streamlit as st
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -43,8 +44,13 @@ def check_credentials():
 check_credentials()
 
 # Import after credentials check
-from main import classifier_chain, log_flow, query_flow, report_flow, general_flow
+from main import classify_with_prefetch, dispatch_stream
 from db_storage import read_logs
+from metrics import request_trace, start_metrics_server
+from profiling import profile_request
+
+# Prometheus endpoint (only when AGRI_METRICS_PORT is set; started once per process)
+start_metrics_server()
 
 st.title("🤖 Agri-Agent")
 st.caption("Your AI Farming Partner")
@@ -97,26 +103,26 @@ else:
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    intent = classifier_chain.invoke({"user_input": prompt}).strip()
+            try:
+                started_at = time.perf_counter()
+                # Per-request trace: stage latencies, LLM tokens, cache hits (see metrics.py),
+                # plus a cProfile dump if this request is selected (see profiling.py)
+                with request_trace(st.session_state.user_id) as trace, \
+                        profile_request(st.session_state.user_id, trace):
+                    with st.spinner("Thinking..."):
+                        # DB context for QUERY/REPORT is prefetched while the router runs
+                        intent, context = classify_with_prefetch(prompt, st.session_state.user_id)
                     # Optional: Show intent in sidebar for debugging
                     # st.sidebar.text(f"Intent: {intent}")
 
-                    output = ""
-                    if intent == "LOG":
-                        output = log_flow(prompt, user_id=st.session_state.user_id)
-                    elif intent == "QUERY":
-                        output = query_flow(prompt, user_id=st.session_state.user_id)
-                    elif intent == "REPORT":
-                        output = report_flow(prompt, user_id=st.session_state.user_id)
-                    else: # GENERAL
-                        output = general_flow(prompt)
-                    
-                    st.markdown(output)
-                    st.session_state.messages.append({"role": "assistant", "content": output})
-
-                except Exception as e:
-                    error_message = f"⚠️ An error occurred: {str(e)}"
-                    st.error(error_message)
-                    st.session_state.messages.append({"role": "assistant", "content": error_message})
+                    # Render tokens incrementally as the workflow streams them
+                    output = st.write_stream(
+                        dispatch_stream(intent, prompt, st.session_state.user_id, started_at, context=context)
+                    )
+
+                st.session_state.messages.append({"role": "assistant", "content": output})
+
+            except Exception as e:
+                error_message = f"⚠️ An error occurred: {str(e)}"
+                st.error(error_message)
+                st.session_state.messages.append({"role": "assistant", "content": error_message})
@@ -0,0 +1,8 @@
+"""
+Offline Benchmark Suite
+Measures db_storage and workflow latency/throughput over synthetic histories
+(10 to 1M rows) with a deterministic stand-in LLM, so no network is needed.
+
+Run with `python -m benchmarks --help`; the concurrent multi-user load test is
+`python -m benchmarks.loadgen --help`.
+"""
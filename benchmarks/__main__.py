@@ -0,0 +1,96 @@
+"""
+Benchmark CLI
+
+Usage:
+    python -m benchmarks                                        # 10, 1k, 100k rows; instant LLM
+    python -m benchmarks --sizes 10,1000,100000,1000000 --output bench/baseline.json
+    python -m benchmarks --llm-latency 0.3 --tokens-per-sec 40  # realistic LLM timing
+    python -m benchmarks --only db. --compare bench/baseline.json --threshold 0.2
+                                                                # exit 1 on a >20% slowdown
+
+Databases are created in a temporary directory, never in ./data. The result
+cache is disabled (repeated calls would only measure cache hits) unless
+--with-cache is given.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+
+def _sizes(value: str):
+    return [int(size.replace("_", "")) for size in value.split(",") if size.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Offline benchmarks for db_storage and the workflows")
+    parser.add_argument("--sizes", type=_sizes, default=[10, 1000, 100000],
+                        help="Comma-separated history sizes in rows (default 10,1000,100000)")
+    parser.add_argument("--iterations", type=int, default=50, help="Max timed calls per case (default 50)")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="Time budget per case (default 5)")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Fake LLM seconds to first token (default 0)")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0,
+                        help="Fake LLM generation rate, 0 = instant (default 0)")
+    parser.add_argument("--only", help="Only cases whose name starts with this, e.g. db. or workflow.query")
+    parser.add_argument("--with-cache", action="store_true", help="Leave the result cache enabled")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown vs. baseline as a fraction (default 0.2)")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "mean_ms"],
+                        help="Latency field compared against the baseline (default p50_ms)")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args(argv)
+
+    # Resolve paths before moving into the scratch directory
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    # Settings read at import time; the profiler and traces would skew timings
+    if not args.with_cache:
+        os.environ["AGRI_RESULT_CACHE_ENABLED"] = "0"
+    os.environ["AGRI_PROFILE_SAMPLE_RATE"] = "0"
+    os.environ["AGRI_PROFILE_USERS"] = ""
+    os.environ["AGRI_TRACE_PATH"] = ""
+
+    with tempfile.TemporaryDirectory(prefix="agri-bench-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # db_storage and result_cache use paths relative to ./data
+        try:
+            from benchmarks.runner import compare_results, load_results, run_benchmarks, save_results
+            from db_storage import close_all_connections
+
+            print(f"⏱️  Benchmarking sizes {', '.join(f'{n:,}' for n in args.sizes)} "
+                  f"(LLM latency {args.llm_latency}s, {args.tokens_per_sec or 'instant'} tokens/s)")
+            results = run_benchmarks(args.sizes, args.iterations, args.max_seconds,
+                                     args.llm_latency, args.tokens_per_sec, args.only, args.quiet)
+            close_all_connections()
+        finally:
+            os.chdir(cwd)
+
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        save_results(results, output)
+        print(f"\n💾 Saved {len(results['results'])} results to {output}")
+
+    if not compare:
+        return 0
+    rows = compare_results(results, load_results(compare), args.threshold, args.metric)
+    print(f"\n📊 Compared with {compare} ({args.metric}, threshold {args.threshold:.0%}):")
+    for row in rows:
+        size = f"n={row['rows']:,}" if row["rows"] is not None else "-"
+        flag = "❌" if row["regressed"] else "✓"
+        print(f"  {flag} {row['name']:<30} {size:>12}  {row['baseline']:>10.3f} → "
+              f"{row['current']:>10.3f} ms  ({row['ratio']:.2f}x)")
+    regressions = [row for row in rows if row["regressed"]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ No regressions ({len(rows)} cases compared)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
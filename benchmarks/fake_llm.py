@@ -0,0 +1,158 @@
+"""
+Deterministic Stand-in LLM
+A local LangChain LLM that answers from canned outputs with simulated latency
+and token rate, so workflows can be benchmarked offline.
+
+The output is chosen by the first marker found in the prompt (see
+DEFAULT_RESPONSES) and may be a string or a function of the prompt. Time to
+first token is `latency` seconds, then tokens arrive at `tokens_per_sec`
+(0 = instantly). Stop sequences are honoured.
+
+Usage:
+    install_fake_llm(latency=0.3, tokens_per_sec=40)   # get_llm_instance() now returns fakes
+    ...
+    restore_llms(previous)
+"""
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+import langchain_config
+
+_TOKEN = re.compile(r"\s*\S+")
+
+Response = Union[str, Callable[[str], str]]
+
+# (prompt marker, output) — matched in order, first hit wins
+DEFAULT_RESPONSES: List[Tuple[str, Response]] = [
+    # Combined router (AGRI_ROUTER_MODE=combined)
+    ("extract the activities",
+     '{"intent": "LOG", "activities": [{"action": "sale", "item": "tomatoes", "quantity": 50, '
+     '"unit": "pounds", "value_usd": 75, "note": "farmers market"}]}\n\nNote: quantity assumed'),
+    # Two-step router
+    ("You are an expert routing agent", "LOG"),
+    # LOG extraction (trailing commentary exercises the early stream stop)
+    ("You are a data entry assistant",
+     '[{"action": "sale", "item": "tomatoes", "quantity": 50, "unit": "pounds", "value_usd": 75, '
+     '"note": "farmers market"}, {"action": "purchase", "item": "chicken feed", "value_usd": 60}]'
+     "\n\nNote: I assumed both activities happened today."),
+    # REPORT
+    ("farm business analyst",
+     "## Farm Report\n\n**Income:** Sales totalled $1,240 across 18 entries, led by tomatoes "
+     "($420) and eggs ($310).\n\n**Expenses:** $560 in purchases and expenses, mostly feed and "
+     "fuel.\n\n**Net income:** $680.\n\n**Trends:** Sales rose through the period while costs "
+     "stayed flat. Harvest volumes for potatoes and carrots were the highest.\n\n"
+     "**Recommendations:**\n- Expand tomato and egg sales at the farmers market.\n"
+     "- Buy feed in bulk to lower the per-bag cost.\n- Track fuel use per field."),
+    # QUERY (RAG fallback)
+    ("Answer the user's question based *only*",
+     "Based on your logs, you sold tomatoes three times, for a total of $210, most recently "
+     "at the farmers market."),
+    # GENERAL
+    ("Provide a clear and concise answer",
+     "Plant garlic in the fall, about four to six weeks before the ground freezes. Set cloves "
+     "pointed end up, 2 inches deep and 6 inches apart, and mulch well over winter."),
+]
+
+
+class BenchmarkLLM(LLM):
+    """Fake LLM with canned, prompt-matched outputs and simulated latency/throughput."""
+
+    model_id: str = "benchmark-fake"
+    latency: float = 0.0
+    tokens_per_sec: float = 0.0
+    responses: List[Tuple[str, Any]] = DEFAULT_RESPONSES
+    default_response: str = "GENERAL"
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_id": self.model_id, "latency": self.latency, "tokens_per_sec": self.tokens_per_sec}
+
+    def respond(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        """Returns the canned output for the prompt, cut at the first stop sequence."""
+        output = next((output for marker, output in self.responses if marker in prompt), self.default_response)
+        text = output(prompt) if callable(output) else output
+        cuts = [text.find(s) for s in stop or [] if s in text]
+        return text[:min(cuts)] if cuts else text
+
+    def _token_delays(self, text: str) -> Iterator[Tuple[str, float]]:
+        """Yields (token, seconds after the call started that it is due)."""
+        for i, token in enumerate(_TOKEN.findall(text)):
+            yield token, self.latency + (i / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0)
+
+    def _duration(self, text: str) -> float:
+        count = len(_TOKEN.findall(text))
+        return self.latency + (count / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        text = self.respond(prompt, stop)
+        time.sleep(self._duration(text))
+        return text
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        text = self.respond(prompt, stop)
+        await asyncio.sleep(self._duration(text))
+        return text
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        started = time.perf_counter()
+        for token, due in self._token_delays(self.respond(prompt, stop)):
+            # Sleep to an absolute deadline so per-token sleep overhead doesn't accumulate
+            wait = started + due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        started = time.perf_counter()
+        for token, due in self._token_delays(self.respond(prompt, stop)):
+            wait = started + due - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+
+
+def install_fake_llm(latency: float = 0.0, tokens_per_sec: float = 0.0,
+                     responses: Optional[List[Tuple[str, Response]]] = None) -> Tuple[Any, Any]:
+    """
+    Makes langchain_config.get_llm_instance() return BenchmarkLLM instances.
+    Workflows import get_llm_instance by name, so the lazy llm_small/llm_large
+    singletons are replaced rather than the function (metrics wrapping still applies).
+
+    Args:
+        latency: Seconds before the first token
+        tokens_per_sec: Simulated generation rate (0 = instant)
+        responses: (prompt marker, output or output function) pairs, defaults to DEFAULT_RESPONSES
+
+    Returns:
+        The previous (llm_small, llm_large), for restore_llms()
+    """
+    previous = (langchain_config.llm_small, langchain_config.llm_large)
+    settings = {"latency": latency, "tokens_per_sec": tokens_per_sec,
+                "responses": responses or DEFAULT_RESPONSES}
+    langchain_config.llm_small = BenchmarkLLM(model_id="fake-small", **settings)
+    langchain_config.llm_large = BenchmarkLLM(model_id="fake-large", **settings)
+    return previous
+
+
+def restore_llms(previous: Tuple[Any, Any]):
+    """Puts back the LLM singletons returned by install_fake_llm()."""
+    langchain_config.llm_small, langchain_config.llm_large = previous
@@ -0,0 +1,395 @@
+"""
+Concurrent Load Generator
+Simulates many farmers using the app at once and reports throughput, latency
+percentiles, SQLite lock errors and the user count where throughput stops scaling.
+
+Each simulated user is a closed loop: pick a message from the intent mix, send
+it through the request pipeline, think, repeat. Pipelines (--mode):
+    app    one thread per user, classify_with_prefetch + streamed dispatch (as app.py)
+    sync   one thread per user, main.route (as the CLI)
+    async  one event loop, main.aroute
+
+The LLM is BenchmarkLLM, answering the router with each message's intended
+class, unless --replay serves a recorded cassette (AGRI_LLM_MODE=replay; only
+prompts recorded earlier can be answered). Users get synthetic histories in a
+temporary directory, so ./data is never touched.
+
+Usage:
+    python -m benchmarks.loadgen --users 1,2,4,8,16,32 --duration 20
+    python -m benchmarks.loadgen --users 50 --mode async --mix LOG=0.6,QUERY=0.4
+    python -m benchmarks.loadgen --users 8,16,32 --backend shared --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Messages per intent; LOG and QUERY each mix locally handled and LLM-handled inputs
+MESSAGES = {
+    "LOG": [
+        "sold 20 lbs of tomatoes for $30",
+        "harvested 100 pounds of potatoes from the west field",
+        "spent $45 on tractor fuel",
+        "bought 3 bags of chicken feed for $84",
+        "sold 30 lbs carrots for $45 and bought feed for $60",
+        "the market stand brought in a good amount today, mostly tomatoes",
+    ],
+    "QUERY": [
+        "how much did I earn from tomatoes last month?",
+        "how many pounds of potatoes did I harvest this year?",
+        "what was my biggest sale?",
+        "how much did I spend this week?",
+        "who did I sell tomatoes to most recently?",
+        "what did the co-op buy from me?",
+    ],
+    "REPORT": [
+        "give me my sales report for this month",
+        "i need a breakdown of my income sources",
+        "summarize my expenses for the last 3 months",
+    ],
+    "GENERAL": [
+        "when should I plant garlic?",
+        "how do I keep aphids off my kale?",
+        "hello, what can you do?",
+    ],
+}
+DEFAULT_MIX = {"LOG": 0.4, "QUERY": 0.3, "REPORT": 0.1, "GENERAL": 0.2}
+
+_LOCK_ERRORS = ("database is locked", "database table is locked")
+
+_TWO_STEP_INPUT = re.compile(r'Request: "(.*)"\s*Classification:\s*$', re.S)
+_COMBINED_INPUT = re.compile(r"Human: ([^\n]*)\nAI:\s*$")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parses "LOG=0.4,QUERY=0.3,..." into normalized weights."""
+    mix = {}
+    for part in value.split(","):
+        intent, _, weight = part.partition("=")
+        intent = intent.strip().upper()
+        if intent not in MESSAGES:
+            raise argparse.ArgumentTypeError(f"Unknown intent {intent!r} (use {', '.join(MESSAGES)})")
+        mix[intent] = float(weight)
+    total = sum(mix.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("Mix weights must add up to more than 0")
+    return {intent: weight / total for intent, weight in mix.items()}
+
+
+def router_responses(intents: Dict[str, str]) -> List[Tuple[str, Callable[[str], str]]]:
+    """
+    Router outputs for BenchmarkLLM that classify each corpus message as its intent
+    (two-step: the intent word; combined: JSON with locally parsed activities for LOG).
+    """
+    from workflows.log_parser import parse_activities
+
+    def two_step(prompt: str) -> str:
+        match = _TWO_STEP_INPUT.search(prompt)
+        return intents.get(match.group(1) if match else "", "GENERAL")
+
+    def combined(prompt: str) -> str:
+        match = _COMBINED_INPUT.search(prompt)
+        text = match.group(1) if match else ""
+        intent = intents.get(text, "GENERAL")
+        if intent != "LOG":
+            return json.dumps({"intent": intent})
+        activities = parse_activities(text) or [{"action": "sale", "item": "tomatoes", "value_usd": 75}]
+        return json.dumps({"intent": "LOG", "activities": activities})
+
+    return [("extract the activities", combined), ("You are an expert routing agent", two_step)]
+
+
+class LoadStats:
+    """Thread-safe collector for one load level."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.ttfts: List[float] = []
+        self.errors = Counter()
+        self.failed = 0
+        self.lock_errors = 0
+
+    def ok(self, intent: str, seconds: float, output: str, ttft: Optional[float] = None):
+        with self._lock:
+            self.latencies.setdefault(intent, []).append(seconds)
+            if ttft is not None:
+                self.ttfts.append(ttft)
+            # Workflows report some database failures as a message instead of raising
+            if any(marker in output for marker in _LOCK_ERRORS):
+                self.lock_errors += 1
+                self.errors["database is locked (reported)"] += 1
+
+    def error(self, intent: str, error: Exception):
+        with self._lock:
+            if any(marker in str(error) for marker in _LOCK_ERRORS):
+                self.lock_errors += 1
+            self.errors[type(error).__name__] += 1
+            self.failed += 1
+
+    def summary(self, users: int, elapsed: float) -> Dict:
+        from metrics import quantile
+
+        with self._lock:
+            everything = [s for samples in self.latencies.values() for s in samples]
+            percentiles = lambda values: {
+                "p50": round(quantile(values, 0.5) * 1000, 1), "p95": round(quantile(values, 0.95) * 1000, 1),
+                "p99": round(quantile(values, 0.99) * 1000, 1), "max": round(max(values, default=0) * 1000, 1),
+            }
+            return {
+                "users": users,
+                "requests": len(everything) + self.failed,
+                "completed": len(everything),
+                "errors": sum(self.errors.values()),
+                "lock_errors": self.lock_errors,
+                "error_types": dict(self.errors),
+                "duration_s": round(elapsed, 2),
+                "throughput_rps": round(len(everything) / elapsed, 2) if elapsed else 0.0,
+                "latency_ms": percentiles(everything),
+                "ttft_ms": percentiles(self.ttfts) if self.ttfts else None,
+                "by_intent": {intent: {"completed": len(samples), **percentiles(samples)}
+                              for intent, samples in sorted(self.latencies.items())},
+            }
+
+
+def _picker(mix: Dict[str, float]) -> Callable[[random.Random], Tuple[str, str]]:
+    intents, weights = list(mix), list(mix.values())
+
+    def pick(rng: random.Random) -> Tuple[str, str]:
+        intent = rng.choices(intents, weights)[0]
+        return intent, rng.choice(MESSAGES[intent])
+    return pick
+
+
+def _think(rng: random.Random, think_time: float) -> float:
+    return rng.expovariate(1 / think_time) if think_time > 0 else 0.0
+
+
+def run_level(users: List[str], duration: float, mix: Dict[str, float], mode: str = "app",
+              think_time: float = 1.0, seed: int = 0) -> Dict:
+    """
+    Runs len(users) concurrent sessions for `duration` seconds.
+
+    Args:
+        users: User ids (one session each; histories should already exist)
+        duration: Seconds during which new requests are started
+        mix: Intent weights (see parse_mix)
+        mode: "app", "sync" or "async" (see module docstring)
+        think_time: Mean pause between a user's requests (exponential), 0 for none
+        seed: Random seed for message choice and think times
+
+    Returns:
+        Summary with throughput, latency/TTFT percentiles, errors and lock errors
+    """
+    import main as pipeline
+    from metrics import request_trace
+    from profiling import profile_request
+
+    stats = LoadStats()
+    pick = _picker(mix)
+
+    def app_request(text: str, user_id: str) -> Tuple[str, Optional[float]]:
+        started, timing = time.perf_counter(), {}
+        with request_trace(user_id) as trace, profile_request(user_id, trace):
+            intent, context = pipeline.classify_with_prefetch(text, user_id)
+            output = "".join(pipeline.dispatch_stream(intent, text, user_id, started, timing, context))
+        return output, timing.get("ttft_s")
+
+    def sync_request(text: str, user_id: str) -> Tuple[str, Optional[float]]:
+        return pipeline.route(text, user_id), None
+
+    def session(user_id: str, rng: random.Random, deadline: float, request):
+        time.sleep(rng.uniform(0, think_time))  # Stagger the first requests
+        while time.perf_counter() < deadline:
+            intent, text = pick(rng)
+            started = time.perf_counter()
+            try:
+                output, ttft = request(text, user_id)
+                stats.ok(intent, time.perf_counter() - started, output, ttft)
+            except Exception as e:
+                stats.error(intent, e)
+            time.sleep(_think(rng, think_time))
+
+    async def asession(user_id: str, rng: random.Random, deadline: float):
+        await asyncio.sleep(rng.uniform(0, think_time))
+        while time.perf_counter() < deadline:
+            intent, text = pick(rng)
+            started = time.perf_counter()
+            try:
+                output = await pipeline.aroute(text, user_id)
+                stats.ok(intent, time.perf_counter() - started, output)
+            except Exception as e:
+                stats.error(intent, e)
+            await asyncio.sleep(_think(rng, think_time))
+
+    async def arun(deadline: float):
+        await asyncio.gather(*(asession(user_id, random.Random(seed * 10007 + i), deadline)
+                               for i, user_id in enumerate(users)))
+
+    started = time.perf_counter()
+    deadline = started + duration
+    if mode == "async":
+        asyncio.run(arun(deadline))
+    else:
+        request = app_request if mode == "app" else sync_request
+        threads = [threading.Thread(target=session, daemon=True,
+                                    args=(user_id, random.Random(seed * 10007 + i), deadline, request))
+                   for i, user_id in enumerate(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return stats.summary(len(users), time.perf_counter() - started)
+
+
+def find_saturation(levels: List[Dict], min_gain: float = 0.1) -> Optional[Dict]:
+    """
+    Finds the first load level where added users stopped adding throughput.
+
+    A step from u1 to u2 users would ideally raise throughput by u2/u1. The system
+    is saturated at the first step that achieves less than `min_gain` of that ideal
+    increase (or where throughput falls).
+
+    Returns:
+        {"users_from", "users_to", "throughput_rps", "efficiency"}, or None if it kept scaling
+    """
+    for before, after in zip(levels, levels[1:]):
+        ideal = before["throughput_rps"] * (after["users"] / before["users"] - 1)
+        if ideal <= 0:
+            continue
+        efficiency = (after["throughput_rps"] - before["throughput_rps"]) / ideal
+        if efficiency < min_gain:
+            return {"users_from": before["users"], "users_to": after["users"],
+                    "throughput_rps": before["throughput_rps"], "efficiency": round(efficiency, 3)}
+    return None
+
+
+def _print_level(level: Dict):
+    latency = level["latency_ms"]
+    ttft = f"  ttft p50 {level['ttft_ms']['p50']:>7.1f}" if level["ttft_ms"] else ""
+    print(f"  {level['users']:>5} users  {level['throughput_rps']:>8.2f} req/s  "
+          f"p50 {latency['p50']:>7.1f}  p95 {latency['p95']:>7.1f}  p99 {latency['p99']:>7.1f} ms{ttft}  "
+          f"errors {level['errors']} (locked {level['lock_errors']})")
+
+
+def _user_counts(value: str) -> List[int]:
+    counts = sorted({int(n) for n in value.split(",") if n.strip()})
+    if not counts or counts[0] < 1:
+        raise argparse.ArgumentTypeError("User counts must be positive integers")
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen",
+                                     description="Concurrent multi-user load test of the request pipeline")
+    parser.add_argument("--users", type=_user_counts, default=[1, 2, 4, 8, 16],
+                        help="Comma-separated concurrent user counts, run in turn (default 1,2,4,8,16)")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per level (default 15)")
+    parser.add_argument("--think-time", type=float, default=1.0,
+                        help="Mean seconds between a user's requests, 0 for none (default 1)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Intent weights (default LOG=0.4,QUERY=0.3,REPORT=0.1,GENERAL=0.2)")
+    parser.add_argument("--mode", choices=["app", "sync", "async"], default="app",
+                        help="Pipeline to drive (default app)")
+    parser.add_argument("--history", type=int, default=500, help="Synthetic rows per user (default 500)")
+    parser.add_argument("--llm-latency", type=float, default=0.3,
+                        help="Stand-in LLM seconds to first token (default 0.3)")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0,
+                        help="Stand-in LLM generation rate, 0 = instant (default 40)")
+    parser.add_argument("--replay", action="store_true",
+                        help="Serve LLM calls from the recorded cassette instead (AGRI_CASSETTE_PATH)")
+    parser.add_argument("--backend", choices=["per_user", "shared"], help="AGRI_DB_BACKEND for the run")
+    parser.add_argument("--router", choices=["two_step", "combined"], help="AGRI_ROUTER_MODE for the run")
+    parser.add_argument("--no-fastpath", action="store_true",
+                        help="Send every request through the LLM router (AGRI_FASTPATH_ENABLED=0)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the result cache")
+    parser.add_argument("--min-gain", type=float, default=0.1,
+                        help="Saturation: a level adding less than this fraction of ideal throughput (default 0.1)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", help="Write level summaries to this JSON file")
+    args = parser.parse_args(argv)
+
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Settings read at import time
+    os.environ["AGRI_ROUTING_PROMPT_PATH"] = os.path.join(repo_dir, "routing_prompt.txt")
+    os.environ["AGRI_TRACE_PATH"] = ""
+    if args.backend:
+        os.environ["AGRI_DB_BACKEND"] = args.backend
+    if args.router:
+        os.environ["AGRI_ROUTER_MODE"] = args.router
+    if args.no_fastpath:
+        os.environ["AGRI_FASTPATH_ENABLED"] = "0"
+    if args.no_cache:
+        os.environ["AGRI_RESULT_CACHE_ENABLED"] = "0"
+    if args.replay:
+        os.environ["AGRI_LLM_MODE"] = "replay"
+        os.environ["AGRI_CASSETTE_PATH"] = os.path.abspath(
+            os.getenv("AGRI_CASSETTE_PATH", os.path.join("data", "cassettes", "llm_cassette.db")))
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="agri-load-") as workdir:
+        try:
+            os.chdir(repo_dir)  # main.py reads its prompt files from the working directory
+            import main as pipeline
+            from benchmarks.fake_llm import DEFAULT_RESPONSES, install_fake_llm
+            from benchmarks.synthetic import seed_history
+            from db_storage import DB_BACKEND, close_all_connections
+            os.chdir(workdir)  # Databases, caches and the fast-path model go to a scratch ./data
+
+            if not args.replay:
+                intents = {text: intent for intent, texts in MESSAGES.items() for text in texts}
+                routers = router_responses(intents)
+                markers = {marker for marker, _ in routers}
+                install_fake_llm(args.llm_latency, args.tokens_per_sec,
+                                 routers + [(m, o) for m, o in DEFAULT_RESPONSES if m not in markers])
+
+            users = [f"load-{i}@load.local" for i in range(max(args.users))]
+            print(f"🌱 Seeding {len(users)} users × {args.history:,} rows ({DB_BACKEND} backend)...")
+            for i, user_id in enumerate(users):
+                seed_history(user_id, args.history, seed=args.seed + i)
+            for texts in MESSAGES.values():  # Warm-up: fast-path model, pools, lazy imports
+                pipeline.route(texts[0], users[0])
+
+            llm = "cassette replay" if args.replay else f"stand-in LLM {args.llm_latency}s + {args.tokens_per_sec or 'instant'} tok/s"
+            print(f"🚜 {args.mode} pipeline, {args.duration:g}s per level, think time {args.think_time:g}s, {llm}")
+            levels = []
+            for count in args.users:
+                level = run_level(users[:count], args.duration, args.mix, args.mode, args.think_time, args.seed)
+                levels.append(level)
+                _print_level(level)
+            close_all_connections()
+        finally:
+            os.chdir(cwd)
+
+    saturation = find_saturation(levels, args.min_gain)
+    if saturation:
+        print(f"\n📈 Saturated between {saturation['users_from']} and {saturation['users_to']} users "
+              f"(~{saturation['throughput_rps']} req/s; the step added {saturation['efficiency']:.0%} "
+              f"of ideal throughput)")
+    else:
+        print("\n📈 Throughput kept scaling across all levels")
+    locked = sum(level["lock_errors"] for level in levels)
+    if locked:
+        print(f"⚠️ {locked} 'database is locked' error(s); see lock_errors per level")
+
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k != "output"},
+                       "levels": levels, "saturation": saturation}, f, indent=2)
+        print(f"💾 Saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
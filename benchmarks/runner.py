@@ -0,0 +1,217 @@
+"""
+Benchmark Runner
+Times each db_storage function and each workflow against synthetic histories,
+with the LLM replaced by BenchmarkLLM, and compares runs against a baseline.
+
+Every case is run until `iterations` calls or `max_seconds` have elapsed
+(at least MIN_ITERATIONS), after one untimed warm-up call.
+"""
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fake_llm import install_fake_llm, restore_llms
+from benchmarks.synthetic import seed_history, synthetic_logs
+from db_storage import (
+    aggregate_logs, delete_user_data, find_extreme_log, get_data_version, get_item_summary,
+    get_summary_stats, read_log_keys, read_logs, search_logs, write_log, write_logs,
+)
+from metrics import quantile
+from workflows.general_flow import general_flow
+from workflows.log_flow import log_flow
+from workflows.query_flow import query_flow
+from workflows.report_flow import report_flow
+
+MIN_ITERATIONS = 3
+
+# Inputs chosen to hit each path: local parser vs LLM extraction, SQL planner vs RAG
+LOG_LOCAL_TEXT = "sold 20 lbs of tomatoes for $30"
+LOG_LLM_TEXT = "the market stand brought in a good amount today, mostly tomatoes"
+QUERY_SQL_TEXT = "how much did I earn from tomatoes last month?"
+QUERY_LLM_TEXT = "who did I sell tomatoes to most recently?"
+REPORT_TEXT = "give me my sales report for this month"
+GENERAL_TEXT = "when should I plant garlic?"
+
+
+def measure(fn: Callable[[], object], iterations: int = 50, max_seconds: float = 5.0) -> Dict:
+    """
+    Times repeated calls of fn.
+
+    Returns:
+        Dictionary with iterations, ops_per_sec and mean/p50/p95/p99/min/max in milliseconds
+    """
+    fn()  # Warm-up (connection pool, page cache, lazy imports)
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < iterations and (len(samples) < MIN_ITERATIONS or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    total = sum(samples)
+    return {
+        "iterations": len(samples),
+        "ops_per_sec": round(len(samples) / total, 2) if total else 0.0,
+        "mean_ms": round(total / len(samples) * 1000, 4),
+        "p50_ms": round(quantile(samples, 0.5) * 1000, 4),
+        "p95_ms": round(quantile(samples, 0.95) * 1000, 4),
+        "p99_ms": round(quantile(samples, 0.99) * 1000, 4),
+        "min_ms": round(min(samples) * 1000, 4),
+        "max_ms": round(max(samples) * 1000, 4),
+    }
+
+
+def single_run(seconds: float, operations: int = 1) -> Dict:
+    """Stats for a one-off timed operation (seeding, deletion); ops_per_sec counts operations (e.g. rows)."""
+    ms = round(seconds * 1000, 4)
+    return {"iterations": 1, "ops_per_sec": round(operations / seconds, 2) if seconds else 0.0,
+            "mean_ms": ms, "p50_ms": ms, "p95_ms": ms, "p99_ms": ms, "min_ms": ms, "max_ms": ms}
+
+
+def _db_cases(user_id: str) -> List[Tuple[str, Callable[[], object]]]:
+    now = datetime.now(timezone.utc)
+    start, end = (now - timedelta(days=30)).isoformat(), now.isoformat()
+    entry = {"action": "sale", "item": "tomatoes", "quantity": 10, "unit": "pounds", "value_usd": 15.0}
+    batch = list(synthetic_logs(100, seed=7))
+    return [
+        ("db.read_logs", lambda: read_logs(user_id, 100)),
+        ("db.read_logs.window", lambda: read_logs(user_id, 100, start=start, end=end)),
+        ("db.get_summary_stats", lambda: get_summary_stats(user_id)),
+        ("db.get_summary_stats.window", lambda: get_summary_stats(user_id, start, end)),
+        ("db.get_data_version", lambda: get_data_version(user_id)),
+        ("db.get_item_summary", lambda: get_item_summary(user_id)),
+        ("db.get_item_summary.window", lambda: get_item_summary(user_id, start=start, end=end)),
+        ("db.search_logs", lambda: search_logs(user_id, "tomatoes farmers market")),
+        ("db.aggregate_logs", lambda: aggregate_logs(user_id, ["sale"], "tomato", start, end)),
+        ("db.find_extreme_log", lambda: find_extreme_log(user_id, True, ["sale"])),
+        ("db.read_log_keys", lambda: read_log_keys(user_id)),
+        ("db.write_log", lambda: write_log(dict(entry), user_id)),
+        ("db.write_logs.100", lambda: write_logs([dict(e) for e in batch], user_id)),
+    ]
+
+
+def _workflow_cases(user_id: str) -> List[Tuple[str, Callable[[], object]]]:
+    return [
+        ("workflow.log_flow.local", lambda: log_flow(LOG_LOCAL_TEXT, user_id)),
+        ("workflow.log_flow.llm", lambda: log_flow(LOG_LLM_TEXT, user_id)),
+        ("workflow.query_flow.sql", lambda: query_flow(QUERY_SQL_TEXT, user_id)),
+        ("workflow.query_flow.llm", lambda: query_flow(QUERY_LLM_TEXT, user_id)),
+        ("workflow.report_flow", lambda: report_flow(REPORT_TEXT, user_id)),
+    ]
+
+
+def _record(results: List[Dict], name: str, rows: Optional[int], stats: Dict, quiet: bool):
+    results.append({"name": name, "rows": rows, **stats})
+    if not quiet:
+        size = f"n={rows:,}" if rows is not None else "-"
+        print(f"  {name:<30} {size:>12}  p50 {stats['p50_ms']:>10.3f} ms  "
+              f"p95 {stats['p95_ms']:>10.3f} ms  {stats['ops_per_sec']:>12,.1f} ops/s")
+
+
+def run_benchmarks(sizes: List[int], iterations: int = 50, max_seconds: float = 5.0,
+                   llm_latency: float = 0.0, tokens_per_sec: float = 0.0,
+                   only: Optional[str] = None, quiet: bool = False) -> Dict:
+    """
+    Runs the suite against a fresh synthetic history per size.
+    Call from an empty working directory: databases are created under ./data.
+
+    Args:
+        sizes: History sizes (rows) to benchmark
+        iterations: Maximum timed calls per case
+        max_seconds: Time budget per case
+        llm_latency: Fake LLM time to first token (seconds)
+        tokens_per_sec: Fake LLM generation rate (0 = instant)
+        only: Run only cases whose name starts with this prefix (e.g. "db." or "workflow.query")
+        quiet: Don't print per-case lines
+
+    Returns:
+        {"meta": {...}, "results": [{"name", "rows", iterations, ops_per_sec, *_ms}, ...]}
+    """
+    previous = install_fake_llm(llm_latency, tokens_per_sec)
+    results: List[Dict] = []
+    selected = lambda name: only is None or name.startswith(only)
+    try:
+        if selected("workflow.general_flow"):
+            _record(results, "workflow.general_flow", None,
+                    measure(lambda: general_flow(GENERAL_TEXT), iterations, max_seconds), quiet)
+        for rows in sizes:
+            user_id = f"bench-{rows}@bench.local"
+            if not quiet:
+                print(f"\n🌱 Seeding {rows:,} rows...")
+            started = time.perf_counter()
+            seeded = seed_history(user_id, rows)
+            if selected("db.write_logs_stream"):  # ops/s here is rows/s
+                _record(results, "db.write_logs_stream", rows,
+                        single_run(time.perf_counter() - started, seeded["written"]), quiet)
+            for name, fn in _db_cases(user_id) + _workflow_cases(user_id):
+                if selected(name):
+                    _record(results, name, rows, measure(fn, iterations, max_seconds), quiet)
+            started = time.perf_counter()
+            delete_user_data(user_id)
+            if selected("db.delete_user_data"):
+                _record(results, "db.delete_user_data", rows, single_run(time.perf_counter() - started), quiet)
+    finally:
+        restore_llms(previous)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "iterations": iterations,
+            "max_seconds": max_seconds,
+            "llm_latency": llm_latency,
+            "tokens_per_sec": tokens_per_sec,
+        },
+        "results": results,
+    }
+
+
+def _key(result: Dict) -> str:
+    return f"{result['name']}@{result['rows']}"
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 0.2, metric: str = "p50_ms",
+                    min_delta_ms: float = 0.05) -> List[Dict]:
+    """
+    Compares two runs case by case.
+
+    Args:
+        current: Result of run_benchmarks()
+        baseline: Earlier result (same format, e.g. loaded from JSON)
+        threshold: Allowed slowdown as a fraction (0.2 = 20% slower)
+        metric: Latency field to compare (p50_ms, p95_ms or mean_ms)
+        min_delta_ms: Ignore differences smaller than this (timer noise on sub-ms cases)
+
+    Returns:
+        One row per case present in both runs: name, rows, baseline, current, ratio, regressed
+    """
+    base = {_key(result): result for result in baseline.get("results", [])}
+    rows = []
+    for result in current.get("results", []):
+        before = base.get(_key(result))
+        if before is None:
+            continue
+        old, new = before[metric], result[metric]
+        ratio = new / old if old else 1.0
+        rows.append({
+            "name": result["name"], "rows": result["rows"], "baseline": old, "current": new,
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + threshold and new - old > min_delta_ms,
+        })
+    return rows
+
+
+def save_results(results: Dict, path: str):
+    """Writes a run to JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> Dict:
+    """Reads a run saved by save_results()."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
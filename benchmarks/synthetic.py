@@ -0,0 +1,74 @@
+"""
+Synthetic Farm Histories
+Generates deterministic activity logs of any size for benchmarks.
+Entries are produced lazily, so a 1M-row history streams into
+write_logs_stream() with bounded memory.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional
+
+from db_storage import write_logs_stream
+
+# item → (unit, (min, max) quantity, USD per unit)
+ITEMS = {
+    "tomatoes": ("pounds", (5, 120), 1.5),
+    "carrots": ("pounds", (5, 80), 1.2),
+    "potatoes": ("pounds", (20, 300), 0.9),
+    "eggs": ("dozen", (2, 40), 4.0),
+    "lettuce": ("heads", (5, 60), 2.0),
+    "strawberries": ("pints", (5, 50), 4.5),
+    "honey": ("jars", (2, 30), 9.0),
+    "pumpkins": ("pumpkins", (1, 40), 6.0),
+}
+SUPPLIES = {
+    "chicken feed": ("bags", (1, 10), 28.0),
+    "seeds": ("packets", (2, 30), 3.5),
+    "fertilizer": ("bags", (1, 8), 35.0),
+}
+EXPENSES = ["tractor fuel", "irrigation repair", "market stall fee", "vet visit", "electricity"]
+NOTES = ["farmers market", "local restaurant", "regular customer", "grocery store", "west field",
+         "east field", "greenhouse", "co-op", "online order", "roadside stand", ""]
+
+# Relative weights of each action in generated histories
+ACTION_WEIGHTS = {"sale": 0.45, "harvest": 0.3, "purchase": 0.15, "expense": 0.1}
+
+
+def synthetic_logs(count: int, seed: int = 42, days: int = 365,
+                   now: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Yields `count` plausible log entries spread evenly over the last `days` days.
+
+    Args:
+        count: Number of entries
+        seed: Random seed (same seed, same history)
+        days: Length of the history
+        now: End of the history (default: current UTC time)
+
+    Yields:
+        Entry dictionaries accepted by write_log/write_logs
+    """
+    rng = random.Random(seed)
+    end = now or datetime.now(timezone.utc)
+    step = timedelta(days=days) / max(count, 1)
+    actions, weights = list(ACTION_WEIGHTS), list(ACTION_WEIGHTS.values())
+    for i in range(count):
+        action = rng.choices(actions, weights)[0]
+        entry = {"action": action, "timestamp": (end - step * (count - i)).isoformat(),
+                 "note": rng.choice(NOTES)}
+        if action == "expense":
+            entry.update(item=rng.choice(EXPENSES), value_usd=round(rng.uniform(10, 400), 2))
+        else:
+            catalog = SUPPLIES if action == "purchase" else ITEMS
+            item = rng.choice(list(catalog))
+            unit, (low, high), price = catalog[item]
+            quantity = rng.randint(low, high)
+            entry.update(item=item, quantity=quantity, unit=unit)
+            if action != "harvest":
+                entry["value_usd"] = round(quantity * price * rng.uniform(0.8, 1.2), 2)
+        yield entry
+
+
+def seed_history(user_id: str, count: int, seed: int = 42, days: int = 365) -> Dict:
+    """Writes a synthetic history for user_id. Returns the write_logs_stream summary."""
+    return write_logs_stream(synthetic_logs(count, seed, days), user_id)
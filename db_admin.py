@@ -0,0 +1,122 @@
+"""
+Database Maintenance Tool
+Checks and repairs the derived tables kept alongside farm_logs, and
+applies schema migrations and storage-backend moves to existing databases.
+
+Usage:
+    python db_admin.py verify                  # Verifies rollups for all users
+    python db_admin.py verify --user EMAIL     # Verifies a specific user only
+    python db_admin.py rebuild                 # Rebuilds rollups for all users
+    python db_admin.py rebuild --user EMAIL    # Rebuilds a specific user only
+    python db_admin.py migrate                 # Upgrades every database to the current schema
+    python db_admin.py relocate                # Moves users out of legacy (colliding) file names
+    python db_admin.py merge                   # Copies per-user databases into the shared database
+"""
+import argparse
+import sys
+from db_storage import (list_user_ids, rebuild_rollups, verify_rollups,
+                        list_database_files, migrate_database, merge_into_shared,
+                        relocate_legacy_files, SCHEMA_VERSION, SHARED_DB_PATH)
+
+
+def verify_users(user_ids: list) -> bool:
+    """Verify rollups for each user. Returns True if all are consistent."""
+    all_ok = True
+    for user_id in user_ids:
+        problems = verify_rollups(user_id)
+        if problems:
+            all_ok = False
+            print(f"  ✗ {user_id}: {len(problems)} mismatch(es)")
+            for problem in problems[:10]:
+                print(f"      {problem}")
+        else:
+            print(f"  ✓ {user_id}")
+    return all_ok
+
+
+def rebuild_users(user_ids: list):
+    """Rebuild rollups for each user from farm_logs."""
+    for user_id in user_ids:
+        rebuild_rollups(user_id)
+        print(f"  ✓ Rebuilt rollups for {user_id}")
+
+
+def migrate_databases(db_paths: list) -> bool:
+    """Migrate each database file. Returns True if every row has a ts_epoch."""
+    all_ok = True
+    for db_path in db_paths:
+        result = migrate_database(db_path)
+        status = "up to date" if result['from_version'] == result['to_version'] else \
+            f"v{result['from_version']} → v{result['to_version']}"
+        print(f"  ✓ {db_path}: {status}, {result['rows']} rows")
+        if result['unparsed']:
+            all_ok = False
+            print(f"      ⚠️ {result['unparsed']} row(s) with unparseable timestamps (ts_epoch is NULL)")
+    return all_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriAgent database maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    verify_parser = subparsers.add_parser("verify", help="Check rollup tables against farm_logs")
+    verify_parser.add_argument("--user", type=str, help="Verify specific user only (email)")
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recompute rollup tables from farm_logs")
+    rebuild_parser.add_argument("--user", type=str, help="Rebuild specific user only (email)")
+
+    subparsers.add_parser("migrate", help=f"Upgrade all databases to schema v{SCHEMA_VERSION}")
+    subparsers.add_parser("relocate", help="Move users out of legacy per-user file names")
+    merge_parser = subparsers.add_parser("merge", help="Copy per-user databases into the shared database")
+    merge_parser.add_argument("--dest", type=str, default=SHARED_DB_PATH, help="Shared database path")
+
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        db_paths = list_database_files()
+        if not db_paths:
+            print("No user databases found in data/")
+            return
+        print(f"🔧 Migrating {len(db_paths)} database(s) to schema v{SCHEMA_VERSION}...")
+        if not migrate_databases(db_paths):
+            print("\n⚠️ Some timestamps could not be parsed; those rows sort last and are skipped by date filters")
+            sys.exit(1)
+        print("\n✅ Migration complete")
+        return
+
+    if args.command == "relocate":
+        print("🔧 Relocating users from legacy database file names...")
+        moved = relocate_legacy_files()
+        for entry in moved:
+            print(f"  ✓ {entry['user_id']}: {entry['file']} → {entry['destination']} "
+                  f"({entry['copied']} of {entry['read']} rows copied)")
+        print(f"\n✅ Relocated {len(moved)} user(s)" if moved else "\n✅ Nothing to relocate")
+        return
+
+    if args.command == "merge":
+        print(f"🔧 Merging per-user databases into {args.dest}...")
+        results = merge_into_shared(dest_path=args.dest)
+        for path, result in results.items():
+            print(f"  ✓ {path}: {result['copied']} of {result['read']} rows copied")
+        print(f"\n✅ Merged {len(results)} database(s). Set AGRI_DB_BACKEND=shared to use it.")
+        return
+
+    user_ids = [args.user] if args.user else list_user_ids()
+    if not user_ids:
+        print("No user databases found in data/")
+        return
+
+    if args.command == "verify":
+        print(f"🔍 Verifying rollups for {len(user_ids)} user(s)...")
+        if not verify_users(user_ids):
+            print("\n⚠️ Mismatches found. Run: python db_admin.py rebuild")
+            sys.exit(1)
+        print("\n✅ All rollups consistent")
+    elif args.command == "rebuild":
+        print(f"🔧 Rebuilding rollups for {len(user_ids)} user(s)...")
+        rebuild_users(user_ids)
+        print("\n✅ Rebuild complete")
+
+
+if __name__ == "__main__":
+    main()
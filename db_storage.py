@@ -1,36 +1,146 @@
 """
 SQLite Storage Layer
 Handles user-specific data persistence to SQLite databases.
-Each user gets their own database file in data/ directory.
+By default each user gets their own database file in data/ directory;
+AGRI_DB_BACKEND=shared keeps every user in one database instead.
 Provides robust querying and aggregation capabilities.
 """
+import asyncio
+import re
 import sqlite3
 import os
-from typing import List, Dict, Optional, Tuple
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterable, List, Dict, Optional, Tuple
+from urllib.parse import quote
+from datetime import datetime, timezone
 
+from metrics import instrumented, register_stats
 
-def get_data_file_path(user_id: str) -> str:
+
+# === Storage Backend ===
+# "per_user": one database file per user under DATA_DIR (default)
+# "shared":   all users in SHARED_DB_PATH; every index leads with user_id
+DB_BACKEND = os.getenv("AGRI_DB_BACKEND", "per_user")
+DATA_DIR = "data"
+SHARED_DB_PATH = os.getenv("AGRI_SHARED_DB_PATH", os.path.join(DATA_DIR, "agri_shared.db"))
+
+# === Connection Pool Configuration ===
+# Per-database and global bounds on open SQLite handles, plus tuned pragmas.
+# Override with environment variables for larger deployments.
+DB_POOL_MAX_PER_DB = int(os.getenv("AGRI_DB_POOL_MAX_PER_DB", "16" if DB_BACKEND == "shared" else "4"))
+DB_POOL_MAX_OPEN = int(os.getenv("AGRI_DB_POOL_MAX_OPEN", "64"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("AGRI_DB_POOL_IDLE_TIMEOUT", "300"))
+DB_BUSY_TIMEOUT = float(os.getenv("AGRI_DB_BUSY_TIMEOUT", "5.0"))
+DB_MMAP_SIZE = int(os.getenv("AGRI_DB_MMAP_SIZE", str(64 * 1024 * 1024)))  # 64 MB
+DB_CACHE_SIZE_KB = int(os.getenv("AGRI_DB_CACHE_SIZE_KB", "8192"))        # 8 MB
+
+
+def _user_file_name(user_id: str) -> str:
+    """Filesystem-safe, collision-free file name: "a.b@x.com" -> "a.b%40x.com_data.db"."""
+    return quote(user_id, safe="") + "_data.db"
+
+
+def _legacy_file_name(user_id: str) -> str:
     """
-    Generates a safe filename for the user's database from their user ID.
-    Example: "testuser@gmail.com" -> "data/testuser_data.db"
+    File name used before per-user names were made collision-free.
+    It drops the domain and maps "." to "_", so "a.b@x.com" and "a_b@y.com" shared a file.
     """
-    safe_filename = user_id.split('@')[0].replace('.', '_') + "_data.db"
-    return os.path.join("data", safe_filename)
+    return user_id.split('@')[0].replace('.', '_') + "_data.db"
 
 
-def get_db_connection(user_id: str) -> sqlite3.Connection:
+def _open_readonly(db_path: str) -> sqlite3.Connection:
+    """Opens a database file read-only (the path is URI-escaped: file names may contain '%')."""
+    return sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True, timeout=DB_BUSY_TIMEOUT)
+
+
+def _has_user_rows(db_path: str, user_id: str) -> bool:
+    """True if the database file holds any logs for user_id (read-only check)."""
+    conn = _open_readonly(db_path)
+    try:
+        return conn.execute("SELECT 1 FROM farm_logs WHERE user_id = ? LIMIT 1", (user_id,)).fetchone() is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+
+# user_id -> resolved per-user path (avoids a filesystem check per query)
+_path_cache: Dict[str, str] = {}
+_PATH_CACHE_MAX = 10000
+
+
+def get_data_file_path(user_id: str) -> str:
     """
-    Gets a connection to the user's SQLite database.
-    Creates the database and schema if it doesn't exist.
+    Returns the database path holding the user's data.
+    Example (per_user backend): "testuser@gmail.com" -> "data/testuser%40gmail.com_data.db"
+    
+    A user whose data is still in a legacy-named file (see _legacy_file_name)
+    keeps using it until `python db_admin.py relocate` moves it.
     """
-    data_file = get_data_file_path(user_id)
-    os.makedirs(os.path.dirname(data_file), exist_ok=True)
+    if DB_BACKEND == "shared":
+        return SHARED_DB_PATH
     
-    conn = sqlite3.Connection(data_file)
-    conn.row_factory = sqlite3.Row  # Enable column access by name
+    path = _path_cache.get(user_id)
+    if path is None:
+        path = os.path.join(DATA_DIR, _user_file_name(user_id))
+        legacy = os.path.join(DATA_DIR, _legacy_file_name(user_id))
+        if legacy != path and not os.path.exists(path) and os.path.exists(legacy) \
+                and _has_user_rows(legacy, user_id):
+            path = legacy
+        if len(_path_cache) >= _PATH_CACHE_MAX:
+            _path_cache.clear()
+        _path_cache[user_id] = path
+    return path
+
+
+def normalize_timestamp(value) -> Tuple[str, int]:
+    """
+    Parses an ISO 8601 timestamp (or datetime); naive values are taken as UTC.
+    Example: "2024-05-01T10:00:00.123456" -> ("2024-05-01T10:00:00.123456+00:00", 1714557600)
+    
+    Returns:
+        (canonical UTC ISO string, integer epoch seconds)
     
-    # Create schema if not exists
+    Raises:
+        ValueError: If the value isn't a recognizable timestamp
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        parsed = datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    parsed = parsed.astimezone(timezone.utc)
+    return parsed.isoformat(), int(parsed.timestamp() // 1)
+
+
+# Bumped whenever a migration is appended to _MIGRATIONS (stored in PRAGMA user_version)
+SCHEMA_VERSION = 4
+
+
+def _detect_fts5() -> bool:
+    """True if the linked SQLite library was built with FTS5."""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE fts_probe USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+# Item/note search uses FTS5 when available, otherwise LIKE scans
+FTS5_AVAILABLE = _detect_fts5()
+
+
+def _create_base_schema(conn: sqlite3.Connection):
+    """Creates the farm_logs table (indexes are added by migrations)."""
     conn.execute("""
         CREATE TABLE IF NOT EXISTS farm_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,21 +152,489 @@ def get_db_connection(user_id: str) -> sqlite3.Connection:
             unit TEXT,
             value_usd REAL,
             note TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            ts_epoch INTEGER
         )
     """)
+
+
+def _migrate_rollups(conn: sqlite3.Connection):
+    """
+    v1: Rollup tables kept current by triggers on farm_logs.
+    farm_stats holds one row per (user, action); farm_item_stats one per (user, item, action).
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS farm_stats (
+            user_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            total_value REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, action)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS farm_item_stats (
+            user_id TEXT NOT NULL,
+            item TEXT NOT NULL,
+            action TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            total_quantity REAL NOT NULL DEFAULT 0,
+            total_value REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, item, action)
+        ) WITHOUT ROWID
+    """)
+    
+    add_row = """
+        INSERT INTO farm_stats (user_id, action, count, total_value)
+        VALUES (NEW.user_id, NEW.action, 1, COALESCE(NEW.value_usd, 0))
+        ON CONFLICT(user_id, action) DO UPDATE SET
+            count = count + 1,
+            total_value = total_value + excluded.total_value;
+        INSERT INTO farm_item_stats (user_id, item, action, count, total_quantity, total_value)
+        VALUES (NEW.user_id, NEW.item, NEW.action, 1, COALESCE(NEW.quantity, 0), COALESCE(NEW.value_usd, 0))
+        ON CONFLICT(user_id, item, action) DO UPDATE SET
+            count = count + 1,
+            total_quantity = total_quantity + excluded.total_quantity,
+            total_value = total_value + excluded.total_value;
+    """
+    remove_row = """
+        UPDATE farm_stats SET
+            count = count - 1,
+            total_value = total_value - COALESCE(OLD.value_usd, 0)
+        WHERE user_id = OLD.user_id AND action = OLD.action;
+        DELETE FROM farm_stats
+        WHERE user_id = OLD.user_id AND action = OLD.action AND count <= 0;
+        UPDATE farm_item_stats SET
+            count = count - 1,
+            total_quantity = total_quantity - COALESCE(OLD.quantity, 0),
+            total_value = total_value - COALESCE(OLD.value_usd, 0)
+        WHERE user_id = OLD.user_id AND item = OLD.item AND action = OLD.action;
+        DELETE FROM farm_item_stats
+        WHERE user_id = OLD.user_id AND item = OLD.item AND action = OLD.action AND count <= 0;
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_rollup_insert
+        AFTER INSERT ON farm_logs BEGIN {add_row} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_rollup_delete
+        AFTER DELETE ON farm_logs BEGIN {remove_row} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_rollup_update
+        AFTER UPDATE OF user_id, action, item, quantity, value_usd ON farm_logs
+        BEGIN {remove_row} {add_row} END
+    """)
     
-    # Create index for faster queries
+    # Existing databases already have rows: seed the rollups from them
+    _rebuild_rollups(conn)
+
+
+def _migrate_data_version(conn: sqlite3.Connection):
+    """
+    v2: Per-user data version, bumped by triggers on every farm_logs change.
+    Lets caches (see result_cache.py) detect new or edited logs with one key lookup.
+    """
     conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_user_timestamp 
-        ON farm_logs(user_id, timestamp)
+        CREATE TABLE IF NOT EXISTS farm_data_version (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    
+    bump = """
+        INSERT INTO farm_data_version (user_id, version) VALUES ({row}.user_id, 1)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_version_insert
+        AFTER INSERT ON farm_logs BEGIN {bump.format(row="NEW")} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_version_delete
+        AFTER DELETE ON farm_logs BEGIN {bump.format(row="OLD")} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_version_update
+        AFTER UPDATE ON farm_logs BEGIN {bump.format(row="OLD")} {bump.format(row="NEW")} END
     """)
     
+    conn.execute("""
+        INSERT OR IGNORE INTO farm_data_version (user_id, version)
+        SELECT user_id, COUNT(*) FROM farm_logs GROUP BY user_id
+    """)
+
+
+def _migrate_epoch_timestamps(conn: sqlite3.Connection):
+    """
+    v3: Integer UTC epoch column (ts_epoch) used for ordering and range filters.
+    Existing timestamps are normalized to UTC ISO and backfilled; the text
+    timestamp index is replaced by one on (user_id, ts_epoch).
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(farm_logs)")}
+    if "ts_epoch" not in columns:
+        conn.execute("ALTER TABLE farm_logs ADD COLUMN ts_epoch INTEGER")
+    _backfill_epochs(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_epoch ON farm_logs(user_id, ts_epoch)")
+    conn.execute("DROP INDEX IF EXISTS idx_user_timestamp")
+
+
+def _backfill_epochs(conn: sqlite3.Connection, batch_size: int = 5000) -> int:
+    """
+    Fills ts_epoch (and normalizes timestamp) for rows missing it, in id order.
+    Rows whose timestamp can't be parsed are left with a NULL ts_epoch.
+    
+    Returns:
+        Number of rows updated
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, timestamp FROM farm_logs
+            WHERE ts_epoch IS NULL AND id > ?
+            ORDER BY id LIMIT ?
+        """, (last_id, batch_size)).fetchall()
+        if not rows:
+            return updated
+        params = []
+        for row_id, timestamp in rows:
+            try:
+                params.append((*normalize_timestamp(timestamp), row_id))
+            except ValueError:
+                pass
+        conn.executemany("UPDATE farm_logs SET timestamp = ?, ts_epoch = ? WHERE id = ?", params)
+        updated += len(params)
+        last_id = rows[-1][0]
+
+
+def _migrate_fts(conn: sqlite3.Connection):
+    """
+    v4: FTS5 index over farm_logs.item and farm_logs.note (porter stemming),
+    stored as an external-content table kept in sync by triggers.
+    Skipped when SQLite lacks FTS5 (searches then fall back to LIKE).
+    """
+    if not FTS5_AVAILABLE:
+        return
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS farm_logs_fts USING fts5(
+            item, note,
+            content='farm_logs', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    """)
+    
+    add_row = "INSERT INTO farm_logs_fts (rowid, item, note) VALUES (NEW.id, NEW.item, NEW.note);"
+    remove_row = """
+        INSERT INTO farm_logs_fts (farm_logs_fts, rowid, item, note)
+        VALUES ('delete', OLD.id, OLD.item, OLD.note);
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_fts_insert
+        AFTER INSERT ON farm_logs BEGIN {add_row} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_fts_delete
+        AFTER DELETE ON farm_logs BEGIN {remove_row} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_farm_logs_fts_update
+        AFTER UPDATE OF item, note ON farm_logs BEGIN {remove_row} {add_row} END
+    """)
+    
+    # Index the rows that already exist
+    conn.execute("INSERT INTO farm_logs_fts (farm_logs_fts) VALUES ('rebuild')")
+
+
+# Ordered (version, migration) pairs applied by _init_schema
+_MIGRATIONS = [
+    (1, _migrate_rollups),
+    (2, _migrate_data_version),
+    (3, _migrate_epoch_timestamps),
+    (4, _migrate_fts),
+]
+
+
+def _init_schema(conn: sqlite3.Connection):
+    """
+    Creates tables and indexes and applies pending migrations.
+    Safe to run against an existing database (and from several processes).
+    """
+    _create_base_schema(conn)
     conn.commit()
+    
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    
+    # Take the write lock, then re-check in case another process migrated first
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in _MIGRATIONS:
+            if version < target:
+                migration(conn)
+                version = target
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    """Opens a new SQLite connection with tuned pragmas applied."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    
+    # check_same_thread=False: pooled handles are reused across threads,
+    # but the pool guarantees only one thread holds a handle at a time.
+    conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+    conn.row_factory = sqlite3.Row  # Enable column access by name
+    
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")  # negative = KiB
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
 
-def read_logs(user_id: str, limit: int = 100, action: Optional[str] = None) -> List[Dict]:
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of SQLite connections keyed by database file.
+    
+    - At most `max_per_db` handles are checked out per file; extra callers wait.
+    - At most `max_open` handles exist in total; idle handles are evicted
+      least-recently-used first to make room.
+    - Idle handles older than `idle_timeout` seconds are closed.
+    - Schema setup runs once per file per process.
+    """
+    
+    def __init__(self, max_per_db: int = DB_POOL_MAX_PER_DB, max_open: int = DB_POOL_MAX_OPEN,
+                 idle_timeout: float = DB_POOL_IDLE_TIMEOUT):
+        self.max_per_db = max(1, max_per_db)
+        self.max_open = max(1, max_open)
+        self.idle_timeout = idle_timeout
+        
+        self._cond = threading.Condition()
+        self._schema_lock = threading.Lock()
+        self._idle: "OrderedDict[str, List[Tuple[sqlite3.Connection, float]]]" = OrderedDict()
+        self._checked_out: Dict[str, int] = {}
+        self._in_use: Dict[sqlite3.Connection, Tuple[str, int]] = {}
+        self._generation: Dict[str, int] = {}
+        self._initialized = set()
+        self._open = 0
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.waits = 0
+    
+    # --- Internal helpers (call with self._cond held) ---
+    
+    def _close_quietly(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._open -= 1
+    
+    def _evict_expired(self, now: float):
+        if self.idle_timeout <= 0:
+            return
+        for path in list(self._idle.keys()):
+            idle = self._idle[path]
+            while idle and now - idle[0][1] > self.idle_timeout:
+                conn, _ = idle.pop(0)
+                self._close_quietly(conn)
+                self.evictions += 1
+            if not idle:
+                del self._idle[path]
+    
+    def _evict_lru(self) -> bool:
+        """Closes the least recently used idle handle. Returns False if none idle."""
+        for path in self._idle:
+            idle = self._idle[path]
+            conn, _ = idle.pop(0)
+            if not idle:
+                del self._idle[path]
+            self._close_quietly(conn)
+            self.evictions += 1
+            return True
+        return False
+    
+    # --- Public API ---
+    
+    def acquire(self, db_path: str) -> sqlite3.Connection:
+        """Checks out a connection for `db_path`, opening one if needed."""
+        with self._cond:
+            self._evict_expired(time.monotonic())
+            while True:
+                idle = self._idle.get(db_path)
+                if idle:
+                    conn, _ = idle.pop()  # most recently used handle is warmest
+                    if not idle:
+                        del self._idle[db_path]
+                    self.hits += 1
+                    self._checked_out[db_path] = self._checked_out.get(db_path, 0) + 1
+                    self._in_use[conn] = (db_path, self._generation.get(db_path, 0))
+                    return conn
+                
+                if self._checked_out.get(db_path, 0) < self.max_per_db:
+                    if self._open >= self.max_open:
+                        self._evict_lru()
+                    if self._open < self.max_open:
+                        # Reserve the slot, then open outside the lock
+                        self.misses += 1
+                        self._open += 1
+                        self._checked_out[db_path] = self._checked_out.get(db_path, 0) + 1
+                        generation = self._generation.get(db_path, 0)
+                        break
+                
+                self.waits += 1
+                self._cond.wait()
+        
+        try:
+            conn = _open_connection(db_path)
+            self._ensure_schema(db_path, conn)
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._checked_out[db_path] -= 1
+                self._cond.notify_all()
+            raise
+        
+        with self._cond:
+            self._in_use[conn] = (db_path, generation)
+        return conn
+    
+    def release(self, conn: sqlite3.Connection):
+        """Returns a checked-out connection to the pool."""
+        if conn.in_transaction:
+            conn.rollback()
+        
+        with self._cond:
+            db_path, generation = self._in_use.pop(conn)
+            self._checked_out[db_path] -= 1
+            if self._checked_out[db_path] == 0:
+                del self._checked_out[db_path]
+            
+            if generation != self._generation.get(db_path, 0):
+                # Database was discarded while this handle was in use
+                self._close_quietly(conn)
+            else:
+                self._idle.setdefault(db_path, []).append((conn, time.monotonic()))
+                self._idle.move_to_end(db_path)
+            self._cond.notify_all()
+    
+    @contextmanager
+    def connection(self, db_path: str):
+        """Context manager that checks out a connection and always returns it."""
+        conn = self.acquire(db_path)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def _ensure_schema(self, db_path: str, conn: sqlite3.Connection):
+        if db_path in self._initialized:
+            return
+        with self._schema_lock:
+            if db_path not in self._initialized:
+                _init_schema(conn)
+                self._initialized.add(db_path)
+    
+    def discard(self, db_path: str):
+        """
+        Closes idle handles for a database and forgets its schema state.
+        Handles still in use are closed when released. Call before deleting a file.
+        """
+        with self._cond:
+            for conn, _ in self._idle.pop(db_path, []):
+                self._close_quietly(conn)
+            self._generation[db_path] = self._generation.get(db_path, 0) + 1
+            self._initialized.discard(db_path)
+            self._cond.notify_all()
+    
+    def close_all(self):
+        """Closes every idle handle and resets schema state."""
+        with self._cond:
+            for path in list(self._idle.keys()):
+                for conn, _ in self._idle.pop(path):
+                    self._close_quietly(conn)
+                self._generation[path] = self._generation.get(path, 0) + 1
+            for path in self._checked_out:
+                self._generation[path] = self._generation.get(path, 0) + 1
+            self._initialized.clear()
+            self._cond.notify_all()
+    
+    def stats(self) -> Dict:
+        """Returns pool counters for monitoring."""
+        with self._cond:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'waits': self.waits,
+                'open_handles': self._open,
+                'idle_handles': sum(len(v) for v in self._idle.values()),
+                'in_use_handles': sum(self._checked_out.values()),
+                'databases': len(set(self._idle) | set(self._checked_out)),
+            }
+
+
+# Process-wide pool shared by all storage functions
+_pool = ConnectionPool()
+
+
+def db_connection(user_id: str):
+    """
+    Context manager yielding a pooled connection to the user's database.
+    
+    Example:
+        with db_connection(user_id) as conn:
+            conn.execute(...)
+    """
+    return _pool.connection(get_data_file_path(user_id))
+
+
+def get_db_connection(user_id: str) -> sqlite3.Connection:
+    """
+    Gets a standalone (unpooled) connection to the user's SQLite database.
+    Creates the database and schema if it doesn't exist. Caller must close it.
+    Prefer db_connection() for short-lived operations.
+    """
+    data_file = get_data_file_path(user_id)
+    conn = _open_connection(data_file)
+    _pool._ensure_schema(data_file, conn)
+    return conn
+
+
+def get_pool_stats() -> Dict:
+    """Returns connection pool statistics (hit rate, open handles, evictions)."""
+    return _pool.stats()
+
+
+register_stats("db_pool", get_pool_stats, "SQLite connection pool",
+               gauges=("hit_rate", "open_handles", "idle_handles", "in_use_handles", "databases"))
+
+
+def close_user_connections(user_id: str):
+    """Closes pooled connections for a user, e.g. before deleting their database."""
+    _pool.discard(get_data_file_path(user_id))
+
+
+def close_all_connections():
+    """Closes all idle pooled connections."""
+    _pool.close_all()
+
+
+@instrumented("db")
+def read_logs(user_id: str, limit: int = 100, action: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
     """
     Reads logs for a specific user from their SQLite database.
     
@@ -64,33 +642,76 @@ def read_logs(user_id: str, limit: int = 100, action: Optional[str] = None) -> L
         user_id: User identifier
         limit: Maximum number of logs to return (default 100)
         action: Optional filter by action type ('sale', 'harvest', 'expense', 'purchase')
+        start: Optional inclusive ISO timestamp lower bound
+        end: Optional exclusive ISO timestamp upper bound
     
     Returns:
         List of log dictionaries, ordered by timestamp descending
     """
-    conn = get_db_connection(user_id)
-    
-    query = """
+    # Range bounds and ordering use the (user_id, ts_epoch) index
+    where, params = _filter_clause(user_id, [action] if action else None, start=start, end=end)
+    query = f"""
         SELECT id, user_id, timestamp, action, item, quantity, unit, value_usd, note
         FROM farm_logs
-        WHERE user_id = ?
+        {where}
+        ORDER BY ts_epoch DESC, id DESC LIMIT ?
     """
-    params = [user_id]
-    
-    if action:
-        query += " AND action = ?"
-        params.append(action)
-    
-    query += " ORDER BY timestamp DESC LIMIT ?"
     params.append(limit)
     
-    cursor = conn.execute(query, params)
-    logs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with db_connection(user_id) as conn:
+        cursor = conn.execute(query, params)
+        logs = [dict(row) for row in cursor.fetchall()]
     
     return logs
 
 
+_INSERT_LOG_SQL = """
+    INSERT INTO farm_logs (user_id, timestamp, ts_epoch, action, item, quantity, unit, value_usd, note)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Rows per transaction for write_logs_stream
+BULK_CHUNK_SIZE = 1000
+
+
+def _validate_entry(entry) -> Optional[str]:
+    """Returns an error message if the entry can't be stored, else None."""
+    if not isinstance(entry, dict):
+        return f"Entry must be a dict, got {type(entry).__name__}"
+    required_fields = ['action', 'item']
+    if not all(entry.get(f) for f in required_fields):
+        return f"Missing required fields: {required_fields}"
+    for field in ('quantity', 'value_usd'):
+        value = entry.get(field)
+        if value is not None and not isinstance(value, (int, float)):
+            return f"Field '{field}' must be numeric, got {value!r}"
+    if entry.get('timestamp') is not None:
+        try:
+            normalize_timestamp(entry['timestamp'])
+        except (TypeError, ValueError):
+            return f"Field 'timestamp' must be an ISO 8601 timestamp, got {entry['timestamp']!r}"
+    return None
+
+
+def _entry_params(entry: dict, user_id: str) -> Tuple:
+    """Maps an entry to INSERT parameters, stamping a timestamp if missing (stored as UTC)."""
+    if entry.get('timestamp') is None:
+        entry['timestamp'] = datetime.now(timezone.utc).isoformat()
+    timestamp, epoch = normalize_timestamp(entry['timestamp'])
+    return (
+        user_id,
+        timestamp,
+        epoch,
+        entry.get('action'),
+        entry.get('item'),
+        entry.get('quantity'),
+        entry.get('unit'),
+        entry.get('value_usd'),
+        entry.get('note')
+    )
+
+
+@instrumented("db")
 def write_log(entry: dict, user_id: str) -> bool:
     """
     Appends a new log entry to a specific user's SQLite database.
@@ -107,116 +728,670 @@ def write_log(entry: dict, user_id: str) -> bool:
     if not all(entry.get(f) for f in required_fields):
         raise ValueError(f"Missing required fields: {required_fields}")
     
-    conn = get_db_connection(user_id)
+    params = _entry_params(entry, user_id)
+    with db_connection(user_id) as conn:
+        conn.execute(_INSERT_LOG_SQL, params)
+        conn.commit()
+    return True
+
+
+@instrumented("db")
+def write_logs(entries: Iterable[dict], user_id: str, all_or_nothing: bool = False) -> List[Dict]:
+    """
+    Appends a batch of log entries in a single transaction.
+    The whole batch is validated first; valid rows are inserted with executemany.
     
-    # Ensure timestamp exists
-    if 'timestamp' not in entry:
-        entry['timestamp'] = datetime.now(datetime.UTC).isoformat()
+    Args:
+        entries: Log entry dictionaries (same keys as write_log)
+        user_id: User identifier
+        all_or_nothing: If True, any invalid entry rejects the whole batch
     
-    try:
-        conn.execute("""
-            INSERT INTO farm_logs (user_id, timestamp, action, item, quantity, unit, value_usd, note)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            entry.get('timestamp'),
-            entry.get('action'),
-            entry.get('item'),
-            entry.get('quantity'),
-            entry.get('unit'),
-            entry.get('value_usd'),
-            entry.get('note')
-        ))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        raise e
+    Returns:
+        Per-row results in input order: {'index': i, 'ok': bool, 'error': str or None}
+    """
+    entries = list(entries)
+    errors = [_validate_entry(entry) for entry in entries]
+    
+    if all_or_nothing and any(errors):
+        return [{'index': i, 'ok': False, 'error': error or "Batch rejected: another entry is invalid"}
+                for i, error in enumerate(errors)]
+    
+    params = [_entry_params(entry, user_id) for entry, error in zip(entries, errors) if error is None]
+    if params:
+        with db_connection(user_id) as conn:
+            conn.executemany(_INSERT_LOG_SQL, params)
+            conn.commit()
+    
+    return [{'index': i, 'ok': error is None, 'error': error} for i, error in enumerate(errors)]
 
 
-def get_summary_stats(user_id: str) -> Dict:
+@instrumented("db")
+def write_logs_stream(entries: Iterable[dict], user_id: str, chunk_size: int = BULK_CHUNK_SIZE,
+                      max_errors: int = 100) -> Dict:
+    """
+    Bulk-loads an iterator of any length with bounded memory.
+    Entries are consumed `chunk_size` at a time; each chunk is one transaction.
+    
+    Args:
+        entries: Iterable/generator of log entry dictionaries
+        user_id: User identifier
+        chunk_size: Rows per transaction
+        max_errors: Maximum number of row errors kept in the summary
+    
+    Returns:
+        Dictionary with written, failed, chunks and errors (list of (index, message))
+    """
+    summary = {'written': 0, 'failed': 0, 'chunks': 0, 'errors': []}
+    iterator = iter(entries)
+    offset = 0
+    with db_connection(user_id) as conn:
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            params = []
+            for i, entry in enumerate(chunk):
+                error = _validate_entry(entry)
+                if error is None:
+                    params.append(_entry_params(entry, user_id))
+                else:
+                    summary['failed'] += 1
+                    if len(summary['errors']) < max_errors:
+                        summary['errors'].append((offset + i, error))
+            if params:
+                conn.executemany(_INSERT_LOG_SQL, params)
+                conn.commit()
+            summary['written'] += len(params)
+            summary['chunks'] += 1
+            offset += len(chunk)
+    return summary
+
+
+@instrumented("db")
+def get_summary_stats(user_id: str, start: Optional[str] = None, end: Optional[str] = None) -> Dict:
     """
     Get pre-computed statistics for a user's farm data.
     Returns totals and counts by action type.
+    All-time stats read the trigger-maintained farm_stats rollup (one row per action);
+    with start/end they are aggregated from the matching farm_logs range.
+    
+    Args:
+        user_id: User identifier
+        start: Optional inclusive ISO timestamp lower bound
+        end: Optional exclusive ISO timestamp upper bound
     
     Returns:
         Dictionary with total_sales, total_expenses, total_entries, etc.
     """
-    conn = get_db_connection(user_id)
-    
-    # Total sales revenue
-    sales_result = conn.execute("""
-        SELECT COALESCE(SUM(value_usd), 0) 
-        FROM farm_logs 
-        WHERE user_id = ? AND action = 'sale'
-    """, (user_id,)).fetchone()
-    
-    # Total expenses
-    expense_result = conn.execute("""
-        SELECT COALESCE(SUM(value_usd), 0) 
-        FROM farm_logs 
-        WHERE user_id = ? AND action IN ('expense', 'purchase')
-    """, (user_id,)).fetchone()
-    
-    # Total entries by action
-    action_counts = conn.execute("""
-        SELECT action, COUNT(*) as count, COALESCE(SUM(value_usd), 0) as total
-        FROM farm_logs 
-        WHERE user_id = ?
-        GROUP BY action
-    """, (user_id,)).fetchall()
-    
-    # Total entries
-    total_count = conn.execute("""
-        SELECT COUNT(*) FROM farm_logs WHERE user_id = ?
-    """, (user_id,)).fetchone()
-    
-    conn.close()
+    with db_connection(user_id) as conn:
+        if start or end:
+            where, params = _filter_clause(user_id, start=start, end=end)
+            action_rows = conn.execute(f"""
+                SELECT action, COUNT(*) AS count, COALESCE(SUM(value_usd), 0) AS total_value
+                FROM farm_logs
+                {where}
+                GROUP BY action
+            """, params).fetchall()
+        else:
+            action_rows = conn.execute("""
+                SELECT action, count, total_value
+                FROM farm_stats
+                WHERE user_id = ?
+            """, (user_id,)).fetchall()
+    
+    by_action = {row['action']: {'count': row['count'], 'total': float(row['total_value'])} for row in action_rows}
     
     stats = {
-        'total_sales': float(sales_result[0]),
-        'total_expenses': float(expense_result[0]),
-        'total_entries': int(total_count[0]),
-        'by_action': {row['action']: {'count': row['count'], 'total': float(row['total'])} for row in action_counts}
+        'total_sales': by_action.get('sale', {}).get('total', 0.0),
+        'total_expenses': sum((by_action[a]['total'] for a in ('expense', 'purchase') if a in by_action), 0.0),
+        'total_entries': sum(v['count'] for v in by_action.values()),
+        'by_action': by_action
     }
     
     return stats
 
 
-def get_item_summary(user_id: str, item_name: Optional[str] = None) -> List[Tuple]:
+@instrumented("db")
+def get_data_version(user_id: str) -> int:
+    """
+    Returns the user's data version: a counter bumped by triggers whenever any of
+    their logs is inserted, updated or deleted (0 if they have never logged).
+    """
+    with db_connection(user_id) as conn:
+        row = conn.execute(
+            "SELECT version FROM farm_data_version WHERE user_id = ?", (user_id,)
+        ).fetchone()
+    return row[0] if row else 0
+
+
+@instrumented("db")
+def get_item_summary(user_id: str, item_name: Optional[str] = None,
+                     start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple]:
     """
     Get aggregated data by item (e.g., total tomatoes sold, total carrots harvested).
+    All-time summaries read the trigger-maintained farm_item_stats rollup (one row per
+    item/action); with start/end they are aggregated from the matching farm_logs range.
     
     Args:
         user_id: User identifier
-        item_name: Optional specific item to filter by
+        item_name: Optional item words to filter by (stemmed prefix match, e.g. "tomato")
+        start: Optional inclusive ISO timestamp lower bound
+        end: Optional exclusive ISO timestamp upper bound
     
     Returns:
         List of tuples: (item, action, count, total_quantity, total_value)
     """
-    conn = get_db_connection(user_id)
+    if start or end:
+        where, params = _filter_clause(user_id, item=item_name, start=start, end=end)
+        query = f"""
+            SELECT item, action, COUNT(*) AS count,
+                   COALESCE(SUM(quantity), 0) AS total_quantity,
+                   COALESCE(SUM(value_usd), 0) AS total_value
+            FROM farm_logs
+            {where}
+            GROUP BY item, action
+        """
+    else:
+        query = """
+            SELECT item, action, count, total_quantity, total_value
+            FROM farm_item_stats
+            WHERE user_id = ?
+        """
+        params = [user_id]
+        
+        if item_name:
+            # Resolve matching item names through the search index, then read their rollups
+            condition, condition_params = _item_condition(item_name)
+            query += f" AND item IN (SELECT DISTINCT item FROM farm_logs WHERE user_id = ? AND {condition})"
+            params.extend([user_id, *condition_params])
     
-    query = """
-        SELECT 
-            item,
-            action,
-            COUNT(*) as count,
-            COALESCE(SUM(quantity), 0) as total_quantity,
-            COALESCE(SUM(value_usd), 0) as total_value
-        FROM farm_logs
-        WHERE user_id = ?
+    query += " ORDER BY total_value DESC"
+    
+    with db_connection(user_id) as conn:
+        cursor = conn.execute(query, params)
+        results = cursor.fetchall()
+    
+    return results
+
+
+def build_fts_query(text: str, column: Optional[str] = None, prefix: bool = True,
+                    match_any: bool = False) -> Optional[str]:
     """
-    params = [user_id]
+    Turns free text into an FTS5 MATCH expression in which every word (or, with
+    match_any, at least one word) must match, after stemming and as a prefix
+    unless prefix=False.
+    Example: build_fts_query("cherry tomatoes", "item") -> 'item : ("cherry"* "tomatoes"*)'
     
-    if item_name:
-        query += " AND LOWER(item) LIKE ?"
-        params.append(f"%{item_name.lower()}%")
+    Returns:
+        The expression, or None if the text has no searchable words
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = (" OR " if match_any else " ").join(f'"{word}"*' if prefix else f'"{word}"' for word in words)
+    return f"{column} : ({terms})" if column else terms
+
+
+def _item_condition(item: str) -> Tuple[str, List]:
+    """SQL condition matching logs whose item contains the given words (FTS5, else LIKE)."""
+    query = build_fts_query(item, column="item") if FTS5_AVAILABLE else None
+    if query:
+        return "id IN (SELECT rowid FROM farm_logs_fts WHERE farm_logs_fts MATCH ?)", [query]
+    return "LOWER(item) LIKE ?", [f"%{item.lower()}%"]
+
+
+@instrumented("db")
+def search_logs(user_id: str, text: str, limit: int = 20, field: Optional[str] = None,
+                actions: Optional[List[str]] = None, match_any: bool = False,
+                start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+    """
+    Full-text search over log items and notes, best matches first.
+    Words are stemmed and prefix-matched ("tomato" finds "cherry tomatoes").
+    Item matches rank above note matches.
     
-    query += " GROUP BY item, action ORDER BY total_value DESC"
+    Args:
+        user_id: User identifier
+        text: Search words
+        limit: Maximum number of results
+        field: 'item' or 'note' to search a single column (default: both)
+        actions: Optional list of actions to include
+        match_any: Match logs containing any of the words (default: all words)
+        start: Optional inclusive ISO timestamp lower bound
+        end: Optional exclusive ISO timestamp upper bound
     
-    cursor = conn.execute(query, params)
-    results = cursor.fetchall()
-    conn.close()
+    Returns:
+        List of log dictionaries with a 'score' (BM25; lower is better, None without FTS5)
+    """
+    extra_clause = ""
+    extra_params: List = []
+    if actions:
+        extra_clause += f" AND l.action IN ({', '.join('?' for _ in actions)})"
+        extra_params.extend(actions)
+    if start:
+        extra_clause += " AND l.ts_epoch >= ?"
+        extra_params.append(normalize_timestamp(start)[1])
+    if end:
+        extra_clause += " AND l.ts_epoch < ?"
+        extra_params.append(normalize_timestamp(end)[1])
     
-    return results
+    if FTS5_AVAILABLE:
+        query = build_fts_query(text, column=field, match_any=match_any)
+        if query is None:
+            return []
+        sql = f"""
+            SELECT l.id, l.user_id, l.timestamp, l.action, l.item, l.quantity, l.unit, l.value_usd, l.note,
+                   bm25(farm_logs_fts, 2.0, 1.0) AS score
+            FROM farm_logs_fts
+            JOIN farm_logs l ON l.id = farm_logs_fts.rowid
+            WHERE farm_logs_fts MATCH ? AND l.user_id = ?{extra_clause}
+            ORDER BY score
+            LIMIT ?
+        """
+        params = [query, user_id, *extra_params, limit]
+    else:
+        words = re.findall(r"\w+", text.lower())
+        if not words:
+            return []
+        columns = [field] if field else ["item", "note"]
+        word_clause = (" OR " if match_any else " AND ").join(
+            "(" + " OR ".join(f"LOWER(COALESCE(l.{c}, '')) LIKE ?" for c in columns) + ")" for _ in words
+        )
+        sql = f"""
+            SELECT l.id, l.user_id, l.timestamp, l.action, l.item, l.quantity, l.unit, l.value_usd, l.note,
+                   NULL AS score
+            FROM farm_logs l
+            WHERE l.user_id = ? AND ({word_clause}){extra_clause}
+            ORDER BY l.ts_epoch DESC
+            LIMIT ?
+        """
+        params = [user_id, *(f"%{w}%" for w in words for _ in columns), *extra_params, limit]
+    
+    with db_connection(user_id) as conn:
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def _filter_clause(user_id: str, actions: Optional[List[str]] = None, item: Optional[str] = None,
+                   start: Optional[str] = None, end: Optional[str] = None) -> Tuple[str, List]:
+    """Builds a parameterized WHERE clause for the common log filters."""
+    clause = "WHERE user_id = ?"
+    params: List = [user_id]
+    if actions:
+        clause += f" AND action IN ({', '.join('?' for _ in actions)})"
+        params.extend(actions)
+    if item:
+        condition, condition_params = _item_condition(item)
+        clause += f" AND {condition}"
+        params.extend(condition_params)
+    if start:
+        clause += " AND ts_epoch >= ?"
+        params.append(normalize_timestamp(start)[1])
+    if end:
+        clause += " AND ts_epoch < ?"
+        params.append(normalize_timestamp(end)[1])
+    return clause, params
+
+
+@instrumented("db")
+def aggregate_logs(user_id: str, actions: Optional[List[str]] = None, item: Optional[str] = None,
+                   start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """
+    Aggregates matching logs with a single parameterized query.
+    
+    Args:
+        user_id: User identifier
+        actions: Optional list of actions to include (e.g. ['expense', 'purchase'])
+        item: Optional item words (stemmed prefix match)
+        start: Optional inclusive ISO timestamp lower bound
+        end: Optional exclusive ISO timestamp upper bound
+    
+    Returns:
+        Dictionary with count, total_value, and quantities (total quantity per unit)
+    """
+    where, params = _filter_clause(user_id, actions, item, start, end)
+    with db_connection(user_id) as conn:
+        rows = conn.execute(f"""
+            SELECT unit, COUNT(*) as count,
+                   COALESCE(SUM(quantity), 0) as total_quantity,
+                   COALESCE(SUM(value_usd), 0) as total_value
+            FROM farm_logs
+            {where}
+            GROUP BY unit
+        """, params).fetchall()
+    
+    return {
+        'count': sum(row['count'] for row in rows),
+        'total_value': float(sum(row['total_value'] for row in rows)),
+        'quantities': {row['unit']: float(row['total_quantity']) for row in rows if row['total_quantity']},
+    }
+
+
+@instrumented("db")
+def find_extreme_log(user_id: str, largest: bool = True, actions: Optional[List[str]] = None,
+                     item: Optional[str] = None, start: Optional[str] = None,
+                     end: Optional[str] = None) -> Optional[Dict]:
+    """
+    Returns the log with the highest (or lowest) value_usd among matching logs.
+    Logs without a value are ignored. Returns None if nothing matches.
+    """
+    where, params = _filter_clause(user_id, actions, item, start, end)
+    order = "DESC" if largest else "ASC"
+    with db_connection(user_id) as conn:
+        row = conn.execute(f"""
+            SELECT id, user_id, timestamp, action, item, quantity, unit, value_usd, note
+            FROM farm_logs
+            {where} AND value_usd IS NOT NULL
+            ORDER BY value_usd {order}
+            LIMIT 1
+        """, params).fetchone()
+    return dict(row) if row else None
+
+
+@instrumented("db")
+def read_log_keys(user_id: str) -> set:
+    """
+    Returns the (timestamp, item, action) key of every stored log for a user.
+    Used to skip duplicates when importing.
+    """
+    with db_connection(user_id) as conn:
+        cursor = conn.execute(
+            "SELECT timestamp, item, action FROM farm_logs WHERE user_id = ?", (user_id,)
+        )
+        return {tuple(row) for row in cursor}
+
+
+# === Async API ===
+# Thread-offloaded wrappers for asyncio callers. The connection pool is
+# thread-safe, so concurrent coroutines share pooled handles safely.
+
+async def aread_logs(user_id: str, limit: int = 100, action: Optional[str] = None,
+                     start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+    """Async variant of read_logs."""
+    return await asyncio.to_thread(read_logs, user_id, limit, action, start, end)
+
+
+async def awrite_log(entry: dict, user_id: str) -> bool:
+    """Async variant of write_log."""
+    return await asyncio.to_thread(write_log, entry, user_id)
+
+
+async def awrite_logs(entries: Iterable[dict], user_id: str, all_or_nothing: bool = False) -> List[Dict]:
+    """Async variant of write_logs."""
+    return await asyncio.to_thread(write_logs, entries, user_id, all_or_nothing)
+
+
+async def aget_summary_stats(user_id: str, start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """Async variant of get_summary_stats."""
+    return await asyncio.to_thread(get_summary_stats, user_id, start, end)
+
+
+async def aget_item_summary(user_id: str, item_name: Optional[str] = None,
+                            start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple]:
+    """Async variant of get_item_summary."""
+    return await asyncio.to_thread(get_item_summary, user_id, item_name, start, end)
+
+
+async def asearch_logs(user_id: str, text: str, limit: int = 20, field: Optional[str] = None,
+                       actions: Optional[List[str]] = None, match_any: bool = False,
+                       start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+    """Async variant of search_logs."""
+    return await asyncio.to_thread(search_logs, user_id, text, limit, field, actions, match_any, start, end)
+
+
+async def aaggregate_logs(user_id: str, actions: Optional[List[str]] = None, item: Optional[str] = None,
+                          start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """Async variant of aggregate_logs."""
+    return await asyncio.to_thread(aggregate_logs, user_id, actions, item, start, end)
+
+
+async def afind_extreme_log(user_id: str, largest: bool = True, actions: Optional[List[str]] = None,
+                            item: Optional[str] = None, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Optional[Dict]:
+    """Async variant of find_extreme_log."""
+    return await asyncio.to_thread(find_extreme_log, user_id, largest, actions, item, start, end)
+
+
+# === Rollup Maintenance ===
+
+def _rebuild_rollups(conn: sqlite3.Connection, user_id: Optional[str] = None):
+    """Recomputes rollup rows from farm_logs (all users in the file, or one user)."""
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id else ("", ())
+    conn.execute(f"DELETE FROM farm_stats {where}", params)
+    conn.execute(f"DELETE FROM farm_item_stats {where}", params)
+    conn.execute(f"""
+        INSERT INTO farm_stats (user_id, action, count, total_value)
+        SELECT user_id, action, COUNT(*), COALESCE(SUM(value_usd), 0)
+        FROM farm_logs {where}
+        GROUP BY user_id, action
+    """, params)
+    conn.execute(f"""
+        INSERT INTO farm_item_stats (user_id, item, action, count, total_quantity, total_value)
+        SELECT user_id, item, action, COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(value_usd), 0)
+        FROM farm_logs {where}
+        GROUP BY user_id, item, action
+    """, params)
+
+
+def rebuild_rollups(user_id: str):
+    """
+    Recomputes a user's farm_stats and farm_item_stats rows from farm_logs.
+    Use after bulk edits made outside db_storage (e.g. with triggers disabled).
+    """
+    with db_connection(user_id) as conn:
+        _rebuild_rollups(conn, user_id)
+        conn.commit()
+
+
+def verify_rollups(user_id: str, tolerance: float = 1e-6) -> List[str]:
+    """
+    Compares a user's rollup tables against a full aggregation of farm_logs.
+    
+    Returns:
+        List of human-readable mismatches (empty if the rollups are correct)
+    """
+    with db_connection(user_id) as conn:
+        expected_stats = conn.execute("""
+            SELECT action, COUNT(*), COALESCE(SUM(value_usd), 0)
+            FROM farm_logs WHERE user_id = ? GROUP BY action
+        """, (user_id,)).fetchall()
+        actual_stats = conn.execute("""
+            SELECT action, count, total_value FROM farm_stats WHERE user_id = ?
+        """, (user_id,)).fetchall()
+        expected_items = conn.execute("""
+            SELECT item, action, COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(value_usd), 0)
+            FROM farm_logs WHERE user_id = ? GROUP BY item, action
+        """, (user_id,)).fetchall()
+        actual_items = conn.execute("""
+            SELECT item, action, count, total_quantity, total_value
+            FROM farm_item_stats WHERE user_id = ?
+        """, (user_id,)).fetchall()
+    
+    def compare(label, expected_rows, actual_rows, key_len):
+        problems = []
+        expected = {tuple(r[:key_len]): tuple(r[key_len:]) for r in expected_rows}
+        actual = {tuple(r[:key_len]): tuple(r[key_len:]) for r in actual_rows}
+        for key in sorted(set(expected) | set(actual)):
+            want, got = expected.get(key), actual.get(key)
+            if want is None or got is None or any(abs(w - g) > tolerance for w, g in zip(want, got)):
+                problems.append(f"{label} {key}: expected {want}, found {got}")
+        return problems
+    
+    return (compare("farm_stats", expected_stats, actual_stats, 1) +
+            compare("farm_item_stats", expected_items, actual_items, 2))
+
+
+def list_database_files(data_dir: str = DATA_DIR) -> List[str]:
+    """Returns the paths of all per-user databases under data_dir, plus the shared database if present."""
+    paths = []
+    if os.path.isdir(data_dir):
+        paths = [os.path.join(data_dir, filename) for filename in sorted(os.listdir(data_dir))
+                 if filename.endswith("_data.db")]
+    if os.path.exists(SHARED_DB_PATH):
+        paths.append(SHARED_DB_PATH)
+    return paths
+
+
+def list_user_ids(data_dir: str = DATA_DIR) -> List[str]:
+    """Returns every user ID stored in the databases under data_dir (and the shared database)."""
+    user_ids = set()
+    for db_path in list_database_files(data_dir):
+        with _pool.connection(db_path) as conn:
+            rows = conn.execute("SELECT DISTINCT user_id FROM farm_logs").fetchall()
+        user_ids.update(row[0] for row in rows)
+    return sorted(user_ids)
+
+
+def migrate_database(db_path: str) -> Dict:
+    """
+    Brings one database file to SCHEMA_VERSION (the pool also does this lazily on first use).
+    
+    Returns:
+        Dict with from_version, to_version, rows and unparsed (rows whose timestamp
+        couldn't be converted to ts_epoch)
+    """
+    conn = _open_connection(db_path)
+    try:
+        from_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        _init_schema(conn)
+        return {
+            'from_version': from_version,
+            'to_version': conn.execute("PRAGMA user_version").fetchone()[0],
+            'rows': conn.execute("SELECT COUNT(*) FROM farm_logs").fetchone()[0],
+            'unparsed': conn.execute("SELECT COUNT(*) FROM farm_logs WHERE ts_epoch IS NULL").fetchone()[0],
+        }
+    finally:
+        conn.close()
+
+
+# === Backend Migration ===
+
+_COPY_LOG_SQL = """
+    INSERT INTO farm_logs (user_id, timestamp, ts_epoch, action, item, quantity, unit, value_usd, note, created_at)
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (
+        SELECT 1 FROM farm_logs
+        WHERE user_id = ? AND ts_epoch IS ? AND timestamp = ? AND action = ? AND item = ?
+    )
+"""
+
+
+def copy_logs(src_path: str, dest_path: str, user_id: Optional[str] = None,
+              chunk_size: int = BULK_CHUNK_SIZE) -> Dict:
+    """
+    Copies logs from one database file into another (e.g. per-user files into the
+    shared database). Rows already present in the destination are skipped, so the
+    copy can be re-run safely; rollups, search index and data versions are kept
+    current by the destination's triggers.
+    
+    Args:
+        src_path: Source database file (any schema version)
+        dest_path: Destination database file (created and migrated if needed)
+        user_id: Copy only this user's logs (default: all)
+        chunk_size: Rows per transaction
+    
+    Returns:
+        Dict with read and copied row counts
+    """
+    src = _open_readonly(src_path)
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id else ("", ())
+    result = {'read': 0, 'copied': 0}
+    try:
+        cursor = src.execute(f"""
+            SELECT user_id, timestamp, action, item, quantity, unit, value_usd, note, created_at
+            FROM farm_logs {where} ORDER BY id
+        """, params)
+        with _pool.connection(dest_path) as conn:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                batch = []
+                for uid, timestamp, action, item, quantity, unit, value, note, created_at in rows:
+                    try:
+                        timestamp, epoch = normalize_timestamp(timestamp)
+                    except ValueError:
+                        epoch = None  # Kept as-is, like unparseable rows in migrations
+                    batch.append((uid, timestamp, epoch, action, item, quantity, unit, value, note, created_at,
+                                  uid, epoch, timestamp, action, item))
+                copied = conn.executemany(_COPY_LOG_SQL, batch).rowcount  # Excludes trigger writes
+                conn.commit()
+                result['read'] += len(rows)
+                result['copied'] += copied
+    finally:
+        src.close()
+    return result
+
+
+def merge_into_shared(db_paths: Optional[List[str]] = None, dest_path: str = SHARED_DB_PATH) -> Dict[str, Dict]:
+    """
+    Merges per-user database files into the shared database.
+    Source files are left in place; set AGRI_DB_BACKEND=shared to switch over.
+    
+    Returns:
+        Dict of source path -> copy_logs result
+    """
+    if db_paths is None:
+        db_paths = [path for path in list_database_files() if os.path.abspath(path) != os.path.abspath(dest_path)]
+    return {path: copy_logs(path, dest_path) for path in db_paths}
+
+
+def _remove_database_file(db_path: str):
+    """Closes pooled handles and deletes a database file with its WAL sidecars."""
+    _pool.discard(db_path)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    _path_cache.clear()
+
+
+def relocate_legacy_files(data_dir: str = DATA_DIR) -> List[Dict]:
+    """
+    Moves each user's logs out of legacy-named files (see _legacy_file_name)
+    into their collision-free per-user file. A legacy file is deleted once every
+    user in it has been copied.
+    
+    Returns:
+        One dict per (file, user): file, user_id, destination, read, copied
+    """
+    moved = []
+    for db_path in list_database_files(data_dir):
+        if db_path == SHARED_DB_PATH:
+            continue
+        src = _open_readonly(db_path)
+        try:
+            counts = dict(src.execute("SELECT user_id, COUNT(*) FROM farm_logs GROUP BY user_id").fetchall())
+        finally:
+            src.close()
+        
+        filename = os.path.basename(db_path)
+        misplaced = [uid for uid in counts if _user_file_name(uid) != filename]
+        if not misplaced:
+            continue
+        for user_id in misplaced:
+            destination = os.path.join(data_dir, _user_file_name(user_id))
+            result = copy_logs(db_path, destination, user_id)
+            moved.append({'file': db_path, 'user_id': user_id, 'destination': destination, **result})
+        if len(misplaced) == len(counts):
+            _remove_database_file(db_path)
+    _path_cache.clear()
+    return moved
+
+
+@instrumented("db")
+def delete_user_data(user_id: str):
+    """
+    Deletes all of a user's logs. A per-user file holding only this user is
+    removed outright; in the shared database (or a legacy file shared with
+    other users) only the user's rows are deleted.
+    """
+    db_path = get_data_file_path(user_id)
+    if not os.path.exists(db_path):
+        return
+    with _pool.connection(db_path) as conn:
+        others = conn.execute(
+            "SELECT 1 FROM farm_logs WHERE user_id != ? LIMIT 1", (user_id,)
+        ).fetchone()
+        if DB_BACKEND == "shared" or others:
+            conn.execute("DELETE FROM farm_logs WHERE user_id = ?", (user_id,))
+            conn.commit()
+            return
+    _remove_database_file(db_path)
@@ -0,0 +1,284 @@
+"""
+Legacy JSON Log Importer
+Loads the old per-user JSON log files (data/<name>_data.json) into SQLite.
+
+Files are stream-parsed (never loaded whole), numeric fields are coerced,
+actions are normalized to sale/harvest/purchase/expense, and entries are
+deduplicated on (timestamp, item, action) against the file and the database.
+
+Usage:
+    python import_legacy.py data/john_data.json --user john@gmail.com
+    python import_legacy.py data/                         # All *_data.json files
+    python import_legacy.py data/ --domain gmail.com      # john_data.json → john@gmail.com
+    python import_legacy.py data/ --workers 4 --dry-run   # Parallel, no writes
+
+Without --user/--domain the user ID is the file name stem (john_data.json → "john").
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from db_storage import normalize_timestamp, read_log_keys, write_logs_stream, BULK_CHUNK_SIZE
+
+READ_BUFFER_SIZE = 64 * 1024
+
+ACTION_SYNONYMS = {
+    "sale": "sale", "sales": "sale", "sell": "sale", "sold": "sale", "selling": "sale",
+    "harvest": "harvest", "harvested": "harvest", "harvesting": "harvest", "picked": "harvest",
+    "collected": "harvest",
+    "purchase": "purchase", "purchases": "purchase", "purchased": "purchase", "buy": "purchase",
+    "bought": "purchase",
+    "expense": "expense", "expenses": "expense", "spent": "expense", "spend": "expense",
+    "cost": "expense", "paid": "expense",
+}
+# Used when the action is non-canonical (e.g. "record"): infer from the note
+_NOTE_ACTION_PATTERN = re.compile(r"\b(sold|sell|harvested|picked|collected|bought|purchased|spent|paid)\b",
+                                  re.IGNORECASE)
+
+
+# === Streaming parser ===
+
+def iter_json_array(path: str, buffer_size: int = READ_BUFFER_SIZE) -> Iterator[dict]:
+    """
+    Yields the objects of a top-level JSON array one at a time.
+    Memory use is bounded by the buffer size plus the largest single object.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+
+        while True:
+            # Skip whitespace and separators
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{path}: expected a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    obj, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    obj = None  # Object spans the buffer boundary: read more
+                if obj is not None:
+                    position = end
+                    yield obj
+                    continue
+            elif eof:
+                if started:
+                    raise ValueError(f"{path}: unterminated JSON array")
+                return
+
+            # Refill: drop consumed text, append the next block
+            chunk = f.read(buffer_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+# === Normalization ===
+
+def _coerce_number(value) -> Optional[float]:
+    """Converts 120, "120", "$1,200.50" to float; None for blanks or garbage."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    cleaned = str(value).strip().replace("$", "").replace(",", "")
+    try:
+        return float(cleaned) if cleaned else None
+    except ValueError:
+        return None
+
+
+def normalize_action(action, note: Optional[str] = None) -> Optional[str]:
+    """Maps legacy actions ("sell", "sold", ...) to the canonical vocabulary."""
+    key = str(action or "").strip().lower()
+    if key in ACTION_SYNONYMS:
+        return ACTION_SYNONYMS[key]
+    match = _NOTE_ACTION_PATTERN.search(note or "")
+    if match:
+        return ACTION_SYNONYMS[match.group(1).lower()]
+    return None
+
+
+def normalize_entry(raw: dict) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Cleans one legacy entry.
+
+    Returns:
+        (entry, None) on success, or (None, reason) if it can't be imported
+    """
+    if not isinstance(raw, dict):
+        return None, "not an object"
+
+    note = raw.get("note")
+    note = note.strip() if isinstance(note, str) and note.strip() else None
+    action = normalize_action(raw.get("action"), note)
+    if action is None:
+        return None, f"unknown action {raw.get('action')!r}"
+
+    item = str(raw.get("item") or "").strip()
+    if not item:
+        return None, "missing item"
+
+    if not raw.get("timestamp"):
+        return None, "missing timestamp"
+    try:
+        timestamp = normalize_timestamp(raw["timestamp"])[0]  # Same UTC form db_storage stores
+    except (TypeError, ValueError):
+        return None, f"invalid timestamp {raw['timestamp']!r}"
+
+    unit = raw.get("unit")
+    entry = {
+        "action": action,
+        "item": item,
+        "quantity": _coerce_number(raw.get("quantity")),
+        "unit": str(unit).strip() if unit not in (None, "") else None,
+        "value_usd": _coerce_number(raw.get("value_usd")),
+        "note": note,
+        "timestamp": timestamp,
+    }
+    return entry, None
+
+
+# === Import ===
+
+def user_id_for_file(path: str, domain: Optional[str] = None) -> str:
+    """john_data.json → "john" (or "john@<domain>")."""
+    stem = os.path.basename(path)
+    stem = stem[: -len(".json")] if stem.endswith(".json") else stem
+    stem = stem[: -len("_data")] if stem.endswith("_data") else stem
+    return f"{stem}@{domain}" if domain else stem
+
+
+def import_file(path: str, user_id: str, chunk_size: int = BULK_CHUNK_SIZE, dry_run: bool = False) -> Dict:
+    """
+    Stream-imports one legacy file into the user's farm_logs.
+
+    Returns:
+        Report dict: file, user_id, read, imported, duplicates, invalid, errors, seconds, bytes
+    """
+    started = time.perf_counter()
+    report = {"file": path, "user_id": user_id, "read": 0, "imported": 0, "duplicates": 0,
+              "invalid": 0, "errors": [], "bytes": os.path.getsize(path)}
+    seen = read_log_keys(user_id)
+
+    def clean_entries():
+        for raw in iter_json_array(path):
+            report["read"] += 1
+            entry, reason = normalize_entry(raw)
+            if entry is None:
+                report["invalid"] += 1
+                if len(report["errors"]) < 20:
+                    report["errors"].append(f"entry {report['read']}: {reason}")
+                continue
+            key = (entry["timestamp"], entry["item"], entry["action"])
+            if key in seen:
+                report["duplicates"] += 1
+                continue
+            seen.add(key)
+            yield entry
+
+    if dry_run:
+        report["imported"] = sum(1 for _ in clean_entries())
+    else:
+        result = write_logs_stream(clean_entries(), user_id, chunk_size=chunk_size)
+        report["imported"] = result["written"]
+        report["invalid"] += result["failed"]
+        report["errors"].extend(f"row {index}: {error}" for index, error in result["errors"])
+
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def _import_job(args: Tuple) -> Dict:
+    path, user_id, chunk_size, dry_run = args
+    try:
+        return import_file(path, user_id, chunk_size, dry_run)
+    except (OSError, ValueError) as e:
+        return {"file": path, "user_id": user_id, "read": 0, "imported": 0, "duplicates": 0,
+                "invalid": 0, "errors": [str(e)], "bytes": 0, "seconds": 0.0, "failed": True}
+
+
+def import_paths(paths: List[str], user_ids: List[str], workers: int = 1,
+                 chunk_size: int = BULK_CHUNK_SIZE, dry_run: bool = False) -> List[Dict]:
+    """Imports files, in parallel processes when workers > 1 (one file per worker)."""
+    jobs = [(path, user_id, chunk_size, dry_run) for path, user_id in zip(paths, user_ids)]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_import_job, jobs))
+    return [_import_job(job) for job in jobs]
+
+
+def find_legacy_files(directory: str) -> List[str]:
+    """Returns every *_data.json file in a directory."""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith("_data.json"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import legacy JSON logs into SQLite")
+    parser.add_argument("path", help="A legacy *_data.json file or a directory of them")
+    parser.add_argument("--user", type=str, help="User ID (email) for a single file")
+    parser.add_argument("--domain", type=str, help="Derive user IDs as <file stem>@<domain>")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel import processes")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="Rows per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and validate without writing")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        if args.user:
+            print("⚠️ --user only applies to a single file; use --domain for directories")
+            return
+        paths = find_legacy_files(args.path)
+    else:
+        paths = [args.path]
+    if not paths:
+        print(f"No *_data.json files found in {args.path}")
+        return
+    user_ids = [args.user or user_id_for_file(path, args.domain) for path in paths]
+
+    print(f"📥 Importing {len(paths)} file(s){' (dry run)' if args.dry_run else ''}...")
+    started = time.perf_counter()
+    reports = import_paths(paths, user_ids, args.workers, args.chunk_size, args.dry_run)
+    elapsed = time.perf_counter() - started
+
+    for report in reports:
+        mark = "✗" if report.get("failed") else "✓"
+        print(f"  {mark} {os.path.basename(report['file'])} → {report['user_id']}: "
+              f"{report['imported']} imported, {report['duplicates']} duplicates, "
+              f"{report['invalid']} invalid ({report['seconds']:.2f}s)")
+        for error in report["errors"][:5]:
+            print(f"      {error}")
+
+    # Throughput report
+    total_read = sum(r["read"] for r in reports)
+    total_imported = sum(r["imported"] for r in reports)
+    total_bytes = sum(r["bytes"] for r in reports)
+    print("\n" + "=" * 50)
+    print(f"Rows read:      {total_read}")
+    print(f"Rows imported:  {total_imported}")
+    print(f"Duplicates:     {sum(r['duplicates'] for r in reports)}")
+    print(f"Invalid:        {sum(r['invalid'] for r in reports)}")
+    print(f"Elapsed:        {elapsed:.2f}s")
+    if elapsed > 0:
+        print(f"Throughput:     {total_read / elapsed:,.0f} rows/s, {total_bytes / elapsed / 1e6:.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Fast-Path Intent Classifier
+Classifies obvious requests locally so they skip the Watsonx routing call.
+
+Two stages run before the LLM router:
+    1. Keyword/regex rules for unambiguous phrasings ("sold 20 lbs carrots for $30")
+    2. A small TF-IDF + logistic regression model trained on the examples
+       in routing_prompt.txt, stored as NumPy arrays (.npz)
+
+Only inputs that neither stage labels with enough confidence go to the LLM.
+
+Usage:
+    python intent_classifier.py "sold 20 lbs carrots for $30"   # Classify text
+    python intent_classifier.py --train                         # Retrain model
+"""
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import register_stats
+
+INTENTS = ["LOG", "QUERY", "REPORT", "GENERAL"]
+
+# === Configuration ===
+FASTPATH_ENABLED = os.getenv("AGRI_FASTPATH_ENABLED", "1") not in ("0", "false", "False")
+RULE_THRESHOLD = float(os.getenv("AGRI_FASTPATH_RULE_THRESHOLD", "0.9"))
+MODEL_THRESHOLD = float(os.getenv("AGRI_FASTPATH_MODEL_THRESHOLD", "0.8"))
+ROUTING_PROMPT_PATH = os.getenv("AGRI_ROUTING_PROMPT_PATH", "routing_prompt.txt")
+MODEL_PATH = os.getenv("AGRI_INTENT_MODEL_PATH", os.path.join("data", "intent_model.npz"))
+
+
+# === Stage 1: Rules ===
+# (intent, pattern, confidence). An intent's rule score is its best matching rule.
+_QUESTION_START = r"(what|how|show|generate|give|list|did|when|who|which|can|could|tell|find|check)"
+# Wording that ties a question to logged data rather than advice ("did I sell", "my sales")
+_DATA_VERB = r"\b((did|have|had) (i|we)|(i|we) (sold|spent|earned|made|harvested|bought|paid|picked|collected))\b"
+_DATA_NOUN = r"\b(my|our) (sales|expenses|income|earnings|revenue|harvests?|purchases|profits?|logs?|entries)\b"
+_SUMMARY_WORDS = r"\b(report|summary|summarize|summarise|breakdown|break down|profit and loss|p&l|statement|overview|recap)\b"
+# Plans rather than things that happened ("I need to buy seeds for $20")
+_FUTURE = r"\b(need to|needs to|will|won't|plan to|planning to|going to|gonna|want to|wanna|hope to|should|might|would like to)\b|'ll\b"
+_OWNER_OR_PERIOD = r"\b(my|our|me|us|week|month|year|quarter|season|today|yesterday)\b"
+
+_RULES = [
+    # LOG: past-tense activity verbs or explicit "log this" phrasing
+    ("LOG", r"^\s*(i\s+|we\s+)?(just\s+)?(sold|harvested|bought|purchased|spent|paid|picked|collected)\b", 0.95),
+    ("LOG", r"^\s*(please\s+)?(log|record|note( down)?( that)?|write down|add (a|an) (sale|expense|purchase|harvest))\b", 0.95),
+    ("LOG", rf"^(?!.*\?)(?!\s*{_QUESTION_START}\b)(?!.*{_FUTURE}).*(\$\s?\d|\b\d+(\.\d+)?\s*(dollars|bucks|usd)\b)", 0.7),
+
+    # QUERY: questions about the user's own numbers. "how much ... my" alone is also
+    # advice ("how much water do I need for my tomatoes?"), so it stays below the threshold
+    ("QUERY", rf"^\s*how (much|many)\b.*({_DATA_VERB}|{_DATA_NOUN})", 0.95),
+    ("QUERY", r"^\s*how (much|many)\b.*\b(i|my|we|our)\b", 0.6),
+    ("QUERY", r"^\s*(did|have) (i|we)\b", 0.95),
+    ("QUERY", r"^\s*(when|who|where|which)\b.*\bdid (i|we)\b", 0.95),
+    ("QUERY", r"^\s*what('s| is| was| were| are)? (my|our|the total)\b", 0.9),
+    ("QUERY", r"^\s*(check|find|show me|tell me) (my|the) (total|last|biggest|largest)\b", 0.9),
+    ("QUERY", r"^\s*show me my\b", 0.8),
+
+    # REPORT: summaries and breakdowns over a period (of the user's data; not "the summary of the farm bill")
+    ("REPORT", rf"{_SUMMARY_WORDS}.*{_OWNER_OR_PERIOD}|{_OWNER_OR_PERIOD}.*{_SUMMARY_WORDS}", 0.95),
+    ("REPORT", _SUMMARY_WORDS, 0.6),
+    ("REPORT", r"\b(compare|top[- ]selling)\b", 0.85),
+
+    # GENERAL: greetings and farming advice
+    ("GENERAL", r"^\s*(hi|hello|hey|good (morning|afternoon|evening)|thanks|thank you|bye|goodbye)\b", 0.95),
+    ("GENERAL", r"\b(weather|forecast|market price|best time|when should i plant)\b|\bprice of\b(?! (my|our)\b)", 0.9),
+    ("GENERAL", r"^\s*how (do|should|can) (i|you|we) (treat|plant|grow|prevent|control|fertilize|prune|store)\b", 0.9),
+    ("GENERAL", r"^\s*how (much|many)\b.*\b(should|need|needs|ought to|per (acre|plant|row|hive|bird)|recommended)\b", 0.9),
+    # Plans with an amount aren't log entries (weak, but stops the model routing them to LOG)
+    ("GENERAL", rf"({_FUTURE}).*(\$\s?\d|\b\d+(\.\d+)?\s*(dollars|bucks|usd)\b)", 0.6),
+]
+_COMPILED_RULES = [(intent, re.compile(pattern, re.IGNORECASE), weight) for intent, pattern, weight in _RULES]
+
+
+def rule_scores(text: str) -> Dict[str, float]:
+    """Returns the best matching rule confidence for each intent (0 if none)."""
+    scores = {intent: 0.0 for intent in INTENTS}
+    for intent, pattern, weight in _COMPILED_RULES:
+        if weight > scores[intent] and pattern.search(text):
+            scores[intent] = weight
+    return scores
+
+
+# === Stage 2: Lexical model ===
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases, normalizes numbers/money, and returns unigrams plus bigrams."""
+    text = text.lower()
+    text = re.sub(r"\$\s?\d[\d,.]*", " <money> ", text)
+    text = re.sub(r"\d[\d,.]*", " <num> ", text)
+    words = re.findall(r"<money>|<num>|[a-z']+", text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def load_routing_examples(path: str = ROUTING_PROMPT_PATH) -> List[Tuple[str, str]]:
+    """Parses the Human/AI example pairs from the routing prompt."""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    pairs = re.findall(r"Human:\s*(.+?)\s*\nAI:\s*(LOG|QUERY|REPORT|GENERAL)", content)
+    return [(text.strip(), label) for text, label in pairs]
+
+
+class LexicalIntentModel:
+    """TF-IDF features + multinomial logistic regression, all in NumPy."""
+
+    def __init__(self, vocab: List[str], idf: np.ndarray, weights: np.ndarray, bias: np.ndarray,
+                 source_hash: str = ""):
+        self.vocab = list(vocab)
+        self.index = {term: i for i, term in enumerate(self.vocab)}
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.source_hash = source_hash
+
+    def _features(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), len(self.vocab)))
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                col = self.index.get(term)
+                if col is not None:
+                    matrix[row, col] += 1.0
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        """Returns class probabilities in INTENTS order."""
+        logits = self._features([text]) @ self.weights + self.bias
+        logits = logits[0] - logits[0].max()
+        exp = np.exp(logits)
+        return exp / exp.sum()
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], source_hash: str = "", epochs: int = 500,
+              learning_rate: float = 1.0, l2: float = 1e-3) -> "LexicalIntentModel":
+        """Fits the model with full-batch gradient descent (deterministic)."""
+        vocab = sorted({term for text, _ in examples for term in tokenize(text)})
+        doc_freq = np.zeros(len(vocab))
+        index = {term: i for i, term in enumerate(vocab)}
+        for text, _ in examples:
+            for term in set(tokenize(text)):
+                doc_freq[index[term]] += 1
+        idf = np.log((1 + len(examples)) / (1 + doc_freq)) + 1.0
+
+        model = cls(vocab, idf, np.zeros((len(vocab), len(INTENTS))), np.zeros(len(INTENTS)), source_hash)
+        features = model._features([text for text, _ in examples])
+        targets = np.zeros((len(examples), len(INTENTS)))
+        for row, (_, label) in enumerate(examples):
+            targets[row, INTENTS.index(label)] = 1.0
+
+        for _ in range(epochs):
+            logits = features @ model.weights + model.bias
+            logits -= logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            error = (probs - targets) / len(examples)
+            model.weights -= learning_rate * (features.T @ error + l2 * model.weights)
+            model.bias -= learning_rate * error.sum(axis=0)
+        return model
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, vocab=np.array(self.vocab), idf=self.idf, weights=self.weights,
+                 bias=self.bias, source_hash=np.array(self.source_hash))
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIntentModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["vocab"].tolist(), data["idf"], data["weights"], data["bias"],
+                       str(data["source_hash"]))
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# Lazy initialization - model is loaded (or trained) on first use
+_model: Optional[LexicalIntentModel] = None
+_model_lock = threading.Lock()
+
+
+def get_model(retrain: bool = False) -> LexicalIntentModel:
+    """
+    Loads the saved model, retraining it if missing or if routing_prompt.txt changed.
+    """
+    global _model
+    with _model_lock:
+        if _model is not None and not retrain:
+            return _model
+
+        source_hash = _file_hash(ROUTING_PROMPT_PATH)
+        model = None
+        if not retrain and os.path.exists(MODEL_PATH):
+            try:
+                model = LexicalIntentModel.load(MODEL_PATH)
+            except (OSError, ValueError, KeyError):
+                model = None
+            if model is not None and model.source_hash != source_hash:
+                model = None
+
+        if model is None:
+            model = LexicalIntentModel.train(load_routing_examples(), source_hash=source_hash)
+            try:
+                model.save(MODEL_PATH)
+            except OSError:
+                pass  # Read-only deployment: keep the in-memory model
+
+        _model = model
+        return _model
+
+
+# === Combined classifier ===
+
+# Per-decision counters: how each request was classified
+_stats_lock = threading.Lock()
+_decisions = {"rule": {i: 0 for i in INTENTS}, "model": {i: 0 for i in INTENTS}, "llm": 0}
+
+
+def classify(text: str) -> Tuple[Optional[str], float, str]:
+    """
+    Classifies text locally.
+
+    Returns:
+        (intent, confidence, source) where source is "rule" or "model".
+        intent is None (source "llm") when confidence is below the thresholds.
+    """
+    scores = rule_scores(text)
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    (rule_intent, top), (_, second) = ranked[0], ranked[1]
+    # Conflicting rules lower confidence
+    rule_confidence = top - second if second > 0 else top
+
+    if rule_confidence >= RULE_THRESHOLD:
+        return rule_intent, rule_confidence, "rule"
+
+    probs = get_model().predict_proba(text)
+    model_intent = INTENTS[int(np.argmax(probs))]
+    confidence = float(probs.max())
+    if rule_confidence > 0 and model_intent == rule_intent:
+        # Rule and model agree: combine as independent evidence
+        confidence = 1 - (1 - rule_confidence) * (1 - confidence)
+    elif scores[rule_intent] > scores[model_intent]:
+        # A rule points elsewhere (e.g. an advice "how much should I..."): let the LLM decide
+        return None, confidence, "llm"
+
+    if confidence >= MODEL_THRESHOLD:
+        return model_intent, confidence, "model"
+    return None, confidence, "llm"
+
+
+def fast_classify(text: str) -> Optional[str]:
+    """
+    Returns an intent if the local classifier is confident, else None.
+    Records the decision in the fast-path counters.
+    """
+    if not FASTPATH_ENABLED:
+        record_llm_fallback()
+        return None
+
+    intent, _, source = classify(text)
+    if intent is None:
+        record_llm_fallback()
+    else:
+        with _stats_lock:
+            _decisions[source][intent] += 1
+    return intent
+
+
+def record_llm_fallback():
+    """Counts a request that needed the LLM router."""
+    with _stats_lock:
+        _decisions["llm"] += 1
+
+
+def get_classifier_stats() -> Dict:
+    """Returns fast-path counters, including LLM round-trips skipped."""
+    with _stats_lock:
+        rule_total = sum(_decisions["rule"].values())
+        model_total = sum(_decisions["model"].values())
+        total = rule_total + model_total + _decisions["llm"]
+        return {
+            "rule": dict(_decisions["rule"]),
+            "model": dict(_decisions["model"]),
+            "llm_calls": _decisions["llm"],
+            "llm_calls_skipped": rule_total + model_total,
+            "skip_rate": (rule_total + model_total) / total if total else 0.0,
+        }
+
+
+register_stats("classifier", get_classifier_stats, "Local intent classifier decisions", gauges=("skip_rate",))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fast-path intent classifier")
+    parser.add_argument("text", nargs="?", help="Text to classify")
+    parser.add_argument("--train", action="store_true", help="Retrain the lexical model")
+    args = parser.parse_args()
+
+    if args.train:
+        model = get_model(retrain=True)
+        print(f"✅ Trained on {len(load_routing_examples())} examples ({len(model.vocab)} features) → {MODEL_PATH}")
+    if args.text:
+        intent, confidence, source = classify(args.text)
+        print(f"{intent or 'LLM'} (confidence {confidence:.2f}, via {source})")
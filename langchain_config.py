@@ -2,11 +2,20 @@
 IBM WatsonX LLM Configuration
 Initializes the Granite-13B language model for use across all workflows.
 Supports both local .env and Streamlit Cloud secrets.
+
+AGRI_LLM_MODE=record saves every call to a cassette; AGRI_LLM_MODE=replay serves
+calls from it offline with their recorded timing (see llm_cassette.py).
 """
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_ibm import WatsonxLLM
 
+from llm_cassette import REPLAY_ON_MISS, ReplayLLM, cassette_recorder, model_name
+from metrics import METRICS_ENABLED, record_llm
+
 # Load environment variables from .env (local)
 load_dotenv()
 
@@ -25,6 +34,17 @@ def get_credentials():
     
     return watsonx_url, project_id, apikey
 
+SMALL_MODEL_ID = "ibm/granite-4-h-small"
+LARGE_MODEL_ID = "ibm/granite-13b-chat-v2"
+
+# "live" (default), "record" or "replay"
+LLM_MODE = os.getenv("AGRI_LLM_MODE", "live")
+
+# Stop sequences for JSON-only prompts (LOG extraction, combined router), passed
+# per call as stop=... (Watsonx "stop_sequences"). Granite tends to follow the JSON
+# with commentary or invent the next few-shot turn; these end generation there.
+JSON_STOP_SEQUENCES = ["\nHuman:", "\nUser statement:", "\n\nNote", "\n\nExplanation", "\n\nThis JSON"]
+
 # Initialize IBM Granite LLMs
 # Supports two model types: "small" (fast) and "large" (detailed reports)
 def get_llm(model_type="small"):
@@ -35,33 +55,86 @@ def get_llm(model_type="small"):
         model_type: "small" for granite-4-h-small (fast, focused)
                    "large" for granite-13b-chat-v2 (detailed, reports)
     """
+    if LLM_MODE == "replay":
+        model_id = LARGE_MODEL_ID if model_type == "large" else SMALL_MODEL_ID
+        fallback = _get_watsonx_llm(model_type) if REPLAY_ON_MISS == "live" else None
+        return ReplayLLM(model_id=model_id, fallback=fallback)
+    return _get_watsonx_llm(model_type)
+
+
+def _get_watsonx_llm(model_type="small"):
+    """Creates the Watsonx model. In record mode (and for replay misses) its calls are saved to the cassette."""
     watsonx_url, project_id, apikey = get_credentials()
+    callbacks = [cassette_recorder] if LLM_MODE in ("record", "replay") else None
     
     if model_type == "large":
         # For REPORT workflow - detailed summaries and analysis
         return WatsonxLLM(
-            model_id="ibm/granite-13b-chat-v2",
+            model_id=LARGE_MODEL_ID,
             url=watsonx_url,
             project_id=project_id,
             apikey=apikey,
             params={
                 "max_new_tokens": 2048,  # Higher limit for comprehensive reports
                 "temperature": 0.3       # Slightly creative for better formatting
-            }
+            },
+            callbacks=callbacks
         )
     else:
         # For LOG, QUERY, GENERAL - fast, deterministic
         return WatsonxLLM(
-            model_id="ibm/granite-4-h-small",
+            model_id=SMALL_MODEL_ID,
             url=watsonx_url,
             project_id=project_id,
             apikey=apikey,
             params={
                 "max_new_tokens": 512,   # Adequate for focused tasks
                 "temperature": 0.0       # Deterministic output
-            }
+            },
+            callbacks=callbacks
         )
 
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Records latency and token counts of every LLM call (invoke, stream, async) in metrics.py.
+    Uses Watsonx token usage when the response reports it, else a chars/4 estimate.
+    A stream closed early by the caller (see workflows/json_stream.py) is not an error.
+    """
+    run_inline = True  # Keep the request's context (trace) for async calls
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, invocation_params=None, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), model_name(serialized, invocation_params),
+                              sum(len(p) for p in prompts))
+
+    def _finish(self, run_id, response, error=None):
+        started, model, prompt_chars = self._runs.pop(run_id, (time.perf_counter(), "unknown", 0))
+        usage = ((response.llm_output or {}).get("token_usage") or {}) if response is not None else {}
+        text = "".join(g.text for gens in response.generations for g in gens) if response is not None else ""
+        prompt_tokens = usage.get("input_token_count") or -(-prompt_chars // 4)
+        completion_tokens = usage.get("generated_token_count") or -(-len(text) // 4)
+        record_llm(model, time.perf_counter() - started, prompt_tokens, completion_tokens, error)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id, response)
+
+    def on_llm_error(self, error, *, run_id, response=None, **kwargs):
+        cancelled = isinstance(error, (GeneratorExit, asyncio.CancelledError))
+        self._finish(run_id, response, None if cancelled else type(error).__name__)
+
+
+_metrics_handler = LLMMetricsHandler()
+
+
+def _with_metrics(llm):
+    """Attaches the metrics callback to an LLM instance (once)."""
+    if METRICS_ENABLED and isinstance(llm.callbacks, (list, type(None))):
+        if not any(isinstance(cb, LLMMetricsHandler) for cb in llm.callbacks or []):
+            llm.callbacks = list(llm.callbacks or []) + [_metrics_handler]
+    return llm
+
 # Lazy initialization - cache instances for both models
 llm_small = None
 llm_large = None
@@ -78,8 +151,8 @@ def get_llm_instance(model_type="small"):
     if model_type == "large":
         if llm_large is None:
             llm_large = get_llm("large")
-        return llm_large
+        return _with_metrics(llm_large)
     else:
         if llm_small is None:
             llm_small = get_llm("small")
-        return llm_small
+        return _with_metrics(llm_small)
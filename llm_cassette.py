@@ -0,0 +1,325 @@
+"""
+LLM Record/Replay Cassettes
+Records real LLM calls (prompt → streamed response, with timing) and serves them
+back offline with the original latency, for reproducible load and latency tests.
+
+AGRI_LLM_MODE=record   Watsonx as usual; every call is also saved to the cassette
+AGRI_LLM_MODE=replay   No Watsonx: calls are answered from the cassette
+
+Recordings are keyed by a hash of (model, prompt, stop sequences) and looked up
+through the cassette's primary index, so replay cost doesn't grow with cassette
+size. Responses are stored as zlib-compressed chunk lists. A prompt recorded
+several times is replayed round-robin, which reproduces its latency spread;
+time to first token and total duration are replayed (scaled by
+AGRI_REPLAY_SPEED), with chunks spread evenly in between.
+
+Usage:
+    python llm_cassette.py                  # cassette summary (prompts, size, latency by model)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun, BaseCallbackHandler, CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from metrics import register_stats
+
+CASSETTE_PATH = os.getenv("AGRI_CASSETTE_PATH", os.path.join("data", "cassettes", "llm_cassette.db"))
+CASSETTE_MAX_PER_PROMPT = int(os.getenv("AGRI_CASSETTE_MAX_PER_PROMPT", "20"))
+REPLAY_SPEED = float(os.getenv("AGRI_REPLAY_SPEED", "1.0"))
+REPLAY_ON_MISS = os.getenv("AGRI_REPLAY_ON_MISS", "error")  # "error" or "live"
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+_stats = {"recorded": 0, "skipped_full": 0, "replayed": 0, "misses": 0, "live_fallbacks": 0}
+_replay_counts: Dict[str, int] = {}
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a prompt was never recorded."""
+
+
+def prompt_key(model: str, prompt: str, stop: Optional[List[str]] = None) -> str:
+    """Stable key for an LLM call (stop sequences change the output, so they are included)."""
+    raw = "\x1f".join((model, prompt, "\x1e".join(stop or [])))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Opens (once) the cassette database. Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        directory = os.path.dirname(CASSETTE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(CASSETTE_PATH, check_same_thread=False, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id INTEGER PRIMARY KEY,
+                prompt_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                chunks BLOB NOT NULL,
+                first_token_s REAL NOT NULL,
+                total_s REAL NOT NULL,
+                complete INTEGER NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_hash ON llm_calls(prompt_hash, id)")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def record_call(model: str, prompt: str, stop: Optional[List[str]], chunks: List[str],
+                first_token_s: float, total_s: float, complete: bool = True) -> bool:
+    """
+    Saves one LLM call. Returns False if the prompt already has CASSETTE_MAX_PER_PROMPT recordings.
+
+    Args:
+        chunks: Response text as streamed (a single chunk for invoke)
+        first_token_s: Seconds from the call to the first chunk
+        total_s: Seconds from the call to the last chunk
+        complete: False if the caller closed the stream early (e.g. JSON extraction)
+    """
+    key = prompt_key(model, prompt, stop)
+    blob = zlib.compress(json.dumps(chunks, separators=(",", ":")).encode("utf-8"))
+    with _lock:
+        conn = _get_conn()
+        (count,) = conn.execute("SELECT COUNT(*) FROM llm_calls WHERE prompt_hash = ?", (key,)).fetchone()
+        if count >= CASSETTE_MAX_PER_PROMPT:
+            _stats["skipped_full"] += 1
+            return False
+        conn.execute("""
+            INSERT INTO llm_calls (prompt_hash, model, chunks, first_token_s, total_s, complete, recorded_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (key, model, blob, first_token_s, total_s, int(complete), time.time()))
+        conn.commit()
+        _stats["recorded"] += 1
+    return True
+
+
+def next_recording(model: str, prompt: str, stop: Optional[List[str]] = None) -> Optional[Tuple[List[str], float, float]]:
+    """
+    Returns the next recording of a call, cycling through repeats of the same prompt.
+
+    Returns:
+        (chunks, first_token_s, total_s), or None if the call was never recorded
+    """
+    key = prompt_key(model, prompt, stop)
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT chunks, first_token_s, total_s FROM llm_calls WHERE prompt_hash = ? ORDER BY id", (key,)
+        ).fetchall()
+        if not rows:
+            _stats["misses"] += 1
+            return None
+        turn = _replay_counts.get(key, 0)
+        _replay_counts[key] = turn + 1
+        _stats["replayed"] += 1
+    blob, first_token_s, total_s = rows[turn % len(rows)]
+    return json.loads(zlib.decompress(blob)), first_token_s, total_s
+
+
+def model_name(serialized: Optional[Dict], invocation_params: Optional[Dict]) -> str:
+    """Model id of an LLM run as reported to callbacks."""
+    params = invocation_params or {}
+    return (params.get("model_id") or (serialized or {}).get("kwargs", {}).get("model_id")
+            or params.get("_type") or "unknown")
+
+
+class CassetteRecorder(BaseCallbackHandler):
+    """
+    Saves every LLM call made through an instance to the cassette (AGRI_LLM_MODE=record).
+    Streamed chunks and their timing are kept; a stream closed early by the caller is
+    saved as far as it got, since a replayed caller will stop at the same point.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, invocation_params=None, **kwargs):
+        if len(prompts) != 1:
+            return  # Batched generate() calls aren't used by the workflows
+        params = invocation_params or {}
+        self._runs[run_id] = {"model": model_name(serialized, params), "prompt": prompts[0],
+                              "stop": params.get("stop"), "started": time.perf_counter(),
+                              "first_token": None, "chunks": []}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None:
+            if run["first_token"] is None:
+                run["first_token"] = time.perf_counter()
+            run["chunks"].append(token)
+
+    def _save(self, run_id, response, complete: bool):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        ended = time.perf_counter()
+        chunks = run["chunks"]
+        if not chunks and response is not None:
+            text = "".join(g.text for gens in response.generations for g in gens)
+            chunks = [text] if text else []
+        if not chunks:
+            return
+        first_token = (run["first_token"] or ended) - run["started"]
+        record_call(run["model"], run["prompt"], run["stop"], chunks, first_token, ended - run["started"], complete)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._save(run_id, response, complete=True)
+
+    def on_llm_error(self, error, *, run_id, response=None, **kwargs):
+        if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+            self._save(run_id, response, complete=False)
+        else:
+            self._runs.pop(run_id, None)  # Failed calls aren't replayable
+
+
+cassette_recorder = CassetteRecorder()
+
+
+class ReplayLLM(LLM):
+    """
+    Serves recorded calls for one model with their original timing (AGRI_LLM_MODE=replay).
+    Unrecorded prompts raise CassetteMiss, or go to `fallback` (a live LLM) if set.
+    """
+
+    model_id: str
+    speed: float = REPLAY_SPEED
+    fallback: Optional[Any] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-replay"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_id": self.model_id}
+
+    def _lookup(self, prompt: str, stop: Optional[List[str]]) -> Optional[Tuple[List[str], float, float]]:
+        recording = next_recording(self.model_id, prompt, stop)
+        if recording is None and self.fallback is None:
+            raise CassetteMiss(f"No recording for this {self.model_id} prompt (key {prompt_key(self.model_id, prompt, stop)[:12]})")
+        if recording is None:
+            with _lock:
+                _stats["live_fallbacks"] += 1
+        return recording
+
+    def _schedule(self, recording: Tuple[List[str], float, float]) -> Iterator[Tuple[str, float]]:
+        """Yields (chunk, seconds after the call it is due), first chunk at first_token_s, last at total_s."""
+        chunks, first_token_s, total_s = recording
+        if self.speed <= 0:
+            for chunk in chunks:
+                yield chunk, 0.0
+            return
+        first, total = first_token_s / self.speed, max(total_s, first_token_s) / self.speed
+        step = (total - first) / (len(chunks) - 1) if len(chunks) > 1 else 0.0
+        for i, chunk in enumerate(chunks):
+            yield chunk, first + i * step
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        return "".join([chunk.text async for chunk in self._astream(prompt, stop, run_manager, **kwargs)])
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        recording = self._lookup(prompt, stop)
+        if recording is None:
+            for text in self.fallback.stream(prompt, stop=stop):
+                yield GenerationChunk(text=text)
+            return
+        started = time.perf_counter()
+        for text, due in self._schedule(recording):
+            # Sleep to absolute deadlines so per-chunk overhead doesn't accumulate
+            wait = started + due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            if run_manager:
+                run_manager.on_llm_new_token(text)
+            yield GenerationChunk(text=text)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        recording = await asyncio.to_thread(self._lookup, prompt, stop)
+        if recording is None:
+            async for text in self.fallback.astream(prompt, stop=stop):
+                yield GenerationChunk(text=text)
+            return
+        started = time.perf_counter()
+        for text, due in self._schedule(recording):
+            wait = started + due - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if run_manager:
+                await run_manager.on_llm_new_token(text)
+            yield GenerationChunk(text=text)
+
+
+def get_cassette_stats() -> Dict:
+    """Returns recording/replay counters for this process."""
+    with _lock:
+        return dict(_stats)
+
+
+register_stats("cassette", get_cassette_stats, "LLM record/replay cassette")
+
+
+def summarize_cassette(path: str = CASSETTE_PATH) -> Dict:
+    """
+    Describes a cassette file.
+
+    Returns:
+        {"calls", "prompts", "bytes", "models": {model: {calls, first_token_p50, total_p50, total_p95}}}
+    """
+    from metrics import quantile
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        calls, prompts = conn.execute("SELECT COUNT(*), COUNT(DISTINCT prompt_hash) FROM llm_calls").fetchone()
+        timings: Dict[str, List[Tuple[float, float]]] = {}
+        for model, first, total in conn.execute("SELECT model, first_token_s, total_s FROM llm_calls"):
+            timings.setdefault(model, []).append((first, total))
+    finally:
+        conn.close()
+    models = {}
+    for model, pairs in timings.items():
+        firsts, totals = [p[0] for p in pairs], [p[1] for p in pairs]
+        models[model] = {"calls": len(pairs), "first_token_p50": quantile(firsts, 0.5),
+                         "total_p50": quantile(totals, 0.5), "total_p95": quantile(totals, 0.95)}
+    return {"calls": calls, "prompts": prompts, "bytes": os.path.getsize(path), "models": models}
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else CASSETTE_PATH
+    if not os.path.exists(path):
+        print(f"⚠️ No cassette at {path} (record one with AGRI_LLM_MODE=record)")
+        raise SystemExit(1)
+    summary = summarize_cassette(path)
+    print(f"📼 {path}: {summary['calls']} calls, {summary['prompts']} distinct prompts, "
+          f"{summary['bytes'] / 1024:.1f} KB")
+    for model, info in summary["models"].items():
+        print(f"  {model}: {info['calls']} calls, first token p50 {info['first_token_p50']:.2f}s, "
+              f"total p50 {info['total_p50']:.2f}s, p95 {info['total_p95']:.2f}s")
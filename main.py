@@ -3,9 +3,17 @@ AgriAgent Main Entry Point
 Handles intent classification and workflow routing for farming assistant.
 
 Architecture:
-    User Input → Intent Classifier → Workflow Router → Specialized Workflow → Response
+    User Input → Fast-Path Classifier → (LLM Intent Classifier) → Workflow Router → Specialized Workflow → Response
+
+Router modes (AGRI_ROUTER_MODE):
+    two_step - the LLM router returns the intent only; LOG extraction is a second LLM call
+    combined - one LLM call returns the intent and, for LOG, the extracted activities
 """
 import os
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -14,24 +22,49 @@ from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 # Shared Watsonx LLM instance
-from langchain_config import get_llm_instance
+from langchain_config import get_llm_instance, JSON_STOP_SEQUENCES
+
+# Local fast-path classifier (skips the LLM router for obvious requests)
+from intent_classifier import fast_classify
+
+# Speculative DB prefetch (overlaps data reads with LLM classification)
+from prefetch import (start_prefetch, resolve_prefetch, discard_prefetch,
+                      astart_prefetch, aresolve_prefetch, adiscard_prefetch)
 
 # Storage layer (SQLite)
 from db_storage import read_logs
 
-# Workflows
-from workflows.log_flow import log_flow
-from workflows.query_flow import query_flow
-from workflows.report_flow import report_flow
-from workflows.general_flow import general_flow
+# Instrumentation (per-stage latency, LLM tokens, Prometheus/JSONL export)
+from metrics import instrumented, register_stats, request_trace, set_intent, start_metrics_server
+
+# Opt-in cProfile dumps of selected requests (AGRI_PROFILE_*)
+from profiling import profile_request
+
+# Workflows (blocking and streaming variants)
+from workflows.log_flow import log_flow, log_flow_stream, alog_flow, extract_json_from_llm_response
+from workflows.query_flow import query_flow, query_flow_stream, aquery_flow
+from workflows.report_flow import report_flow, report_flow_stream, areport_flow
+from workflows.general_flow import general_flow, general_flow_stream, ageneral_flow
+from workflows.streaming import timed_stream
+from workflows.json_stream import stream_first_json, astream_first_json
+
+INTENTS = ("LOG", "QUERY", "REPORT", "GENERAL")
+
+# "two_step" (intent, then LOG extraction) or "combined" (one call for both)
+ROUTER_MODE = os.getenv("AGRI_ROUTER_MODE", "two_step")
 
 # === Intent Classification Setup ===
-# Load the routing prompt from file
+# Load the routing prompts from file
 with open("routing_prompt.txt", "r", encoding="utf-8") as f:
     routing_template = f.read()
 
 routing_prompt = PromptTemplate.from_template(routing_template)
 
+with open("routing_extract_prompt.txt", "r", encoding="utf-8") as f:
+    routing_extract_template = f.read()
+
+routing_extract_prompt = PromptTemplate.from_template(routing_extract_template)
+
 # Create classifier chain: Prompt → LLM → String Parser
 # Returns one of: LOG, QUERY, REPORT, or GENERAL
 # Lazy initialization - only create LLM when chain is actually used
@@ -40,17 +73,267 @@ def get_classifier_chain():
     llm = get_llm_instance()
     return routing_prompt | llm | StrOutputParser()
 
+def get_combined_chain():
+    """Get or create the classify-and-extract chain (combined router mode)"""
+    llm = get_llm_instance().bind(stop=JSON_STOP_SEQUENCES)
+    return routing_extract_prompt | llm | StrOutputParser()
+
 # For backwards compatibility, create a lazy wrapper
 class LazyClassifierChain:
-    def __init__(self):
+    def __init__(self, factory=get_classifier_chain):
+        self._factory = factory
         self._chain = None
     
     def invoke(self, *args, **kwargs):
         if self._chain is None:
-            self._chain = get_classifier_chain()
+            self._chain = self._factory()
         return self._chain.invoke(*args, **kwargs)
+    
+    async def ainvoke(self, *args, **kwargs):
+        if self._chain is None:
+            self._chain = self._factory()
+        return await self._chain.ainvoke(*args, **kwargs)
+    
+    def stream(self, *args, **kwargs):
+        if self._chain is None:
+            self._chain = self._factory()
+        return self._chain.stream(*args, **kwargs)
+    
+    def astream(self, *args, **kwargs):
+        if self._chain is None:
+            self._chain = self._factory()
+        return self._chain.astream(*args, **kwargs)
 
 classifier_chain = LazyClassifierChain()
+combined_chain = LazyClassifierChain(get_combined_chain)
+
+# Router counters per mode, for comparing the two-step and combined paths
+_router_lock = threading.Lock()
+_router_stats = {"two_step": 0, "combined": 0, "combined_fields": 0, "combined_parse_errors": 0}
+
+
+def get_router_stats() -> Dict:
+    """Returns LLM router calls per mode and how often combined mode yielded usable LOG fields."""
+    with _router_lock:
+        return dict(_router_stats)
+
+
+register_stats("router", get_router_stats, "LLM router calls by mode")
+
+
+def parse_combined_output(raw: str, data=None) -> Tuple[str, Optional[List[Dict]]]:
+    """
+    Parses the combined router's JSON reply.
+    
+    Args:
+        raw: Generated text
+        data: JSON value already parsed from the stream, if any
+    
+    Returns:
+        (intent, list of activity fields or None). Falls back to the first intent
+        word in the reply (and no fields) when it isn't valid JSON.
+    """
+    if data is None:
+        try:
+            data = extract_json_from_llm_response(raw)
+        except ValueError:
+            data = None
+    intent = str(data.get("intent", "")).strip().upper() if isinstance(data, dict) else ""
+    if intent in INTENTS:
+        activities = data.get("activities", data.get("activity"))
+        if isinstance(activities, dict):
+            activities = [activities]
+        fields = activities if intent == "LOG" and isinstance(activities, list) and activities else None
+        with _router_lock:
+            _router_stats["combined_fields"] += 1 if fields else 0
+        return intent, fields
+
+    with _router_lock:
+        _router_stats["combined_parse_errors"] += 1
+    match = re.search(r"\b(LOG|QUERY|REPORT|GENERAL)\b", raw.upper())
+    return (match.group(1) if match else raw.strip()), None
+
+
+@instrumented("router")
+def llm_route(user_input: str, mode: Optional[str] = None) -> Tuple[str, Optional[List[Dict]]]:
+    """
+    Classifies with the LLM router.
+    
+    Args:
+        mode: "two_step" or "combined" (default: AGRI_ROUTER_MODE)
+    
+    Returns:
+        (intent, pre-extracted LOG activities or None)
+    """
+    mode = mode or ROUTER_MODE
+    with _router_lock:
+        _router_stats["combined" if mode == "combined" else "two_step"] += 1
+    if mode == "combined":
+        # Stream and stop as soon as the JSON reply is complete
+        return parse_combined_output(*stream_first_json(combined_chain.stream({"user_input": user_input})))
+    return classifier_chain.invoke({"user_input": user_input}).strip(), None
+
+
+@instrumented("router")
+async def allm_route(user_input: str, mode: Optional[str] = None) -> Tuple[str, Optional[List[Dict]]]:
+    """Async variant of llm_route."""
+    mode = mode or ROUTER_MODE
+    with _router_lock:
+        _router_stats["combined" if mode == "combined" else "two_step"] += 1
+    if mode == "combined":
+        return parse_combined_output(*await astream_first_json(combined_chain.astream({"user_input": user_input})))
+    return (await classifier_chain.ainvoke({"user_input": user_input})).strip(), None
+
+
+@instrumented("router")
+def classify_intent(user_input: str) -> str:
+    """
+    Classifies a request, trying the local fast path before the LLM router.
+    
+    Returns:
+        One of LOG, QUERY, REPORT, GENERAL (or whatever the LLM returned)
+    """
+    intent = fast_classify(user_input)
+    if intent is None:
+        intent, _ = llm_route(user_input)
+    return intent
+
+
+@instrumented("router")
+async def aclassify_intent(user_input: str) -> str:
+    """Async variant of classify_intent (LLM fallback uses ainvoke)."""
+    intent = fast_classify(user_input)
+    if intent is None:
+        intent, _ = await allm_route(user_input)
+    return intent
+
+
+@instrumented("router")
+def classify_with_prefetch(user_input: str, user_id: str, mode: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+    """
+    Classifies a request while speculatively prefetching the user's data.
+    Prefetch only starts when the LLM router is needed; the local fast path
+    is too quick for overlap to help.
+    
+    Args:
+        mode: LLM router mode, "two_step" or "combined" (default: AGRI_ROUTER_MODE)
+    
+    Returns:
+        (intent, context) where context is the prefetched data for QUERY/REPORT,
+        the pre-extracted activities for LOG in combined mode, else None
+    """
+    intent = fast_classify(user_input)
+    if intent is not None:
+        return intent, None
+    
+    future = start_prefetch(user_id)
+    try:
+        intent, fields = llm_route(user_input, mode)
+    except Exception:
+        discard_prefetch(future)
+        raise
+    context = resolve_prefetch(future, intent)
+    return intent, fields if intent == "LOG" else context
+
+
+@instrumented("router")
+async def aclassify_with_prefetch(user_input: str, user_id: str,
+                                  mode: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+    """Async variant of classify_with_prefetch (prefetch runs as an asyncio task)."""
+    intent = fast_classify(user_input)
+    if intent is not None:
+        return intent, None
+    
+    task = astart_prefetch(user_id)
+    try:
+        intent, fields = await allm_route(user_input, mode)
+    except Exception:
+        adiscard_prefetch(task)
+        raise
+    context = await aresolve_prefetch(task, intent)
+    return intent, fields if intent == "LOG" else context
+
+
+def dispatch(intent: str, text: str, user_id: str, context: Optional[Dict] = None) -> str:
+    """
+    Runs the workflow for `intent` (unknown intents default to GENERAL).
+    `context` is prefetched data handed to QUERY/REPORT workflows, or the
+    activities pre-extracted by the combined router for LOG.
+    """
+    set_intent(intent)
+    if intent == "LOG":
+        return log_flow(text, user_id=user_id, fields=context)
+    elif intent == "QUERY":
+        return query_flow(text, user_id=user_id, context=context)
+    elif intent == "REPORT":
+        return report_flow(text, user_id=user_id, context=context)
+    else:
+        return general_flow(text)
+
+
+async def adispatch(intent: str, text: str, user_id: str, context: Optional[Dict] = None) -> str:
+    """Async variant of dispatch."""
+    set_intent(intent)
+    if intent == "LOG":
+        return await alog_flow(text, user_id=user_id, fields=context)
+    elif intent == "QUERY":
+        return await aquery_flow(text, user_id=user_id, context=context)
+    elif intent == "REPORT":
+        return await areport_flow(text, user_id=user_id, context=context)
+    else:
+        return await ageneral_flow(text)
+
+
+def route(text: str, user_id: str) -> str:
+    """
+    Full request pipeline: classify (with speculative prefetch), then run the matching workflow.
+    
+    Returns:
+        Workflow response text
+    """
+    with request_trace(user_id) as trace, profile_request(user_id, trace):
+        intent, context = classify_with_prefetch(text, user_id)
+        return dispatch(intent, text, user_id, context)
+
+
+async def aroute(text: str, user_id: str) -> str:
+    """
+    Async request pipeline for serving many users from one process.
+    LLM calls use ainvoke and SQLite work runs in worker threads, so the
+    event loop is never blocked.
+    
+    Example:
+        responses = await asyncio.gather(*(aroute(t, u) for t, u in requests))
+    """
+    with request_trace(user_id) as trace, profile_request(user_id, trace):
+        intent, context = await aclassify_with_prefetch(text, user_id)
+        return await adispatch(intent, text, user_id, context)
+
+
+def dispatch_stream(intent: str, text: str, user_id: str, started_at: Optional[float] = None,
+                    timing: Optional[Dict] = None, context: Optional[Dict] = None) -> Iterator[str]:
+    """
+    Routes to the streaming variant of the workflow for `intent`.
+    Unknown intents default to GENERAL.
+    
+    Args:
+        started_at: time.perf_counter() at request start, so TTFT covers classification
+        timing: Optional dict filled with ttft_s/total_s when the stream finishes
+        context: Prefetched data for QUERY/REPORT, pre-extracted fields for LOG (see classify_with_prefetch)
+    
+    Returns:
+        Iterator of response chunks (timed via workflows.streaming)
+    """
+    set_intent(intent)
+    if intent == "LOG":
+        chunks = log_flow_stream(text, user_id=user_id, fields=context)
+    elif intent == "QUERY":
+        chunks = query_flow_stream(text, user_id=user_id, context=context)
+    elif intent == "REPORT":
+        chunks = report_flow_stream(text, user_id=user_id, context=context)
+    else:
+        chunks = general_flow_stream(text)
+    return timed_stream(chunks, intent, started_at=started_at, timing=timing)
 
 
 # === CLI Interface ===
@@ -63,36 +346,42 @@ if __name__ == "__main__":
         current_user_id = email_input
     
     print(f"\nAgri-Agent CLI – Logged in as {current_user_id}. Type 'exit' to quit.")
+    metrics_port = start_metrics_server()
+    if metrics_port:
+        print(f"📈 Metrics at http://{os.getenv('AGRI_METRICS_HOST', '127.0.0.1')}:{metrics_port}/metrics")
 
     while True:
         user_input = input("🎙️ ").strip()
         if user_input.lower() in ("exit", "quit", ""):  
             break
 
-        # classify intent
-        try:
-            intent = classifier_chain.invoke({"user_input": user_input}).strip()
-        except Exception as e:
-            print(f"⚠️ Classification error: {e}\n")
-            continue
+        with request_trace(current_user_id) as trace, profile_request(current_user_id, trace):
+            # classify intent
+            started_at = time.perf_counter()
+            try:
+                intent, context = classify_with_prefetch(user_input, current_user_id)
+            except Exception as e:
+                if trace is not None:
+                    trace["error"] = type(e).__name__
+                print(f"⚠️ Classification error: {e}\n")
+                continue
 
-        print(f"[*] Invoking workflow for intent: {intent}")
-        # dispatch to the right workflow
-        try:
-            if intent == "LOG":
-                output = log_flow(user_input, user_id=current_user_id)
-            elif intent == "QUERY":
-                output = query_flow(user_input, user_id=current_user_id)
-            elif intent == "REPORT":
-                output = report_flow(user_input, user_id=current_user_id)
-            elif intent == "GENERAL":
-                output = general_flow(user_input)
-            else:
+            print(f"[*] Invoking workflow for intent: {intent}")
+            if intent not in ("LOG", "QUERY", "REPORT", "GENERAL"):
                 # If the model outputs something unexpected, default to general.
                 print(f"⚠️ Unknown intent '{intent}', defaulting to GENERAL.")
-                output = general_flow(user_input)
-        except Exception as e:
-            output = f"⚠️ Workflow error ({intent}): {e}"
 
-        print(f"[{intent}] {output}\n")
+            # dispatch to the right workflow, printing tokens as they arrive
+            timing = {}
+            print(f"[{intent}] ", end="", flush=True)
+            try:
+                for chunk in dispatch_stream(intent, user_input, current_user_id, started_at, timing, context):
+                    print(chunk, end="", flush=True)
+            except Exception as e:
+                if trace is not None:
+                    trace["error"] = type(e).__name__
+                print(f"⚠️ Workflow error ({intent}): {e}", end="")
 
+        if timing.get("ttft_s") is not None:
+            print(f"\n    (first token {timing['ttft_s']:.2f}s, total {timing['total_s']:.2f}s)", end="")
+        print("\n")
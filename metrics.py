@@ -0,0 +1,504 @@
+"""
+Request Instrumentation
+Records per-stage latency, LLM token counts, cache hits and errors for every
+request, and exports them as Prometheus text and optional rotating JSONL traces.
+
+Usage:
+    with request_trace(user_id):          # one per user request (main.route, app.py, CLI)
+        ...                               # @instrumented stages, LLM calls and cache
+                                          # lookups inside are attached to the trace
+    register_stats("parser", get_parser_stats, "Rule-based LOG parser")
+                                          # export a module's get_*_stats() counters
+    render_prometheus()                   # text exposition format
+    start_metrics_server()                # GET http://host:AGRI_METRICS_PORT/metrics
+
+Latency series keep a bounded window of recent samples for p50/p95/p99 plus
+all-time count and sum (exported as Prometheus summaries).
+"""
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("AGRI_METRICS_ENABLED", "1") not in ("0", "false", "False")
+METRICS_WINDOW = int(os.getenv("AGRI_METRICS_WINDOW", "2048"))
+METRICS_HOST = os.getenv("AGRI_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("AGRI_METRICS_PORT", "0"))
+TRACE_PATH = os.getenv("AGRI_TRACE_PATH", "")
+TRACE_MAX_BYTES = int(os.getenv("AGRI_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("AGRI_TRACE_BACKUPS", "5"))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stage/LLM entries kept per trace (a bulk import can make thousands of DB calls)
+_MAX_TRACE_ENTRIES = 200
+
+# name → (type, help)
+_METRICS = {
+    "agri_request_seconds": ("summary", "End-to-end request latency by intent"),
+    "agri_request_errors_total": ("counter", "Requests that raised, by intent"),
+    "agri_stage_seconds": ("summary", "Latency of instrumented stages (classifier, workflows, db, cache)"),
+    "agri_stage_errors_total": ("counter", "Instrumented stage calls that raised, by stage"),
+    "agri_llm_seconds": ("summary", "LLM call latency by model"),
+    "agri_llm_tokens_total": ("counter", "LLM tokens by model and kind (prompt/completion)"),
+    "agri_llm_errors_total": ("counter", "LLM calls that failed, by model"),
+    "agri_cache_lookups_total": ("counter", "Cache lookups by cache and result (hit/miss)"),
+    "agri_stream_first_token_seconds": ("summary", "Time to the first streamed token by intent (from request start)"),
+    "agri_stream_seconds": ("summary", "Streamed response time by intent (from request start)"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# component → (get_*_stats getter, help, keys exported as gauges); see register_stats
+_stats_sources: Dict[str, Tuple[Callable[[], Dict], str, Tuple[str, ...]]] = {}
+
+_lock = threading.Lock()
+_samples: Dict[Tuple[str, Labels], deque] = {}
+_totals: Dict[Tuple[str, Labels], List[float]] = {}
+_counters: Dict[Tuple[str, Labels], float] = {}
+
+_current: ContextVar[Optional[Dict]] = ContextVar("agri_request_trace", default=None)
+
+_trace_logger: Optional[logging.Logger] = None
+_trace_lock = threading.Lock()
+_server = None
+
+
+# === Recording ===
+
+def _labels(labels: Dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def observe(name: str, seconds: float, **labels):
+    """Adds a latency sample to a summary series."""
+    key = (name, _labels(labels))
+    with _lock:
+        window = _samples.get(key)
+        if window is None:
+            window = _samples[key] = deque(maxlen=METRICS_WINDOW)
+            _totals[key] = [0, 0.0]
+        window.append(seconds)
+        _totals[key][0] += 1
+        _totals[key][1] += seconds
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Increments a counter series."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _trace_append(field: str, entry: Dict):
+    trace = _current.get()
+    if trace is not None and len(trace[field]) < _MAX_TRACE_ENTRIES:
+        trace[field].append(entry)
+
+
+def record_stage(stage: str, seconds: float, error: Optional[str] = None):
+    """Records one call of an instrumented stage."""
+    observe("agri_stage_seconds", seconds, stage=stage)
+    if error:
+        inc("agri_stage_errors_total", stage=stage)
+    entry = {"stage": stage, "ms": round(seconds * 1000, 3)}
+    if error:
+        entry["error"] = error
+    _trace_append("stages", entry)
+
+
+def record_llm(model: str, seconds: float, prompt_tokens: int, completion_tokens: int,
+               error: Optional[str] = None):
+    """Records one LLM call (see langchain_config.LLMMetricsHandler)."""
+    observe("agri_llm_seconds", seconds, model=model)
+    inc("agri_llm_tokens_total", prompt_tokens, model=model, kind="prompt")
+    inc("agri_llm_tokens_total", completion_tokens, model=model, kind="completion")
+    if error:
+        inc("agri_llm_errors_total", model=model)
+    entry = {"model": model, "ms": round(seconds * 1000, 3),
+             "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+    if error:
+        entry["error"] = error
+    _trace_append("llm", entry)
+
+
+def record_cache(cache: str, hit: bool):
+    """Records a cache lookup (e.g. the QUERY/REPORT result cache)."""
+    inc("agri_cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+    trace = _current.get()
+    if trace is not None:
+        trace["cache"]["hits" if hit else "misses"] += 1
+
+
+def record_stream(intent: str, ttft: Optional[float], total: float):
+    """Records one streamed response (see workflows/streaming.timed_stream)."""
+    if ttft is not None:
+        observe("agri_stream_first_token_seconds", ttft, intent=intent)
+    observe("agri_stream_seconds", total, intent=intent)
+    trace = _current.get()
+    if trace is not None and ttft is not None:
+        trace["ttft_ms"] = round(ttft * 1000, 3)
+
+
+def set_intent(intent: str):
+    """Labels the current request with its routed intent."""
+    trace = _current.get()
+    if trace is not None:
+        trace["intent"] = intent
+
+
+def instrumented(prefix: str):
+    """
+    Decorator that times every call as stage "<prefix>.<function name>".
+    Works for plain, async and generator functions (generators are timed until
+    exhausted or closed). A no-op when AGRI_METRICS_ENABLED=0.
+
+    Example:
+        @instrumented("db")
+        def read_logs(...)  →  stage "db.read_logs"
+    """
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+        stage = f"{prefix}.{func.__name__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                error = None
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException as e:
+                    error = type(e).__name__
+                    raise
+                finally:
+                    record_stage(stage, time.perf_counter() - started, error)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                error = None
+                try:
+                    yield from func(*args, **kwargs)
+                except GeneratorExit:
+                    raise  # Consumer stopped early: not an error
+                except BaseException as e:
+                    error = type(e).__name__
+                    raise
+                finally:
+                    record_stage(stage, time.perf_counter() - started, error)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            error = None
+            try:
+                return func(*args, **kwargs)
+            except BaseException as e:
+                error = type(e).__name__
+                raise
+            finally:
+                record_stage(stage, time.perf_counter() - started, error)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def request_trace(user_id: str = "") -> Iterator[Optional[Dict]]:
+    """
+    Scopes one user request: stages, LLM calls and cache lookups inside are
+    collected into a trace, which is written to AGRI_TRACE_PATH (if set) at the end.
+    Nested calls reuse the outer trace.
+
+    Yields:
+        The trace dict (None when metrics are disabled)
+    """
+    if not METRICS_ENABLED or _current.get() is not None:
+        yield _current.get()
+        return
+
+    trace = {
+        "request_id": uuid.uuid4().hex[:16],
+        "ts": datetime.now(timezone.utc).isoformat(),
+        # Hashed so trace files don't hold emails
+        "user": hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:12] if user_id else "",
+        "intent": None,
+        "stages": [],
+        "llm": [],
+        "cache": {"hits": 0, "misses": 0},
+        "error": None,
+    }
+    token = _current.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    except BaseException as e:
+        trace["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        seconds = time.perf_counter() - started
+        trace["total_ms"] = round(seconds * 1000, 3)
+        intent = trace["intent"] or "unknown"
+        observe("agri_request_seconds", seconds, intent=intent)
+        if trace["error"]:
+            inc("agri_request_errors_total", intent=intent)
+        _write_trace(trace)
+
+
+# === Export ===
+
+def _write_trace(trace: Dict):
+    """Appends the trace as one JSON line to the rotating trace file (if configured)."""
+    global _trace_logger
+    if not TRACE_PATH:
+        return
+    with _trace_lock:
+        if _trace_logger is None:
+            directory = os.path.dirname(TRACE_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(TRACE_PATH, maxBytes=TRACE_MAX_BYTES,
+                                          backupCount=TRACE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("agri.traces")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _trace_logger = logger
+    _trace_logger.info(json.dumps(trace, separators=(",", ":")))
+
+
+def register_stats(component: str, getter: Callable[[], Dict], help_text: str, gauges: Iterable[str] = ()):
+    """
+    Exports a module's get_*_stats() dict with the request metrics.
+
+    Each numeric value becomes a counter agri_<component>_<key>_total, or a gauge
+    agri_<component>_<key> for keys in `gauges` (rates, sizes, open handles).
+    A nested dict ({"rule": {"LOG": 3}}) becomes one series per key, labelled key="LOG".
+    """
+    _stats_sources[component] = (getter, help_text, tuple(gauges))
+
+
+def _component_families() -> List[Tuple[str, str, str, List[Tuple[Labels, float]]]]:
+    """Reads the registered getters → [(metric name, type, help, [(labels, value)])]."""
+    families = []
+    for component, (getter, help_text, gauges) in sorted(_stats_sources.items()):
+        for key, value in getter().items():
+            kind = "gauge" if key in gauges else "counter"
+            name = f"agri_{component}_{key}" + ("_total" if kind == "counter" else "")
+            pairs = sorted(value.items()) if isinstance(value, dict) else [(None, value)]
+            series = [(_labels({"key": k}) if k is not None else (), float(v))
+                      for k, v in pairs if isinstance(v, (int, float))]
+            if series:
+                families.append((name, kind, f"{help_text}: {key.replace('_', ' ')}", series))
+    return families
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Nearest-rank quantile of values (0.0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(q * len(ordered)))) - 1]
+
+
+def get_metrics_summary() -> Dict:
+    """
+    Returns latency percentiles and counters as plain dicts.
+
+    Returns:
+        {"latency": {name: {label string: {count, sum, p50, p95, p99}}},
+         "counters": {name: {label string: value}},
+         "components": {component: get_*_stats() dict}}
+    """
+    with _lock:
+        samples = {key: list(window) for key, window in _samples.items()}
+        totals = {key: tuple(value) for key, value in _totals.items()}
+        counters = dict(_counters)
+
+    latency: Dict[str, Dict] = {}
+    for (name, labels), values in samples.items():
+        count, total = totals[(name, labels)]
+        series = {"count": count, "sum": total}
+        series.update({f"p{int(q * 100)}": quantile(values, q) for q in QUANTILES})
+        latency.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = series
+    result: Dict[str, Dict] = {}
+    for (name, labels), value in counters.items():
+        result.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+    components = {component: getter() for component, (getter, _, _) in sorted(_stats_sources.items())}
+    return {"latency": latency, "counters": result, "components": components}
+
+
+def _format_labels(labels: Labels, extra: Tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """Renders all series in the Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        samples = {key: list(window) for key, window in _samples.items()}
+        totals = {key: tuple(value) for key, value in _totals.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (kind, help_text) in _METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "summary":
+            for (series, labels), values in sorted(samples.items()):
+                if series != name:
+                    continue
+                for q in QUANTILES:
+                    lines.append(f"{name}{_format_labels(labels, (('quantile', str(q)),))} {quantile(values, q):.6f}")
+                count, total = totals[(series, labels)]
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        else:
+            for (series, labels), value in sorted(counters.items()):
+                if series == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for name, kind, help_text, series in _component_families():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{_format_labels(labels)} {value:g}" for labels, value in series)
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = METRICS_HOST) -> Optional[int]:
+    """
+    Serves GET /metrics (Prometheus text) from a daemon thread. Idempotent.
+
+    Args:
+        port: Port to listen on (default AGRI_METRICS_PORT; 0/unset = don't serve)
+
+    Returns:
+        The port being served, or None if disabled
+    """
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    port = METRICS_PORT if port is None else port
+    if not METRICS_ENABLED or not port:
+        return None
+    if _server is not None:
+        return _server.server_address[1]
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the console
+
+    _server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="agri-metrics", daemon=True).start()
+    return _server.server_address[1]
+
+
+def reset_metrics():
+    """Clears all recorded series (e.g. between benchmark runs)."""
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _counters.clear()
+
+
+# === Offline trace analysis ===
+
+def summarize_traces(paths: List[str]) -> Dict:
+    """
+    Aggregates JSONL trace files (including rotated backups passed explicitly).
+
+    Returns:
+        {"requests": {intent: {count, errors, p50, p95, p99}},
+         "stages": {stage: {count, errors, p50, p95, p99}}, "llm_tokens": {model: {prompt, completion}}}
+    """
+    requests: Dict[str, List[float]] = {}
+    request_errors: Dict[str, int] = {}
+    stages: Dict[str, List[float]] = {}
+    stage_errors: Dict[str, int] = {}
+    tokens: Dict[str, Dict[str, int]] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    trace = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                intent = trace.get("intent") or "unknown"
+                requests.setdefault(intent, []).append(trace.get("total_ms", 0.0))
+                request_errors[intent] = request_errors.get(intent, 0) + (1 if trace.get("error") else 0)
+                for entry in trace.get("stages", []):
+                    stages.setdefault(entry["stage"], []).append(entry["ms"])
+                    stage_errors[entry["stage"]] = stage_errors.get(entry["stage"], 0) + (1 if entry.get("error") else 0)
+                for call in trace.get("llm", []):
+                    usage = tokens.setdefault(call["model"], {"prompt": 0, "completion": 0})
+                    usage["prompt"] += call.get("prompt_tokens", 0)
+                    usage["completion"] += call.get("completion_tokens", 0)
+
+    def describe(values: List[float], errors: int) -> Dict:
+        return {"count": len(values), "errors": errors,
+                **{f"p{int(q * 100)}": quantile(values, q) for q in QUANTILES}}
+
+    return {
+        "requests": {k: describe(v, request_errors.get(k, 0)) for k, v in sorted(requests.items())},
+        "stages": {k: describe(v, stage_errors.get(k, 0)) for k, v in sorted(stages.items())},
+        "llm_tokens": tokens,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="Summarize AgriAgent JSONL request traces")
+    parser.add_argument("paths", nargs="*", help="Trace files (default: AGRI_TRACE_PATH and its rotated backups)")
+    args = parser.parse_args()
+
+    paths = args.paths or (sorted(glob.glob(TRACE_PATH + "*")) if TRACE_PATH else [])
+    if not paths:
+        print("⚠️ No trace files given and AGRI_TRACE_PATH is not set.")
+        raise SystemExit(1)
+
+    summary = summarize_traces(paths)
+    print(f"📊 Requests by intent ({len(paths)} file(s)):")
+    for intent, s in summary["requests"].items():
+        print(f"   {intent:<10} n={s['count']:<6} p50={s['p50']:.1f}ms p95={s['p95']:.1f}ms "
+              f"p99={s['p99']:.1f}ms errors={s['errors']}")
+    print("⏱️ Stages:")
+    for stage, s in sorted(summary["stages"].items(), key=lambda kv: -kv[1]["p95"]):
+        print(f"   {stage:<36} n={s['count']:<6} p50={s['p50']:.2f}ms p95={s['p95']:.2f}ms "
+              f"p99={s['p99']:.2f}ms errors={s['errors']}")
+    print("🔤 LLM tokens:")
+    for model, usage in summary["llm_tokens"].items():
+        print(f"   {model}: prompt={usage['prompt']} completion={usage['completion']}")
@@ -0,0 +1,165 @@
+"""
+Speculative Context Prefetch
+Starts the DB reads a data workflow needs while intent classification runs.
+
+When the fast-path classifier can't decide and the LLM router is called, the
+user's logs, summary stats and item summary are fetched in parallel. QUERY and
+REPORT receive the prefetched context; for LOG and GENERAL it is discarded.
+"""
+import asyncio
+import contextvars
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from db_storage import read_logs, get_summary_stats, get_item_summary, get_data_version
+from metrics import register_stats
+
+PREFETCH_ENABLED = os.getenv("AGRI_PREFETCH_ENABLED", "1") not in ("0", "false", "False")
+PREFETCH_WORKERS = int(os.getenv("AGRI_PREFETCH_WORKERS", "4"))
+
+# Enough rows for report_flow (200); query_flow uses the first 100
+CONTEXT_LOG_LIMIT = 200
+
+# Intents whose workflows consume the prefetched context
+DATA_INTENTS = ("QUERY", "REPORT")
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+_stats_lock = threading.Lock()
+_stats = {"started": 0, "hits": 0, "wasted": 0, "errors": 0, "time_saved_s": 0.0}
+
+
+def fetch_user_context(user_id: str, limit: int = CONTEXT_LOG_LIMIT) -> Dict:
+    """
+    Reads everything QUERY/REPORT workflows need from the user's database.
+
+    Returns:
+        Dict with data_version, logs (most recent first), stats, item_summary
+        and fetch_s (duration)
+    """
+    started = time.perf_counter()
+    context = {
+        "data_version": get_data_version(user_id),  # Read first: a later write only makes it conservative
+        "logs": read_logs(user_id=user_id, limit=limit),
+        "stats": get_summary_stats(user_id),
+        "item_summary": get_item_summary(user_id),
+    }
+    context["fetch_s"] = time.perf_counter() - started
+    return context
+
+
+def start_prefetch(user_id: str) -> Optional[Future]:
+    """Submits a background context fetch. Returns None if prefetch is disabled."""
+    if not PREFETCH_ENABLED:
+        return None
+    with _stats_lock:
+        _stats["started"] += 1
+    # Run in the caller's context so the reads show up in its request trace (metrics.py)
+    return _executor.submit(contextvars.copy_context().run, fetch_user_context, user_id)
+
+
+def resolve_prefetch(future: Optional[Future], intent: str) -> Optional[Dict]:
+    """
+    Hands the prefetched context to data intents, or discards it.
+
+    Returns:
+        Context dict for QUERY/REPORT, else None (also None if the fetch failed,
+        in which case the workflow reads the data itself)
+    """
+    if future is None:
+        return None
+
+    if intent not in DATA_INTENTS:
+        future.cancel()  # No-op if already running; the result is simply dropped
+        with _stats_lock:
+            _stats["wasted"] += 1
+        return None
+
+    wait_started = time.perf_counter()
+    try:
+        context = future.result()
+    except Exception:
+        with _stats_lock:
+            _stats["errors"] += 1
+        return None
+    waited = time.perf_counter() - wait_started
+
+    with _stats_lock:
+        _stats["hits"] += 1
+        # The part of the fetch that overlapped classification is off the critical path
+        _stats["time_saved_s"] += max(0.0, context["fetch_s"] - waited)
+    return context
+
+
+def discard_prefetch(future: Optional[Future]):
+    """Drops a prefetch whose request failed before an intent was known."""
+    if future is not None:
+        future.cancel()
+        with _stats_lock:
+            _stats["wasted"] += 1
+
+
+# === asyncio variants (see main.aroute) ===
+
+def _consume_result(task: "asyncio.Task"):
+    # Retrieve the outcome so discarded tasks don't log "exception never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+def astart_prefetch(user_id: str) -> Optional["asyncio.Task"]:
+    """Starts a context fetch as an asyncio task (DB reads run in a worker thread)."""
+    if not PREFETCH_ENABLED:
+        return None
+    with _stats_lock:
+        _stats["started"] += 1
+    task = asyncio.create_task(asyncio.to_thread(fetch_user_context, user_id))
+    task.add_done_callback(_consume_result)
+    return task
+
+
+async def aresolve_prefetch(task: Optional["asyncio.Task"], intent: str) -> Optional[Dict]:
+    """Async variant of resolve_prefetch."""
+    if task is None:
+        return None
+
+    if intent not in DATA_INTENTS:
+        task.cancel()
+        with _stats_lock:
+            _stats["wasted"] += 1
+        return None
+
+    wait_started = time.perf_counter()
+    try:
+        context = await task
+    except Exception:
+        with _stats_lock:
+            _stats["errors"] += 1
+        return None
+    waited = time.perf_counter() - wait_started
+
+    with _stats_lock:
+        _stats["hits"] += 1
+        _stats["time_saved_s"] += max(0.0, context["fetch_s"] - waited)
+    return context
+
+
+def adiscard_prefetch(task: Optional["asyncio.Task"]):
+    """Async variant of discard_prefetch."""
+    if task is not None:
+        task.cancel()
+        with _stats_lock:
+            _stats["wasted"] += 1
+
+
+def get_prefetch_stats() -> Dict:
+    """Returns prefetch hits, wasted fetches and cumulative time saved."""
+    with _stats_lock:
+        resolved = _stats["hits"] + _stats["wasted"]
+        return {**_stats, "hit_rate": _stats["hits"] / resolved if resolved else 0.0}
+
+
+register_stats("prefetch", get_prefetch_stats, "Speculative workflow data prefetches", gauges=("hit_rate",))
@@ -0,0 +1,159 @@
+"""
+Opt-in Request Profiling
+Captures a cProfile dump of selected requests (router + workflow) and aggregates
+dumps into top-N hotspots.
+
+Enable with AGRI_PROFILE_SAMPLE_RATE (fraction of all requests) and/or
+AGRI_PROFILE_USERS (comma-separated user ids, always profiled). When neither is
+set, profile_request() is a single check and adds nothing to the request path.
+
+Dumps are written to AGRI_PROFILE_DIR as
+    <UTC time>_<intent>_<user hash>_<id>.prof
+and pruned by age and count after each write. For async requests the dump also
+includes other tasks that ran on the event loop meanwhile.
+
+Usage:
+    python profiling.py --intent REPORT --top 25
+    python profiling.py --user farmer@example.com --sort tottime
+"""
+import contextlib
+import cProfile
+import glob
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from metrics import register_stats
+
+PROFILE_SAMPLE_RATE = float(os.getenv("AGRI_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_USERS = {u.strip() for u in os.getenv("AGRI_PROFILE_USERS", "").split(",") if u.strip()}
+PROFILE_DIR = os.getenv("AGRI_PROFILE_DIR", os.path.join("data", "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("AGRI_PROFILE_MAX_FILES", "200"))
+PROFILE_MAX_AGE_DAYS = float(os.getenv("AGRI_PROFILE_MAX_AGE_DAYS", "7"))
+
+PROFILING_ENABLED = PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_USERS)
+
+# cProfile hooks the whole interpreter thread; one profile at a time keeps
+# concurrent (async) requests from clobbering each other's profiler
+_active = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"profiled": 0, "skipped_busy": 0, "pruned": 0}
+
+
+def user_tag(user_id: str) -> str:
+    """Short hash of a user id used in dump names (same scheme as metrics traces)."""
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:12] if user_id else "anon"
+
+
+def should_profile(user_id: str) -> bool:
+    """True if this request is selected (opted-in user, or sampled)."""
+    if user_id in PROFILE_USERS:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextlib.contextmanager
+def profile_request(user_id: str, trace: Optional[Dict] = None) -> Iterator[Optional[cProfile.Profile]]:
+    """
+    Profiles the enclosed block if the request is selected.
+
+    Args:
+        user_id: User identifier (matched against AGRI_PROFILE_USERS)
+        trace: The request's metrics trace, used to tag the dump with its intent
+
+    Yields:
+        The active profiler, or None when the request isn't profiled
+    """
+    if not PROFILING_ENABLED or not should_profile(user_id):
+        yield None
+        return
+    if not _active.acquire(blocking=False):
+        with _stats_lock:
+            _stats["skipped_busy"] += 1
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+        intent = (trace or {}).get("intent") or "unknown"
+        _dump(profiler, intent, user_id)
+    finally:
+        _active.release()
+
+
+def _dump(profiler: cProfile.Profile, intent: str, user_id: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    name = f"{stamp}_{intent}_{user_tag(user_id)}_{uuid.uuid4().hex[:8]}.prof"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+    pruned = prune_profiles()
+    with _stats_lock:
+        _stats["profiled"] += 1
+        _stats["pruned"] += pruned
+
+
+def prune_profiles(directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES,
+                   max_age_days: float = PROFILE_MAX_AGE_DAYS) -> int:
+    """Deletes dumps older than max_age_days, then the oldest beyond max_files. Returns the number removed."""
+    paths = sorted(glob.glob(os.path.join(directory, "*.prof")), key=os.path.getmtime)
+    cutoff = time.time() - max_age_days * 86400
+    doomed = [p for p in paths if os.path.getmtime(p) < cutoff]
+    kept = [p for p in paths if p not in doomed]
+    if len(kept) > max_files:
+        doomed.extend(kept[:len(kept) - max_files])
+    for path in doomed:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Pruned concurrently
+    return len(doomed)
+
+
+def find_profiles(directory: str = PROFILE_DIR, intent: Optional[str] = None,
+                  user_id: Optional[str] = None) -> List[str]:
+    """Lists dumps, optionally filtered by intent and user."""
+    pattern = f"*_{intent or '*'}_{user_tag(user_id) if user_id else '*'}_*.prof"
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+
+def get_profiler_stats() -> Dict:
+    """Returns how many requests were profiled, skipped (profiler busy) and dumps pruned."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+register_stats("profiler", get_profiler_stats, "Per-request cProfile sampling")
+
+
+if __name__ == "__main__":
+    import argparse
+    import pstats
+
+    parser = argparse.ArgumentParser(description="Aggregate request profiles into top-N hotspots")
+    parser.add_argument("--dir", default=PROFILE_DIR, help=f"Profile directory (default {PROFILE_DIR})")
+    parser.add_argument("--intent", help="Only requests with this intent (LOG, QUERY, REPORT, GENERAL)")
+    parser.add_argument("--user", help="Only requests from this user id")
+    parser.add_argument("--top", type=int, default=20, help="Number of functions to show")
+    parser.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"],
+                        help="Sort key (default cumulative)")
+    args = parser.parse_args()
+
+    paths = find_profiles(args.dir, args.intent, args.user)
+    if not paths:
+        print(f"⚠️ No profiles found in {args.dir}")
+        raise SystemExit(1)
+
+    print(f"🔬 Aggregating {len(paths)} profile(s) from {args.dir}")
+    stats = pstats.Stats(*paths)
+    stats.strip_dirs().sort_stats(args.sort).print_stats(args.top)
@@ -0,0 +1,202 @@
+"""
+Workflow Result Cache
+Persists QUERY/REPORT answers so repeated requests skip the LLM call.
+
+Entries are keyed on (workflow, model, normalized request text, UTC date) per
+user and tagged with the user's data version (see db_storage.get_data_version),
+so any new, edited or deleted log invalidates them. Eviction is LRU with a TTL,
+bounded by entry count and total size.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from db_storage import get_data_version
+from metrics import instrumented, record_cache, register_stats
+
+RESULT_CACHE_ENABLED = os.getenv("AGRI_RESULT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+RESULT_CACHE_PATH = os.getenv("AGRI_RESULT_CACHE_PATH", os.path.join("data", "result_cache.db"))
+RESULT_CACHE_TTL = float(os.getenv("AGRI_RESULT_CACHE_TTL", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("AGRI_RESULT_CACHE_MAX_ENTRIES", "2000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("AGRI_RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+_stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "evictions": 0}
+
+
+def normalize_request(text: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+def cache_key(user_id: str, workflow: str, model: str, text: str) -> str:
+    """
+    Stable key for a request. The UTC date is included so answers about
+    "today" or "this week" don't outlive the day they were computed on.
+    """
+    today = datetime.now(timezone.utc).date().isoformat()
+    raw = "\x1f".join((user_id, workflow, model, today, normalize_request(text)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Opens (once) the cache database. Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        directory = os.path.dirname(RESULT_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(RESULT_CACHE_PATH, check_same_thread=False, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                data_version INTEGER NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_lru ON result_cache(last_used)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_user ON result_cache(user_id)")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def get_cached(key: str, data_version: int) -> Optional[str]:
+    """
+    Returns the cached response for key if it is current, else None.
+    Entries from an older data version or past the TTL are deleted on sight.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return None
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute(
+            "SELECT response, data_version, created_at FROM result_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        response, version, created_at = row
+        if version != data_version or now - created_at > RESULT_CACHE_TTL:
+            conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+            conn.commit()
+            _stats["stale"] += 1
+            _stats["misses"] += 1
+            return None
+        conn.execute("UPDATE result_cache SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _stats["hits"] += 1
+        return response
+
+
+@instrumented("cache")
+def lookup(user_id: str, workflow: str, model: str, text: str,
+           data_version: Optional[int] = None) -> Tuple[str, int, Optional[str]]:
+    """
+    Checks the cache for a workflow request.
+
+    Args:
+        data_version: The user's current data version if already known (e.g. prefetched)
+
+    Returns:
+        (key, data_version, cached response or None); pass key and version to store()
+    """
+    if not RESULT_CACHE_ENABLED:
+        return "", 0, None
+    if data_version is None:
+        data_version = get_data_version(user_id)
+    key = cache_key(user_id, workflow, model, text)
+    cached = get_cached(key, data_version)
+    record_cache("result", cached is not None)
+    return key, data_version, cached
+
+
+@instrumented("cache")
+def store(key: str, user_id: str, data_version: int, response: str):
+    """Saves a response, dropping the user's stale entries and evicting LRU entries over the limits."""
+    if not RESULT_CACHE_ENABLED or not response:
+        return
+    now = time.time()
+    size = len(response.encode("utf-8"))
+    if size > RESULT_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        conn = _get_conn()
+        # Older data versions can never be hit again
+        stale = conn.execute(
+            "DELETE FROM result_cache WHERE user_id = ? AND data_version != ?", (user_id, data_version)
+        ).rowcount
+        conn.execute("""
+            INSERT OR REPLACE INTO result_cache (key, user_id, data_version, response, size, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (key, user_id, data_version, response, size, now, now))
+        evicted = _evict(conn, now)
+        conn.commit()
+        _stats["stores"] += 1
+        _stats["stale"] += stale
+        _stats["evictions"] += evicted
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> int:
+    """Deletes expired entries, then least recently used ones until within limits."""
+    evicted = conn.execute(
+        "DELETE FROM result_cache WHERE created_at < ?", (now - RESULT_CACHE_TTL,)
+    ).rowcount
+    count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache").fetchone()
+    if count <= RESULT_CACHE_MAX_ENTRIES and total <= RESULT_CACHE_MAX_BYTES:
+        return evicted
+
+    doomed = []
+    for key, size in conn.execute("SELECT key, size FROM result_cache ORDER BY last_used"):
+        if count <= RESULT_CACHE_MAX_ENTRIES and total <= RESULT_CACHE_MAX_BYTES:
+            break
+        doomed.append((key,))
+        count -= 1
+        total -= size
+    conn.executemany("DELETE FROM result_cache WHERE key = ?", doomed)
+    return evicted + len(doomed)
+
+
+def clear_cache(user_id: Optional[str] = None) -> int:
+    """Deletes all cached results (or one user's). Returns the number removed."""
+    with _lock:
+        conn = _get_conn()
+        if user_id:
+            removed = conn.execute("DELETE FROM result_cache WHERE user_id = ?", (user_id,)).rowcount
+        else:
+            removed = conn.execute("DELETE FROM result_cache").rowcount
+        conn.commit()
+        return removed
+
+
+def get_cache_stats() -> Dict:
+    """Returns hit/miss counters, hit rate and current cache size."""
+    with _lock:
+        stats = dict(_stats)
+        if _conn is not None:
+            stats["entries"], stats["bytes"] = _conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache"
+            ).fetchone()
+        else:
+            stats["entries"], stats["bytes"] = 0, 0
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+register_stats("result_cache", get_cache_stats, "Workflow result cache", gauges=("hit_rate", "entries", "bytes"))
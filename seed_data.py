@@ -8,32 +8,31 @@ Usage:
     python seed_data.py --clear            # Clears all data first
 """
 import argparse
-from datetime import datetime, timedelta
-from db_storage import write_log, get_db_connection
-import os
+from datetime import datetime, timedelta, timezone
+from db_storage import write_logs
 
 
 def clear_user_data(user_id: str):
     """Delete all data for a user"""
-    from db_storage import get_data_file_path
-    db_path = get_data_file_path(user_id)
-    if os.path.exists(db_path):
-        os.remove(db_path)
-        print(f"✓ Cleared data for {user_id}")
+    from db_storage import delete_user_data
+    delete_user_data(user_id)
+    print(f"✓ Cleared data for {user_id}")
 
 
 def seed_user_data(user_id: str, activities: list):
     """Seed a user's database with sample activities"""
     print(f"\n📊 Seeding data for {user_id}...")
     
-    for activity in activities:
-        try:
-            write_log(activity, user_id)
+    # One validated batch, one transaction
+    results = write_logs(activities, user_id)
+    for activity, result in zip(activities, results):
+        if result['ok']:
             print(f"  ✓ Logged: {activity['action']} of {activity['item']}")
-        except Exception as e:
-            print(f"  ✗ Failed: {e}")
+        else:
+            print(f"  ✗ Failed: {result['error']}")
     
-    print(f"✅ Seeded {len(activities)} activities for {user_id}")
+    written = sum(1 for result in results if result['ok'])
+    print(f"✅ Seeded {written} activities for {user_id}")
 
 
 # Demo user 1: Active farmer with diverse activities
@@ -46,7 +45,7 @@ TESTUSER_ACTIVITIES = [
         "unit": "pounds",
         "value_usd": 75.00,
         "note": "Sold at farmers market",
-        "timestamp": (datetime.now(datetime.UTC) - timedelta(days=2)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()
     },
     {
         "action": "sale",
@@ -55,7 +54,7 @@ TESTUSER_ACTIVITIES = [
         "unit": "pounds",
         "value_usd": 45.00,
         "note": "Sold to local restaurant",
-        "timestamp": (datetime.utcnow() - timedelta(days=3)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
     },
     {
         "action": "sale",
@@ -64,7 +63,7 @@ TESTUSER_ACTIVITIES = [
         "unit": "dozen",
         "value_usd": 96.00,
         "note": "Regular customer order",
-        "timestamp": (datetime.utcnow() - timedelta(days=1)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
     },
     {
         "action": "sale",
@@ -73,7 +72,7 @@ TESTUSER_ACTIVITIES = [
         "unit": "pounds",
         "value_usd": 120.00,
         "note": "Bulk sale to grocery store",
-        "timestamp": (datetime.utcnow() - timedelta(days=5)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=5)).isoformat()
     },
     {
         "action": "sale",
@@ -82,7 +81,7 @@ TESTUSER_ACTIVITIES = [
         "unit": "heads",
         "value_usd": 30.00,
         "note": "Farmers market",
-        "timestamp": (datetime.utcnow() - timedelta(days=4)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=4)).isoformat()
     },
     
     # Harvests
@@ -92,7 +91,7 @@ TESTUSER_ACTIVITIES = [
         "quantity": 150,
         "unit": "pounds",
         "note": "West field, heirloom variety",
-        "timestamp": (datetime.utcnow() - timedelta(days=3)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
     },
     {
         "action": "harvest",
@@ -100,7 +99,7 @@ TESTUSER_ACTIVITIES = [
         "quantity": 200,
         "unit": "pounds",
         "note": "North field, Yukon gold",
-        "timestamp": (datetime.utcnow() - timedelta(days=6)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=6)).isoformat()
     },
     {
         "action": "harvest",
@@ -108,7 +107,7 @@ TESTUSER_ACTIVITIES = [
         "quantity": 45,
         "unit": "pounds",
         "note": "Butternut and acorn varieties",
-        "timestamp": (datetime.utcnow() - timedelta(days=7)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
     },
     
     # Expenses
@@ -119,14 +118,14 @@ TESTUSER_ACTIVITIES = [
         "unit": "gallons",
         "value_usd": 52.50,
         "note": "Monthly refill",
-        "timestamp": (datetime.utcnow() - timedelta(days=4)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=4)).isoformat()
     },
     {
         "action": "expense",
         "item": "irrigation repair",
         "value_usd": 85.00,
         "note": "Fixed broken sprinkler line",
-        "timestamp": (datetime.utcnow() - timedelta(days=8)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=8)).isoformat()
     },
     
     # Purchases
@@ -137,14 +136,14 @@ TESTUSER_ACTIVITIES = [
         "unit": "bags",
         "value_usd": 120.00,
         "note": "Organic compost blend",
-        "timestamp": (datetime.utcnow() - timedelta(days=10)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=10)).isoformat()
     },
     {
         "action": "purchase",
         "item": "seeds",
         "value_usd": 45.00,
         "note": "Winter crop seeds (kale, spinach)",
-        "timestamp": (datetime.utcnow() - timedelta(days=12)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=12)).isoformat()
     },
     {
         "action": "purchase",
@@ -153,7 +152,7 @@ TESTUSER_ACTIVITIES = [
         "unit": "bags",
         "value_usd": 38.00,
         "note": "50lb bags",
-        "timestamp": (datetime.utcnow() - timedelta(days=7)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
     },
     
     # Recent activities
@@ -164,7 +163,7 @@ TESTUSER_ACTIVITIES = [
         "unit": "bunches",
         "value_usd": 25.00,
         "note": "Basil and parsley",
-        "timestamp": datetime.now(datetime.UTC).isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat()
     },
     {
         "action": "harvest",
@@ -172,7 +171,7 @@ TESTUSER_ACTIVITIES = [
         "quantity": 80,
         "unit": "pounds",
         "note": "East field",
-        "timestamp": (datetime.utcnow() - timedelta(hours=6)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(hours=6)).isoformat()
     },
 ]
 
@@ -185,7 +184,7 @@ DEMO_ACTIVITIES = [
         "unit": "dozen",
         "value_usd": 48.00,
         "note": "Weekly customer orders",
-        "timestamp": (datetime.utcnow() - timedelta(days=1)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
     },
     {
         "action": "harvest",
@@ -193,7 +192,7 @@ DEMO_ACTIVITIES = [
         "quantity": 25,
         "unit": "pounds",
         "note": "Garden harvest",
-        "timestamp": (datetime.now(datetime.UTC) - timedelta(days=2)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()
     },
     {
         "action": "sale",
@@ -202,14 +201,14 @@ DEMO_ACTIVITIES = [
         "unit": "pounds",
         "value_usd": 30.00,
         "note": "Neighborhood sale",
-        "timestamp": (datetime.utcnow() - timedelta(days=1)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
     },
     {
         "action": "expense",
         "item": "chicken coop supplies",
         "value_usd": 65.00,
         "note": "Bedding and feeders",
-        "timestamp": (datetime.utcnow() - timedelta(days=5)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=5)).isoformat()
     },
     {
         "action": "harvest",
@@ -217,7 +216,7 @@ DEMO_ACTIVITIES = [
         "quantity": 35,
         "unit": "pounds",
         "note": "Cherry and beefsteak",
-        "timestamp": (datetime.utcnow() - timedelta(days=3)).isoformat()
+        "timestamp": (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
     },
 ]
 
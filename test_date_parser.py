@@ -0,0 +1,88 @@
+"""
+Table-driven checks for the date expression parser (workflows/date_parser.py).
+Run: python test_date_parser.py  (or pytest)
+"""
+import sys
+import datetime as dt
+
+from workflows.date_parser import has_unparsed_date, parse_date_range, strip_date
+
+NOW = dt.datetime(2026, 6, 17, 15)  # a Wednesday
+
+# Phrase → (start, end, label)
+RANGES = [
+    ("sales today", ("2026-06-17T00:00:00", None, "today")),
+    ("yesterday", ("2026-06-16T00:00:00", "2026-06-17T00:00:00", "yesterday")),
+    ("last week", ("2026-06-08T00:00:00", "2026-06-15T00:00:00", "last week")),
+    ("this month", ("2026-06-01T00:00:00", None, "this month")),
+    ("last quarter", ("2026-01-01T00:00:00", "2026-04-01T00:00:00", "last quarter")),
+    ("this year", ("2026-01-01T00:00:00", None, "this year")),
+    ("last 30 days", ("2026-05-18T00:00:00", None, "in the last 30 days")),
+    ("on monday", ("2026-06-15T00:00:00", "2026-06-16T00:00:00", "on Monday")),
+    ("last friday", ("2026-06-12T00:00:00", "2026-06-13T00:00:00", "last Friday")),
+    ("in may", ("2026-05-01T00:00:00", "2026-06-01T00:00:00", "in May")),
+    ("during march 2024", ("2024-03-01T00:00:00", "2024-04-01T00:00:00", "in March 2024")),
+    ("in 2025", ("2025-01-01T00:00:00", "2026-01-01T00:00:00", "in 2025")),
+    ("on march 1", ("2026-03-01T00:00:00", "2026-03-02T00:00:00", "on March 1")),
+    ("on december 25", ("2025-12-25T00:00:00", "2025-12-26T00:00:00", "on December 25, 2025")),
+    ("5/12", ("2026-05-12T00:00:00", "2026-05-13T00:00:00", "on May 12")),
+    ("2026-03-01", ("2026-03-01T00:00:00", "2026-03-02T00:00:00", "on March 1")),
+    ("since april", ("2026-04-01T00:00:00", None, "since April")),
+    ("between march 1 and april 15", ("2026-03-01T00:00:00", "2026-04-16T00:00:00", "from March 1 to April 15")),
+    ("from may to june", ("2026-05-01T00:00:00", "2026-07-01T00:00:00", "from May to June")),
+]
+
+# Phrases with no supported time expression → whether a date is mentioned anyway
+UNPARSED = [
+    ("how much did i sell", False),
+    ("sold in the spring", False),
+    ("on the 5th", True),
+]
+
+# Phrases whose parsed span covers only part of the date wording
+PARTIAL = ["the 3rd week of may"]
+
+
+def test_ranges():
+    for text, expected in RANGES:
+        window = parse_date_range(text, NOW)
+        assert window is not None, text
+        assert (window["start"], window["end"], window["label"]) == expected, text
+        assert not has_unparsed_date(text, window), text
+
+
+def test_unparsed():
+    for text, mentions_date in UNPARSED:
+        assert parse_date_range(text, NOW) is None, text
+        assert has_unparsed_date(text, None) == mentions_date, text
+
+
+def test_partial():
+    for text in PARTIAL:
+        assert has_unparsed_date(text, parse_date_range(text, NOW)), text
+
+
+def test_strip_date():
+    window = parse_date_range("sales today", NOW)
+    assert strip_date("sales today", window) == "sales"
+    assert strip_date("how much did i sell", None) == "how much did i sell"
+
+
+def test_aware_now():
+    # Aware reference times are converted to naive UTC (23:30 in UTC-5 is the next day in UTC)
+    eastern = dt.timezone(dt.timedelta(hours=-5))
+    aware = dt.datetime(2026, 6, 16, 23, 30, tzinfo=eastern)
+    assert parse_date_range("today", aware)["start"] == "2026-06-17T00:00:00"
+    assert parse_date_range("on march 1", aware) == parse_date_range("on march 1", NOW)
+
+
+if __name__ == "__main__":
+    failed = 0
+    for test in (test_ranges, test_unparsed, test_partial, test_strip_date, test_aware_now):
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
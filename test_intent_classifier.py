@@ -0,0 +1,70 @@
+"""
+Table-driven checks for the local intent classifier (intent_classifier.py).
+Run: python test_intent_classifier.py  (or pytest)
+"""
+import sys
+
+from intent_classifier import classify
+
+# Message → intent the rules must decide on their own
+RULE_ROUTED = [
+    ("how much did I earn from tomatoes last month?", "QUERY"),
+    ("how many eggs did we sell this week?", "QUERY"),
+    ("how much money have I made this year?", "QUERY"),
+    ("how much were my expenses in May?", "QUERY"),
+    ("give me my sales report for this month", "REPORT"),
+    ("summarize my expenses for the last 3 months", "REPORT"),
+    ("generate a report for last week", "REPORT"),
+    ("i need a breakdown of my income sources", "REPORT"),
+    ("what's the market price of corn?", "GENERAL"),
+    ("when should I plant garlic?", "GENERAL"),
+    ("hello there", "GENERAL"),
+    ("sold 20 lbs of tomatoes for $30", "LOG"),
+]
+
+# Messages that look like another intent on the surface; the local classifier
+# must not route them (the LLM decides)
+DEFERRED = [
+    "how much water do I need for my tomatoes?",      # advice, not a data query
+    "how much fertilizer should we use per acre?",
+    "how much should I charge for my eggs?",
+    "what is the summary of the new farm bill?",      # not a summary of the user's data
+    "what was the price of my last tomato sale?",     # a data query, not market prices
+]
+
+# Plans with an amount: never routed to LOG (they'd be saved as activities)
+NOT_LOG = [
+    "I need to buy seeds for $20",
+    "we will sell tomatoes for $3 a pound",
+    "I plan to spend $500 on a new fence",
+    "going to buy feed for $40 tomorrow",
+    "I want to sell my eggs for $5",
+    "I'll pay $30 for the vet",
+]
+
+
+def test_rule_routed():
+    for text, intent in RULE_ROUTED:
+        assert classify(text)[::2] == (intent, "rule"), text
+
+
+def test_deferred():
+    for text in DEFERRED:
+        assert classify(text)[0] is None, text
+
+
+def test_not_log():
+    for text in NOT_LOG:
+        assert classify(text)[0] != "LOG", text
+
+
+if __name__ == "__main__":
+    failed = 0
+    for test in (test_rule_routed, test_deferred, test_not_log):
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
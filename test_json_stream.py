@@ -0,0 +1,73 @@
+"""
+Table-driven checks for the streaming JSON scanner (workflows/json_stream.py)
+as used by LOG extraction (workflows/log_flow.py).
+Run: python test_json_stream.py  (or pytest)
+"""
+import asyncio
+import sys
+
+from workflows.json_stream import astream_first_json, stream_first_json
+from workflows.log_flow import _activity_list, _is_activity_list, _is_bare_activity
+
+SALE = '{"action": "sale", "item": "tomatoes"}'
+FEED = '{"action": "purchase", "item": "feed"}'
+
+# LLM output → (number of activities, whether the stream is cut before its end)
+EXTRACTIONS = [
+    (f"[{SALE}, {FEED}]\n\nNote: I assumed both happened today.", (2, True)),
+    (f"```json\n[{SALE}]\n```\nLet me know if anything is missing.", (1, True)),
+    (f"Here are the [2] activities: [{SALE}, {FEED}]\nDone.", (2, True)),      # bracketed scalar in prose
+    (f"[sic] {SALE}", (1, False)),
+    (f"{SALE}\n{FEED}", (2, False)),                                            # newline-separated objects
+    (f"{SALE},\n{FEED}\n\nNote: prices are estimates.", (2, True)),
+    (f'{{"activities": [{SALE}, {FEED}]}}\n{{"extra": true}}', (2, True)),
+]
+
+# Default scanner: first complete JSON value, whatever it is
+FIRST_VALUE = [
+    ('Here is the reply: {"intent": "LOG"} and more text', {"intent": "LOG"}),
+    ("[sic] is not JSON but [1, 2] is", [1, 2]),
+    ('{"text": "a } inside a string"}', {"text": "a } inside a string"}),
+    ("no JSON at all", None),
+]
+
+
+def _chunks(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def _achunks(text):
+    for chunk in _chunks(text):
+        yield chunk
+
+
+def test_extractions():
+    for text, (count, cut) in EXTRACTIONS:
+        raw, value = stream_first_json(_chunks(text), accept=_is_activity_list, collect=_is_bare_activity)
+        activities = _activity_list(value)
+        assert activities is not None and len(activities) == count, text
+        assert (len(raw) < len(text)) == cut, text
+
+
+def test_async_extractions():
+    for text, (count, _) in EXTRACTIONS:
+        _, value = asyncio.run(astream_first_json(_achunks(text), accept=_is_activity_list,
+                                                  collect=_is_bare_activity))
+        assert len(_activity_list(value)) == count, text
+
+
+def test_first_value():
+    for text, expected in FIRST_VALUE:
+        assert stream_first_json(_chunks(text))[1] == expected, text
+
+
+if __name__ == "__main__":
+    failed = 0
+    for test in (test_extractions, test_async_extractions, test_first_value):
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
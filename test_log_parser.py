@@ -0,0 +1,81 @@
+"""
+Table-driven checks for the rule-based LOG parser (workflows/log_parser.py).
+Run: python test_log_parser.py  (or pytest)
+"""
+import sys
+
+from workflows.log_parser import parse_activities, parse_activity
+
+# Statement → expected fields
+PARSED = [
+    ("I sold 50 lbs of tomatoes for $75",
+     {"action": "sale", "item": "tomatoes", "quantity": 50, "unit": "pounds", "value_usd": 75.0}),
+    ("bought a bag of feed for $20",
+     {"action": "purchase", "item": "feed", "quantity": 1, "unit": "bags", "value_usd": 20.0}),
+    ("sold 24 eggs for $12",
+     {"action": "sale", "item": "eggs", "quantity": 24, "value_usd": 12.0}),
+    ("spent $45 on tractor fuel",
+     {"action": "expense", "item": "tractor fuel", "value_usd": 45.0}),
+    ("harvested 100 pounds of potatoes from the west field",
+     {"action": "harvest", "item": "potatoes", "quantity": 100, "unit": "pounds", "note": "from the west field"}),
+    ("sold 2 dozen eggs to the market for $8",
+     {"action": "sale", "item": "eggs", "quantity": 2, "unit": "dozen", "value_usd": 8.0, "note": "to the market"}),
+    ("picked 30 lbs of apples from the north orchard",
+     {"action": "harvest", "item": "apples", "quantity": 30, "unit": "pounds", "note": "from the north orchard"}),
+    ("harvested 40 lbs lettuce from greenhouse 2",
+     {"action": "harvest", "item": "lettuce", "quantity": 40, "unit": "pounds", "note": "from greenhouse 2"}),
+]
+
+# Statements the parser must leave to the LLM (saving them locally would store wrong data)
+DEFERRED = [
+    "sold 10 bunches of kale at $3 each",        # unit price, not the total
+    "sold 10 heads of lettuce for $20 each",
+    "sold 10 lbs tomatoes at $2 per lb",
+    "sold 10 lbs tomatoes at $2/lb",
+    "sold 10 lbs of honey at $4 a pound",
+    "sold 5 lbs for $10",                        # no item, only a unit
+    "sold half a dozen eggs for $3",             # fractional amounts
+    "bought 1/2 bushel of apples for $10",
+    "bought feed and hay for $30",               # compound item
+    "sold it for $20",                           # pronoun item
+    "how much did I sell?",                      # question
+    "I didn't sell any tomatoes",                # negation
+    "sold tomatoes for $10 and $20",             # two amounts
+    "I picked up feed for $30",                  # phrasal verbs, not harvests
+    "collected payment from Joe for $40",
+    "picked up 2 bags of seed for $15",
+]
+
+# Multi-activity messages → number of activities
+MULTI = [
+    ("sold 30 lbs carrots for $45, bought feed for $60 and harvested 200 lbs potatoes", 3),
+    ("sold 20 lbs of tomatoes for $30 then spent $10 on gas", 2),
+]
+
+
+def test_parsed():
+    for text, expected in PARSED:
+        assert parse_activity(text) == expected, text
+
+
+def test_deferred():
+    for text in DEFERRED:
+        assert parse_activity(text) is None, text
+
+
+def test_multi_activity():
+    for text, count in MULTI:
+        activities = parse_activities(text)
+        assert activities is not None and len(activities) == count, text
+
+
+if __name__ == "__main__":
+    failed = 0
+    for test in (test_parsed, test_deferred, test_multi_activity):
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,79 @@
+"""
+Table-driven checks for the structured query planner (workflows/query_planner.py).
+Run: python test_query_planner.py  (or pytest)
+"""
+import sys
+import datetime as dt
+
+from workflows.query_planner import plan_query
+
+NOW = dt.datetime(2026, 6, 15, 12)
+
+# Question → expected plan fields
+PLANNED = [
+    ("how much did I earn from tomatoes last month?",
+     {"metric": "value", "actions": ["sale"], "item": "tomatoes", "window": "last month"}),
+    ("how much did I spend?",
+     {"metric": "value", "actions": ["expense", "purchase"], "item": None}),
+    ("how much fertilizer did I buy?",                  # item between "how much" and the verb
+     {"metric": "value", "actions": ["purchase"], "item": "fertilizer"}),
+    ("how much money have i made this year?",
+     {"metric": "value", "actions": ["sale"], "item": None, "window": "this year"}),
+    ("how much did i spend on feed in march?",
+     {"metric": "value", "item": "feed", "start": "2026-03-01T00:00:00", "end": "2026-04-01T00:00:00"}),
+    ("how many pounds of tomatoes did I sell this year?",
+     {"metric": "quantity", "actions": ["sale"], "item": "tomatoes", "start": "2026-01-01T00:00:00"}),
+    ("how many eggs did i collect?",
+     {"metric": "quantity", "actions": ["harvest"], "item": "eggs"}),
+    ("how many times did i harvest tomatoes?",
+     {"metric": "count", "actions": ["harvest"], "item": "tomatoes"}),
+    ("how many harvests of tomatoes did i record?",
+     {"metric": "count", "actions": ["harvest"], "item": "tomatoes"}),
+    ("how many times have we picked strawberries this year?",
+     {"metric": "count", "actions": ["harvest"], "item": "strawberries", "window": "this year"}),
+    ("how many sales did i make last month?",
+     {"metric": "count", "actions": ["sale"], "item": None, "window": "last month"}),
+    ("what was my biggest sale?",
+     {"metric": "max", "actions": ["sale"]}),
+    ("did i sell any eggs last week?",
+     {"metric": "exists", "item": "eggs", "start": "2026-06-08T00:00:00", "end": "2026-06-15T00:00:00"}),
+    ("what is my net income this month?",
+     {"metric": "net", "window": "this month"}),
+]
+
+# Questions the planner must leave to the LLM
+DEFERRED = [
+    "how much?",                                        # no verb
+    "why did my sales drop?",                           # open-ended
+    "how much did i sell to my regular customer?",
+    "how many times did i go to the market?",           # count over something we can't filter on
+    "how many times did i sell tomatoes at the market?",
+    "how many entries for tomatoes?",
+    "how much profit did I make from tomatoes?",        # net is farm-wide, not per item
+    "how many cows do I have?",                         # no action: bought and sold would be mixed
+    "how much fertilizer did i spend on seeds?",        # two different items
+]
+
+
+def test_planned():
+    for text, expected in PLANNED:
+        plan = plan_query(text, NOW)
+        assert plan is not None, text
+        assert {key: plan[key] for key in expected} == expected, text
+
+
+def test_deferred():
+    for text in DEFERRED:
+        assert plan_query(text, NOW) is None, text
+
+
+if __name__ == "__main__":
+    failed = 0
+    for test in (test_planned, test_deferred):
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,174 @@
+"""
+Compact Prompt Context Builder
+Encodes farm data for QUERY/REPORT prompts within a per-model token budget.
+
+Logs are rendered as a pipe-separated table (one header, no repeated keys,
+no id/user_id), stats and item rollups as one line per entry. Rows that don't
+fit the budget are folded, oldest first, into a one-line per-action summary.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import register_stats
+
+# Prompt-token budgets (whole prompt, excluding generated tokens).
+# granite-13b-chat-v2 has an 8192-token window and generates up to 2048.
+PROMPT_TOKEN_BUDGETS = {
+    "small": int(os.getenv("AGRI_PROMPT_BUDGET_SMALL", "3000")),
+    "large": int(os.getenv("AGRI_PROMPT_BUDGET_LARGE", "5500")),
+}
+
+# Rough chars-per-token ratio for English/number-heavy text on Granite tokenizers
+CHARS_PER_TOKEN = 4.0
+
+LOG_COLUMNS = ("date", "action", "item", "qty", "unit", "usd", "note")
+
+# Tokens kept back for the "more entries" summary line
+_SUMMARY_RESERVE = 60
+
+_stats_lock = threading.Lock()
+_stats = {"builds": 0, "tokens_before": 0, "tokens_after": 0, "rows_included": 0, "rows_summarized": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (no tokenizer round-trip)."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def _cell(value) -> str:
+    """Formats one table cell: compact numbers, no separators or newlines."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value).replace("|", "/").replace("\n", " ").strip()
+
+
+def encode_log_row(log: Dict) -> str:
+    """One log as a table row (timestamp shortened to the date)."""
+    return "|".join((
+        _cell((log.get("timestamp") or "")[:10]),
+        _cell(log.get("action")),
+        _cell(log.get("item")),
+        _cell(log.get("quantity")),
+        _cell(log.get("unit")),
+        _cell(log.get("value_usd")),
+        _cell(log.get("note")),
+    ))
+
+
+def encode_stats(stats: Dict) -> str:
+    """Summary stats as a few short lines."""
+    lines = [
+        f"sales=${stats['total_sales']:.2f} expenses=${stats['total_expenses']:.2f} "
+        f"net=${stats['total_sales'] - stats['total_expenses']:.2f} entries={stats['total_entries']}"
+    ]
+    for action, values in sorted(stats["by_action"].items()):
+        lines.append(f"{action}: count={values['count']} total=${values['total']:.2f}")
+    return "\n".join(lines)
+
+
+def encode_item_summary(item_summary: Sequence[Tuple], limit: int) -> str:
+    """Item rollup rows (item, action, count, total_quantity, total_value) as a table."""
+    rows = ["item|action|count|qty|usd"]
+    rows.extend("|".join(_cell(v) for v in row[:5]) for row in item_summary[:limit])
+    return "\n".join(rows)
+
+
+def summarize_logs(logs: Sequence[Dict]) -> str:
+    """One line describing logs left out of the table: date range and per-action totals."""
+    if not logs:
+        return ""
+    by_action: Dict[str, List[float]] = {}
+    for log in logs:
+        totals = by_action.setdefault(log.get("action") or "?", [0, 0.0])
+        totals[0] += 1
+        totals[1] += log.get("value_usd") or 0.0
+    dates = [(log.get("timestamp") or "")[:10] for log in logs if log.get("timestamp")]
+    span = f", {min(dates)}..{max(dates)}" if dates else ""
+    parts = "; ".join(f"{action} x{count} ${value:.2f}" for action, (count, value) in sorted(by_action.items()))
+    return f"(+{len(logs)} more entries{span}: {parts})"
+
+
+def _verbose_tokens(stats: Dict, item_summary: Sequence[Tuple], logs: Sequence[Dict], item_limit: int) -> int:
+    """Token estimate for the previous pretty-printed JSON encoding (for savings metrics)."""
+    items = [{"item": r[0], "action": r[1], "count": r[2], "total_quantity": r[3], "total_value_usd": r[4]}
+             for r in item_summary[:item_limit]]
+    return (estimate_tokens(json.dumps(stats["by_action"], indent=2))
+            + estimate_tokens(json.dumps(items, indent=2))
+            + estimate_tokens(json.dumps(list(logs), indent=2)))
+
+
+def build_context(stats: Dict, item_summary: Sequence[Tuple], logs: Sequence[Dict],
+                  model_type: str = "small", reserved_tokens: int = 0, item_limit: int = 15,
+                  max_rows: Optional[int] = None, budget: Optional[int] = None) -> Dict:
+    """
+    Encodes stats, item rollups and logs (in the given order) within the model's budget.
+
+    Args:
+        stats: get_summary_stats() result
+        item_summary: get_item_summary() rows
+        logs: Logs in priority order (most recent or most relevant first)
+        model_type: "small" or "large" (selects the budget)
+        reserved_tokens: Tokens used by the rest of the prompt (template, question)
+        item_limit: Max item rollup rows
+        max_rows: Max log rows in the table (the rest are summarized)
+        budget: Override the configured budget
+
+    Returns:
+        Dict with stats/items/logs text blocks, tokens (estimate for the blocks),
+        tokens_saved (vs. pretty JSON), rows_included and rows_summarized
+    """
+    budget = PROMPT_TOKEN_BUDGETS.get(model_type, PROMPT_TOKEN_BUDGETS["small"]) if budget is None else budget
+
+    stats_text = encode_stats(stats)
+    items_text = encode_item_summary(item_summary, item_limit)
+    header = "|".join(LOG_COLUMNS)
+    used = reserved_tokens + estimate_tokens(stats_text) + estimate_tokens(items_text) + estimate_tokens(header)
+    remaining = budget - used - (_SUMMARY_RESERVE if logs else 0)
+
+    # Rows in priority order until the budget runs out; the rest get summarized
+    rows = []
+    for log in logs[:max_rows]:
+        row = encode_log_row(log)
+        cost = estimate_tokens(row)
+        if cost > remaining:
+            break
+        rows.append(row)
+        remaining -= cost
+
+    logs_text = "\n".join([header] + rows)
+    dropped = logs[len(rows):]
+    if dropped:
+        logs_text += "\n" + summarize_logs(dropped)
+
+    tokens = estimate_tokens(stats_text) + estimate_tokens(items_text) + estimate_tokens(logs_text)
+    tokens_saved = max(0, _verbose_tokens(stats, item_summary, logs[:max_rows], item_limit) - tokens)
+
+    with _stats_lock:
+        _stats["builds"] += 1
+        _stats["tokens_before"] += tokens + tokens_saved
+        _stats["tokens_after"] += tokens
+        _stats["rows_included"] += len(rows)
+        _stats["rows_summarized"] += len(dropped)
+
+    return {
+        "stats": stats_text,
+        "items": items_text,
+        "logs": logs_text,
+        "tokens": tokens,
+        "tokens_saved": tokens_saved,
+        "rows_included": len(rows),
+        "rows_summarized": len(dropped),
+    }
+
+
+def get_context_stats() -> Dict:
+    """Returns cumulative context sizes and estimated tokens saved."""
+    with _stats_lock:
+        return {**_stats, "tokens_saved": _stats["tokens_before"] - _stats["tokens_after"]}
+
+
+register_stats("context", get_context_stats, "Compacted LLM log context")
@@ -0,0 +1,252 @@
+"""
+Date Expression Parser
+Turns time phrases in questions into [start, end) bounds for SQL range filters.
+Example: "sales report for last week" → {start: 2024-05-06T00:00:00, end: 2024-05-13T00:00:00, label: "last week"}
+
+Supported: today, yesterday, this/last week|month|quarter|year, last N days|weeks|months,
+weekdays ("on Monday", "last Friday"), months ("in May", "during March 2024"), years
+("in 2023"), dates ("on March 1", "5/12", "2024-03-01"), "since <date|month>" and
+"between/from <date|month> and/to <date|month>". Bounds are naive UTC ISO strings.
+"""
+import re
+import datetime as dt
+from typing import Dict, Optional, Tuple
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+_MONTHS = "(?:" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")(?![a-z])\.?"
+_DAY = r"(?:[12]\d|3[01]|0?[1-9])"
+_YEAR = r"(?:19|20)\d\d"
+
+# A calendar date or a whole month. Group prefixes: iso = 2024-03-01, m = "March 1(, 2024)",
+# d = "1st (of) March (2024)", s = "3/1(/24)", o = "March (2024)"
+_POINT = (
+    r"(?:(?P<iso>(?:19|20)\d\d-\d\d-\d\d)"
+    rf"|(?P<mmonth>{_MONTHS})\s+(?P<mday>{_DAY})(?:st|nd|rd|th)?(?:,?\s+(?P<myear>{_YEAR}))?(?![\d:])"
+    rf"|(?P<dday>{_DAY})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<dmonth>{_MONTHS})(?:,?\s+(?P<dyear>{_YEAR}))?"
+    rf"|(?P<snum>1[0-2]|0?[1-9])/(?P<sday>{_DAY})(?:/(?P<syear>(?:19|20)?\d\d))?"
+    rf"|(?P<omonth>{_MONTHS})(?:\s+(?P<oyear>{_YEAR}))?)"
+)
+
+
+def _named(pattern: str, suffix: str) -> str:
+    """Gives each named group a suffix so two points can appear in one pattern."""
+    return re.sub(r"\(\?P<(\w+)>", lambda m: f"(?P<{m.group(1)}{suffix}>", pattern)
+
+
+_POINT_A = _named(_POINT, "_a")
+_POINT_B = _named(_POINT, "_b")
+
+_BETWEEN = re.compile(rf"\b(?:between|from)\s+{_POINT_A}\s+(?:and|to|until|through|-)\s+{_POINT_B}\b")
+_SINCE = re.compile(rf"\bsince\s+(?:{_POINT_A}|(?P<wd_a>{'|'.join(WEEKDAYS)}))\b")
+_ON_DATE = re.compile(rf"\b(?:on|for|in|during|throughout|of)?\s*{_POINT_A}\b")
+_YEAR_ONLY = re.compile(r"\b(?:in|during|for|throughout)\s+(?P<year>(?:19|20)\d\d)\b")
+_LAST_N = re.compile(r"\b(?:last|past|previous)\s+(?P<n>\d+)\s+(?P<unit>days?|weeks?|months?)\b")
+_RELATIVE = re.compile(r"\b(?P<which>this|last|past|previous|current)\s+(?P<unit>week|month|quarter|year)\b")
+_WEEKDAY = re.compile(rf"\b(?P<last>last\s+)?(?:on\s+)?(?P<wd>{'|'.join(WEEKDAYS)})\b")
+
+# Words that mean a question mentions a date we couldn't resolve
+_DATE_WORDS = re.compile(
+    r"\b(" + "|".join(MONTHS) + r")\b|\b\d{1,2}(st|nd|rd|th)\b|"
+    r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday|quarter|since|between|"
+    r"today|yesterday|week|month|year)\b|\b(19|20)\d\d\b|\b\d{1,2}/\d{1,2}\b",
+    re.IGNORECASE)
+
+
+def _iso(value: dt.datetime) -> str:
+    return value.isoformat()
+
+
+def _add_months(value: dt.datetime, months: int) -> dt.datetime:
+    index = value.month - 1 + months
+    return value.replace(year=value.year + index // 12, month=index % 12 + 1, day=1)
+
+
+def _month_label(start: dt.datetime, today: dt.datetime) -> str:
+    name = start.strftime("%B")
+    return name if start.year == today.year else f"{name} {start.year}"
+
+
+def _day_label(day: dt.datetime, today: dt.datetime) -> str:
+    label = f"{day.strftime('%B')} {day.day}"
+    return label if day.year == today.year else f"{label}, {day.year}"
+
+
+def _resolve_point(groups: Dict, suffix: str, today: dt.datetime) -> Optional[Tuple[dt.datetime, dt.datetime, str]]:
+    """
+    Converts the groups matched by _POINT into (start, end, label).
+    Dates without a year resolve to the most recent such date not after today.
+    """
+    def get(name):
+        value = groups.get(f"{name}{suffix}")
+        return value.rstrip(".") if value else value
+
+    def infer_year(month: int, day: int, year: Optional[str]) -> dt.datetime:
+        if year:
+            year = int(year) + (2000 if len(year) == 2 else 0)
+            return dt.datetime(year, month, day)
+        candidate = dt.datetime(today.year, month, day)
+        return candidate if candidate <= today else candidate.replace(year=today.year - 1)
+
+    try:
+        if get("iso"):
+            day = dt.datetime.strptime(get("iso"), "%Y-%m-%d")
+        elif get("mmonth"):
+            day = infer_year(MONTHS[get("mmonth")], int(get("mday")), get("myear"))
+        elif get("dmonth"):
+            day = infer_year(MONTHS[get("dmonth")], int(get("dday")), get("dyear"))
+        elif get("snum"):
+            day = infer_year(int(get("snum")), int(get("sday")), get("syear"))
+        elif get("omonth"):
+            month = MONTHS[get("omonth")]
+            if get("oyear"):
+                start = dt.datetime(int(get("oyear")), month, 1)
+            else:
+                start = dt.datetime(today.year, month, 1)
+                if start > today:
+                    start = start.replace(year=today.year - 1)
+            return start, _add_months(start, 1), _month_label(start, today)
+        else:
+            return None
+    except ValueError:
+        return None  # e.g. February 30
+    return day, day + dt.timedelta(days=1), _day_label(day, today)
+
+
+def _weekday_on_or_before(today: dt.datetime, weekday: int, strictly_before: bool = False) -> dt.datetime:
+    delta = (today.weekday() - weekday) % 7
+    if strictly_before and delta == 0:
+        delta = 7
+    return today - dt.timedelta(days=delta)
+
+
+def _is_bare_may(match: re.Match) -> bool:
+    """'may' is usually a verb: only read it as a month with a preposition, day or year."""
+    if match.group("omonth_a") is None or match.group("omonth_a").rstrip(".") != "may":
+        return False
+    return match.group("oyear_a") is None and not re.match(r"\s*(on|for|in|during|throughout|of)\b", match.group(0))
+
+
+def parse_date_range(text: str, now: Optional[dt.datetime] = None) -> Optional[Dict]:
+    """
+    Finds the first supported time expression in text.
+
+    Args:
+        text: Question or request text
+        now: Reference time (naive UTC, or timezone-aware and converted to UTC);
+             defaults to the current time
+
+    Returns:
+        Dict with start (inclusive) and end (exclusive; None = open-ended) as naive
+        ISO strings, a human-readable label, and span (match offsets in text),
+        or None if no time expression was recognized
+    """
+    now = now or dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+    if now.tzinfo is not None:
+        now = now.astimezone(dt.timezone.utc).replace(tzinfo=None)  # Bounds are naive UTC
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    lowered = text.lower()
+
+    def result(start, end, label, match):
+        return {"start": _iso(start) if start else None, "end": _iso(end) if end else None,
+                "label": label, "span": match.span()}
+
+    match = _BETWEEN.search(lowered)
+    if match:
+        first = _resolve_point(match.groupdict(), "_a", today)
+        second = _resolve_point(match.groupdict(), "_b", today)
+        if first and second and first[0] <= second[0]:
+            return result(first[0], second[1], f"from {first[2]} to {second[2]}", match)
+
+    match = _SINCE.search(lowered)
+    if match:
+        if match.group("wd_a"):
+            start = _weekday_on_or_before(today, WEEKDAYS.index(match.group("wd_a")))
+            return result(start, None, f"since {match.group('wd_a').capitalize()}", match)
+        point = _resolve_point(match.groupdict(), "_a", today)
+        if point:
+            return result(point[0], None, f"since {point[2]}", match)
+
+    if re.search(r"\btoday\b", lowered):
+        return result(today, None, "today", re.search(r"\btoday\b", lowered))
+    match = re.search(r"\byesterday\b", lowered)
+    if match:
+        return result(today - dt.timedelta(days=1), today, "yesterday", match)
+
+    match = _LAST_N.search(lowered)
+    if match:
+        n, unit = int(match.group("n")), match.group("unit").rstrip("s")
+        if unit == "day":
+            start = today - dt.timedelta(days=n)
+        elif unit == "week":
+            start = today - dt.timedelta(weeks=n)
+        else:
+            start = _add_months(today, -n).replace(day=min(today.day, 28))
+        return result(start, None, f"in the last {n} {match.group('unit')}", match)
+
+    match = _RELATIVE.search(lowered)
+    if match:
+        unit = match.group("unit")
+        previous = match.group("which") in ("last", "past", "previous")
+        if unit == "week":
+            start = today - dt.timedelta(days=today.weekday())
+            step = lambda value, n: value + dt.timedelta(weeks=n)
+        elif unit == "month":
+            start = today.replace(day=1)
+            step = _add_months
+        elif unit == "quarter":
+            start = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+            step = lambda value, n: _add_months(value, 3 * n)
+        else:
+            start = today.replace(month=1, day=1)
+            step = lambda value, n: value.replace(year=value.year + n)
+        if previous:
+            return result(step(start, -1), start, f"last {unit}", match)
+        return result(start, None, f"this {unit}", match)
+
+    match = _WEEKDAY.search(lowered)
+    if match:
+        name = match.group("wd")
+        day = _weekday_on_or_before(today, WEEKDAYS.index(name), strictly_before=bool(match.group("last")))
+        label = f"last {name.capitalize()}" if match.group("last") else f"on {name.capitalize()}"
+        return result(day, day + dt.timedelta(days=1), label, match)
+
+    for match in _ON_DATE.finditer(lowered):
+        if _is_bare_may(match):
+            continue
+        point = _resolve_point(match.groupdict(), "_a", today)
+        if point:
+            label = f"in {point[2]}" if match.group("omonth_a") else f"on {point[2]}"
+            return result(point[0], point[1], label, match)
+
+    match = _YEAR_ONLY.search(lowered)
+    if match:
+        start = dt.datetime(int(match.group("year")), 1, 1)
+        return result(start, start.replace(year=start.year + 1), f"in {start.year}", match)
+
+    return None
+
+
+def has_unparsed_date(text: str, parsed: Optional[Dict] = None) -> bool:
+    """
+    True if text mentions a date or period outside the parsed span
+    (e.g. a second date, or a phrase the parser doesn't support).
+    """
+    if parsed:
+        begin, end = parsed["span"]
+        text = text[:begin] + " " + text[end:]
+    return bool(_DATE_WORDS.search(text))
+
+
+def strip_date(text: str, parsed: Optional[Dict]) -> str:
+    """Removes the parsed time expression from text (so it isn't mistaken for an item)."""
+    if not parsed:
+        return text
+    begin, end = parsed["span"]
+    return re.sub(r"\s+", " ", text[:begin] + " " + text[end:]).strip()
@@ -3,8 +3,21 @@ GENERAL Workflow
 Handles conversational queries and general farming advice.
 No data access - uses LLM's base knowledge.
 """
+from typing import Iterator
 from langchain_config import get_llm_instance
+from metrics import instrumented
 
+def _build_prompt(text: str) -> str:
+    """Builds the general-advice prompt for the user's question."""
+    prompt_template = """You are a helpful farm assistant. Provide a clear and concise answer to the user's question.
+
+User Question: {question}
+
+Answer:"""
+    return prompt_template.format(question=text)
+
+
+@instrumented("workflow")
 def general_flow(text: str) -> str:
     """
     Answers general farming questions using LLM's base knowledge.
@@ -15,11 +28,19 @@ def general_flow(text: str) -> str:
     Returns:
         Helpful response for general queries, advice, or chitchat
     """
-    prompt_template = """You are a helpful farm assistant. Provide a clear and concise answer to the user's question.
+    llm = get_llm_instance()
+    return llm.invoke(_build_prompt(text))
 
-User Question: {question}
 
-Answer:"""
-    prompt = prompt_template.format(question=text)
+@instrumented("workflow")
+def general_flow_stream(text: str) -> Iterator[str]:
+    """Streaming variant of general_flow: yields response tokens as they arrive."""
+    llm = get_llm_instance()
+    yield from llm.stream(_build_prompt(text))
+
+
+@instrumented("workflow")
+async def ageneral_flow(text: str) -> str:
+    """Async variant of general_flow (uses llm.ainvoke)."""
     llm = get_llm_instance()
-    return llm.invoke(prompt)
+    return await llm.ainvoke(_build_prompt(text))
@@ -0,0 +1,186 @@
+"""
+Streaming JSON Extraction
+Reads an LLM token stream only until the first complete JSON value has arrived,
+then closes the stream so the model stops generating.
+Example: '```json\n[{"action": "sale", ...}]\n```\nNote: I assumed...' → stops after ']'
+
+The scanner tracks bracket depth and string/escape state one character at a
+time (linear, no regex backtracking). A balanced value that isn't valid JSON
+(e.g. "[sic]" in commentary) is skipped and scanning continues, as is a valid
+value the caller's `accept` check rejects (e.g. "[2]" in "Here are the [2] activities").
+When the caller's `collect` check says a value may be the first of several
+(e.g. a bare activity object), objects separated by whitespace or commas
+('{...}\n{...}') are all read and returned as a list; the stream stops at the
+first non-JSON text after them.
+"""
+import json
+import threading
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from metrics import register_stats
+
+_OPENERS = {"{": "}", "[": "]"}
+
+_stats_lock = threading.Lock()
+_stats = {"streams": 0, "early_stops": 0, "no_json": 0}
+
+
+class JsonStreamParser:
+    """Incremental scanner for the first complete JSON object or array in streamed text."""
+
+    def __init__(self, accept: Optional[Callable[[Any], bool]] = None,
+                 collect: Optional[Callable[[Any], bool]] = None):
+        self.text = ""
+        self.value: Any = None
+        self.done = False
+        self._accept = accept
+        self._collect = collect
+        self._objects: List[Dict] = []
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._closers = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consumes the next chunk.
+
+        Returns:
+            True once a complete JSON value has been parsed (available as .value)
+        """
+        if self.done:
+            return True
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            char = text[self._pos]
+            self._pos += 1
+            if self._start is None:
+                if self._objects and not (char.isspace() or char in ",{"):
+                    return self.finish()  # Non-JSON tail after the objects
+                if char in _OPENERS:
+                    self._start = self._pos - 1
+                    self._closers = [_OPENERS[char]]
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _OPENERS:
+                self._closers.append(_OPENERS[char])
+            elif char in "}]":
+                if char != self._closers.pop():
+                    self._restart()
+                elif not self._closers and self._complete(text[self._start:self._pos]):
+                    return True
+        return False
+
+    def _complete(self, candidate: str) -> bool:
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            self._restart()
+            return False
+        self._start = None
+        if self._accept is not None and not self._accept(value):
+            # Valid JSON, but not what the caller wants: keep scanning after it
+            return self.finish() if self._objects else False
+        if self._objects or (self._collect is not None and self._collect(value)):
+            # May be the first of several objects: read on until a non-JSON tail
+            if not isinstance(value, dict):
+                return self.finish()
+            self._objects.append(value)
+            return False
+        self.value = value
+        self.done = True
+        return True
+
+    def finish(self) -> bool:
+        """Ends the scan at the end of the stream. Returns True if a value was parsed."""
+        if self._objects and not self.done:
+            self.value = self._objects[0] if len(self._objects) == 1 else self._objects
+            self.done = True
+        return self.done
+
+    def _restart(self):
+        """Abandons the current candidate and rescans from just after its opening bracket."""
+        self._pos = self._start + 1
+        self._start = None
+        self._closers = []
+        self._in_string = False
+        self._escape = False
+
+
+def _record(parser: JsonStreamParser, stopped_early: bool):
+    with _stats_lock:
+        _stats["streams"] += 1
+        _stats["early_stops"] += 1 if stopped_early else 0
+        _stats["no_json"] += 0 if parser.done else 1
+
+
+def stream_first_json(chunks: Iterable[str], accept: Optional[Callable[[Any], bool]] = None,
+                      collect: Optional[Callable[[Any], bool]] = None) -> Tuple[str, Any]:
+    """
+    Consumes a token stream until its first complete JSON value, then closes it.
+
+    Args:
+        chunks: Text chunks, e.g. llm.stream(prompt)
+        accept: Check a parsed value must pass to end the scan (default: any value)
+        collect: Check for values that may be followed by more objects (see module docstring)
+
+    Returns:
+        (text read so far, parsed value or None if the stream held no JSON)
+    """
+    parser = JsonStreamParser(accept, collect)
+    iterator = iter(chunks)
+    stopped_early = False
+    try:
+        for chunk in iterator:
+            if parser.feed(chunk):
+                stopped_early = True
+                break
+        else:
+            parser.finish()
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()  # Cancels the remaining generation
+    _record(parser, stopped_early)
+    return parser.text, parser.value
+
+
+async def astream_first_json(chunks: AsyncIterable[str], accept: Optional[Callable[[Any], bool]] = None,
+                             collect: Optional[Callable[[Any], bool]] = None) -> Tuple[str, Any]:
+    """Async variant of stream_first_json (e.g. for llm.astream(prompt))."""
+    parser = JsonStreamParser(accept, collect)
+    iterator = chunks.__aiter__()
+    stopped_early = False
+    try:
+        async for chunk in iterator:
+            if parser.feed(chunk):
+                stopped_early = True
+                break
+        else:
+            parser.finish()
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    _record(parser, stopped_early)
+    return parser.text, parser.value
+
+
+def get_json_stream_stats() -> Dict:
+    """Returns how many extraction streams were cut short once their JSON was complete."""
+    with _stats_lock:
+        streams = _stats["streams"]
+        return {**_stats, "early_stop_rate": _stats["early_stops"] / streams if streams else 0.0}
+
+
+register_stats("json_stream", get_json_stream_stats, "Streamed JSON extractions", gauges=("early_stop_rate",))
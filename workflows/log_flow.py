@@ -2,12 +2,17 @@
 LOG Workflow
 Extracts structured data from natural language and saves to user's log file.
 Example: "I sold 50 pounds of tomatoes for $75" → structured JSON entry
+A message listing several activities becomes several entries, saved in one transaction.
 """
 import json
 import re
 import datetime as dt
-from langchain_config import get_llm_instance
-from db_storage import write_log
+from typing import Dict, Iterator, List, Optional, Union
+from langchain_config import get_llm_instance, JSON_STOP_SEQUENCES
+from db_storage import write_logs, awrite_logs
+from workflows.log_parser import parse_activities
+from workflows.json_stream import stream_first_json, astream_first_json
+from metrics import instrumented
 
 def extract_json_from_llm_response(raw_response: str) -> dict:
     """
@@ -47,19 +52,67 @@ def extract_json_from_llm_response(raw_response: str) -> dict:
     raise ValueError("No valid JSON found in LLM response")
 
 
-def log_flow(text: str, user_id: str) -> str:
+def _activity_list(value) -> Optional[List[dict]]:
+    """Normalizes a parsed extraction (array, object, or {"activities": [...]}) to a list of dicts."""
+    if isinstance(value, dict):
+        value = value.get('activities', [value])
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return value
+    return None
+
+
+def _is_activity_list(value) -> bool:
+    """Stream check: ends the scan only on a value _activity_list accepts (not "[2]" in prose)."""
+    return _activity_list(value) is not None
+
+
+def _is_bare_activity(value) -> bool:
+    """Stream check: a bare object may be the first of several newline-separated activities."""
+    return isinstance(value, dict) and 'activities' not in value
+
+
+def extract_json_list_from_llm_response(raw_response: str) -> List[dict]:
     """
-    Extracts structured farm activity data from natural language input.
+    Extracts a list of JSON objects from an LLM response: a JSON array (bare or
+    in a markdown block), an object wrapping one under "activities", or every
+    standalone object in the text.
     
-    Args:
-        text: User's natural language description of farm activity
-        user_id: User identifier for data isolation
-        
-    Returns:
-        Confirmation message with logged activity details
+    Raises:
+        ValueError: If no valid JSON found in response
     """
-    # 1. Prompt LLM to extract structured fields from natural language
-    prompt_template = '''You are a data entry assistant. From the user's statement, extract the key details into a structured JSON object.
+    candidates = []
+    match = re.search(r'```(?:json)?\s*([\[{].*?[\]}])\s*```', raw_response, re.DOTALL)
+    if match:
+        candidates.append(match.group(1))
+    start, end = raw_response.find('['), raw_response.rfind(']')
+    if 0 <= start < end:
+        candidates.append(raw_response[start:end + 1])
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        activities = _activity_list(data)
+        if activities is not None:
+            return activities
+
+    objects = []
+    for match in re.finditer(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', raw_response, re.DOTALL):
+        try:
+            objects.append(json.loads(match.group(0)))
+        except json.JSONDecodeError:
+            pass
+    if len(objects) == 1 and isinstance(objects[0].get('activities'), list):
+        objects = objects[0]['activities']
+    if objects:
+        return objects
+    raise ValueError("No valid JSON found in LLM response")
+
+
+def _build_extraction_prompt(text: str) -> str:
+    """Builds the LLM prompt that extracts structured fields for each activity in the statement."""
+    prompt_template = '''You are a data entry assistant. From the user's statement, extract each farm activity into a structured JSON object. Statements may describe one activity or several.
 
 Required fields:
 - "action": What did the user do? Must be one of: 'sale', 'harvest', 'purchase', 'expense'
@@ -71,22 +124,82 @@ Optional fields:
 - "value_usd": The monetary value in USD, if mentioned.
 - "note": Any other relevant details from the statement.
 
+Example: "sold 30 lbs carrots for $45 and bought feed for $60" →
+[{{"action": "sale", "item": "carrots", "quantity": 30, "unit": "pounds", "value_usd": 45}}, {{"action": "purchase", "item": "feed", "value_usd": 60}}]
+
 User statement: {text}
 
-Return ONLY the JSON object, nothing else:'''
-    prompt = prompt_template.format(text=text)
+Return ONLY a JSON array with one object per activity, nothing else:'''
+    return prompt_template.format(text=text)
 
-    # 2. Invoke LLM and parse with robust extraction
-    llm = get_llm_instance()
+
+def _parse_llm_output(raw_json: str, value=None):
+    """
+    Parses the LLM extraction output.
+    
+    Args:
+        raw_json: Generated text
+        value: JSON value already parsed from the stream, if any
+    
+    Returns:
+        List of parsed dicts, or a user-facing error message string on failure
+    """
+    activities = _activity_list(value)
+    if activities is not None:
+        return activities
     try:
-        raw_json = llm.invoke(prompt)
-        data = extract_json_from_llm_response(raw_json)
+        return extract_json_list_from_llm_response(raw_json)
     except ValueError as e:
         return f"⚠️ Could not extract data from your statement. Please try being more specific.\n\nExample: 'I sold 50 lbs of tomatoes for $75'"
     except json.JSONDecodeError as e:
         return f"⚠️ Error parsing data. Please rephrase your activity.\n\nExample: 'Harvested 100 pounds of potatoes from west field'"
 
-    # 3. Validate required fields
+
+def _extract_with_llm(text: str):
+    """
+    Prompts the LLM to extract structured fields for every activity in the statement.
+    Generation is streamed and cancelled as soon as the JSON is complete.
+    
+    Returns:
+        List of parsed dicts, or a user-facing error message string on failure
+    """
+    llm = get_llm_instance()
+    raw, value = stream_first_json(llm.stream(_build_extraction_prompt(text), stop=JSON_STOP_SEQUENCES),
+                                   accept=_is_activity_list, collect=_is_bare_activity)
+    return _parse_llm_output(raw, value)
+
+
+async def _aextract_with_llm(text: str):
+    """Async variant of _extract_with_llm."""
+    llm = get_llm_instance()
+    raw, value = await astream_first_json(llm.astream(_build_extraction_prompt(text), stop=JSON_STOP_SEQUENCES),
+                                          accept=_is_activity_list, collect=_is_bare_activity)
+    return _parse_llm_output(raw, value)
+
+
+_FIELD_NAMES = ("action", "item", "quantity", "unit", "value_usd", "note")
+
+
+def _prefilled(fields: Union[Dict, List[Dict], None]) -> Optional[List[Dict]]:
+    """
+    Activities already extracted by the combined router, or None if they are
+    missing or incomplete (the normal extraction path then runs instead).
+    """
+    activities = [fields] if isinstance(fields, dict) else fields
+    if not activities or not isinstance(activities, list):
+        return None
+    if not all(isinstance(a, dict) and a.get("action") and a.get("item") for a in activities):
+        return None
+    return [{name: a[name] for name in _FIELD_NAMES if a.get(name) is not None} for a in activities]
+
+
+def _validate(data: dict):
+    """
+    Validates required fields, normalizes the action and stamps the entry.
+    
+    Returns:
+        User-facing error message, or None if the entry is ready to save
+    """
     if not data.get('action'):
         return f"⚠️ Please specify what you did (sale, harvest, purchase, or expense).\n\nExample: 'I sold 30 lbs of carrots for $50'"
     
@@ -96,30 +209,139 @@ Return ONLY the JSON object, nothing else:'''
     # Normalize action to lowercase for consistency
     data['action'] = data['action'].lower()
     
-    # 4. Add timestamp and persist to SQLite
+    # Add timestamp
     data['timestamp'] = dt.datetime.now(dt.UTC).isoformat()
+    return None
+
+
+def _validate_all(activities: List[Dict]):
+    """
+    Validates every activity (see _validate).
     
-    try:
-        write_log(data, user_id=user_id)
-    except Exception as e:
-        return f"⚠️ Database error: {str(e)}\n\nPlease try again or contact support."
+    Returns:
+        User-facing error message naming the failing activity, or None
+    """
+    for number, data in enumerate(activities, start=1):
+        if not isinstance(data, dict):
+            return f"⚠️ Could not extract data from your statement. Please try being more specific.\n\nExample: 'I sold 50 lbs of tomatoes for $75'"
+        error = _validate(data)
+        if error:
+            return error if len(activities) == 1 else f"Activity {number} of {len(activities)}: {error}"
+    return None
 
-    # 5. Return detailed confirmation
+
+def _save_error(results: List[Dict]) -> Optional[str]:
+    """User-facing message for a rejected batch (write_logs results), or None if all rows saved."""
+    failed = [r for r in results if not r['ok']]
+    if not failed:
+        return None
+    # Report the entry that caused the rejection, not the ones rejected with it
+    cause = next((r for r in failed if not r['error'].startswith("Batch rejected")), failed[0])
+    prefix = f"activity {cause['index'] + 1} of {len(results)}: " if len(results) > 1 else ""
+    return f"⚠️ Nothing was saved ({prefix}{cause['error']}).\n\nPlease rephrase your activity."
+
+
+def _describe(data: dict) -> str:
+    """One-line description of an entry: 'Sale of eggs (2 dozen) for $8.00'."""
     item = data.get('item', 'item')
     action = data.get('action', 'activity')
     quantity = data.get('quantity')
     unit = data.get('unit', '')
     value = data.get('value_usd')
     
-    # Build a nice confirmation message
-    confirmation = f"✅ Logged: {action.capitalize()} of {item}"
+    description = f"{action.capitalize()} of {item}"
     
     if quantity and unit:
-        confirmation += f" ({quantity} {unit})"
+        description += f" ({quantity} {unit})"
     elif quantity:
-        confirmation += f" ({quantity})"
+        description += f" ({quantity})"
     
     if value:
-        confirmation += f" for ${value:.2f}"
+        description += f" for ${value:.2f}"
+    
+    return description
+
+
+def _confirmation(activities: List[Dict]) -> str:
+    """Builds the detailed confirmation message for the saved entries."""
+    if len(activities) == 1:
+        return f"✅ Logged: {_describe(activities[0])}."
+    lines = [f"✅ Logged {len(activities)} activities:"]
+    lines.extend(f"- {_describe(data)}" for data in activities)
+    return "\n".join(lines)
+
+
+@instrumented("workflow")
+def log_flow(text: str, user_id: str, fields: Union[Dict, List[Dict], None] = None) -> str:
+    """
+    Extracts structured farm activity data from natural language input.
+    Formulaic statements are parsed locally; the LLM handles the rest.
+    A message with several activities is saved as several entries, all or nothing.
+    
+    Args:
+        text: User's natural language description of farm activity
+        user_id: User identifier for data isolation
+        fields: Activities already extracted by the combined router (skips extraction)
+        
+    Returns:
+        Confirmation message with logged activity details
+    """
+    # 1. Use pre-extracted fields, else try the deterministic parser
+    #    (no LLM round-trip for formulaic statements)
+    activities = _prefilled(fields) or parse_activities(text)
+    
+    # 2. Fall back to the LLM to extract every activity in one call
+    if activities is None:
+        activities = _extract_with_llm(text)
+        if isinstance(activities, str):
+            return activities  # Extraction failed: user-facing error message
+
+    # 3. Validate required fields
+    error = _validate_all(activities)
+    if error:
+        return error
+    
+    # 4. Persist to SQLite in one transaction (nothing is saved if any entry is invalid)
+    try:
+        results = write_logs(activities, user_id=user_id, all_or_nothing=True)
+    except Exception as e:
+        return f"⚠️ Database error: {str(e)}\n\nPlease try again or contact support."
+    error = _save_error(results)
+    if error:
+        return error
+
+    # 5. Return detailed confirmation
+    return _confirmation(activities)
+
+
+@instrumented("workflow")
+async def alog_flow(text: str, user_id: str, fields: Union[Dict, List[Dict], None] = None) -> str:
+    """Async variant of log_flow (uses llm.ainvoke and a thread-offloaded write)."""
+    activities = _prefilled(fields) or parse_activities(text)
+    if activities is None:
+        activities = await _aextract_with_llm(text)
+        if isinstance(activities, str):
+            return activities
+
+    error = _validate_all(activities)
+    if error:
+        return error
     
-    return confirmation + "."
+    try:
+        results = await awrite_logs(activities, user_id=user_id, all_or_nothing=True)
+    except Exception as e:
+        return f"⚠️ Database error: {str(e)}\n\nPlease try again or contact support."
+    error = _save_error(results)
+    if error:
+        return error
+
+    return _confirmation(activities)
+
+
+@instrumented("workflow")
+def log_flow_stream(text: str, user_id: str, fields: Union[Dict, List[Dict], None] = None) -> Iterator[str]:
+    """
+    Streaming variant of log_flow for a uniform workflow interface.
+    The extraction output isn't user-facing, so this yields the confirmation once.
+    """
+    yield log_flow(text, user_id=user_id, fields=fields)
@@ -0,0 +1,263 @@
+"""
+Rule-Based Activity Parser
+Deterministic extractor for formulaic LOG statements, used before the LLM.
+Example: "I sold 50 lbs of tomatoes for $75" →
+    {"action": "sale", "item": "tomatoes", "quantity": 50, "unit": "pounds", "value_usd": 75.0}
+
+Produces the same dict shape as the LLM extraction prompt. Returns None whenever
+the statement is ambiguous, so log_flow can fall back to the LLM.
+Messages listing several activities ("sold 30 lbs carrots for $45, bought feed
+for $60 and harvested 200 lbs potatoes") are split into clauses first.
+"""
+import re
+import threading
+from typing import Dict, List, Optional
+
+from metrics import register_stats
+
+# Verb (or noun) → canonical action
+_ACTION_WORDS = {
+    "sold": "sale", "sell": "sale", "sale of": "sale",
+    "harvested": "harvest", "harvest of": "harvest", "picked": "harvest",
+    "collected": "harvest", "gathered": "harvest",
+    "bought": "purchase", "purchased": "purchase", "purchase of": "purchase",
+    "spent": "expense", "paid": "expense", "expense for": "expense", "expense of": "expense",
+}
+_ACTION_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(w) for w in _ACTION_WORDS), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+
+# Plural/abbreviated unit → canonical unit
+_UNITS = {
+    "pounds": ["lb", "lbs", "pound", "pounds"],
+    "kilograms": ["kg", "kgs", "kilo", "kilos", "kilogram", "kilograms"],
+    "ounces": ["oz", "ounce", "ounces"],
+    "tons": ["ton", "tons", "tonne", "tonnes"],
+    "gallons": ["gal", "gals", "gallon", "gallons"],
+    "liters": ["liter", "liters", "litre", "litres"],
+    "dozen": ["dozen", "dozens", "doz"],
+    "bags": ["bag", "bags", "sack", "sacks"],
+    "boxes": ["box", "boxes"],
+    "crates": ["crate", "crates"],
+    "bushels": ["bu", "bushel", "bushels"],
+    "bales": ["bale", "bales"],
+    "heads": ["head", "heads"],
+    "bunches": ["bunch", "bunches"],
+    "cases": ["case", "cases"],
+    "flats": ["flat", "flats"],
+    "pints": ["pt", "pint", "pints"],
+    "quarts": ["qt", "quart", "quarts"],
+    "trays": ["tray", "trays"],
+    "buckets": ["bucket", "buckets"],
+    "acres": ["acre", "acres"],
+}
+_UNIT_ALIASES = {alias: unit for unit, aliases in _UNITS.items() for alias in aliases}
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "twenty": 20, "fifty": 50, "hundred": 100,
+}
+
+# Phrasal uses of harvest verbs ("picked up feed", "collected payment from Joe") aren't harvests
+_PHRASAL_PATTERN = re.compile(
+    r"\b(picked|collected|gathered)\s+(up|off|out|back|on|from|payment|payments|money|cash|rent|a check)\b",
+    re.IGNORECASE)
+
+# Fractional amounts ("half a dozen", "1/2 bushel") are left to the LLM
+_FRACTION_PATTERN = re.compile(r"\b(?:half|quarter|quarters|third|thirds)\b|\d\s*/\s*\d|[½¼¾⅓⅔]", re.IGNORECASE)
+
+_MONEY_PATTERN = re.compile(
+    r"(?:\b(?:for|at|of|costing|cost)\s+)?"
+    r"(?:\$\s?(\d[\d,]*(?:\.\d+)?)|\b(\d[\d,]*(?:\.\d+)?)\s*(?:dollars|bucks|usd)\b)",
+    re.IGNORECASE,
+)
+# A price per unit after the amount ("$3 each", "$2 per lb", "$2/lb", "$2 a pound"): not a total
+_UNIT_PRICE_PATTERN = re.compile(
+    r"^\s*(?:each\b|apiece\b|per\b|/|an?\s+(?:" + "|".join(_UNIT_ALIASES) + r")\b)",
+    re.IGNORECASE,
+)
+_QUANTITY_PATTERN = re.compile(
+    r"^(\d[\d,]*(?:\.\d+)?|" + "|".join(_NUMBER_WORDS) + r")\s+(?:([a-z]+)\.?\s+)?(?:of\s+)?",
+    re.IGNORECASE,
+)
+
+# Words that end the item noun phrase
+_STOP_WORDS = {
+    "for", "to", "at", "from", "on", "in", "with", "today", "yesterday", "tonight",
+    "this", "last", "and", "but", "because", "which", "that", "per", "each", "it",
+}
+_LEADING_FILLER = {"on", "for", "of", "some", "the", "a", "an", "my", "our", "new", "more"}
+_NOTE_PREPOSITIONS = {"to", "at", "from", "in", "with"}
+_MAX_ITEM_WORDS = 4
+
+# Text before an activity verb that starts a new clause: ", then I", "; and we also", " and "
+_CLAUSE_BREAK = re.compile(r"(?:[,;]|\band\b|\bthen\b)(?:\s+(?:and|then|also|i|we))*\s*$", re.IGNORECASE)
+
+# Counters: statements parsed locally vs. handed to the LLM
+_stats_lock = threading.Lock()
+_stats = {"parsed": 0, "fallback": 0}
+
+
+def _to_number(raw: str) -> float:
+    raw = raw.lower().replace(",", "")
+    value = _NUMBER_WORDS[raw] if raw in _NUMBER_WORDS else float(raw)
+    return int(value) if float(value).is_integer() else value
+
+
+def _record(parsed: bool):
+    with _stats_lock:
+        _stats["parsed" if parsed else "fallback"] += 1
+
+
+def get_parser_stats() -> Dict:
+    """Returns how many LOG statements were parsed locally vs. sent to the LLM."""
+    with _stats_lock:
+        total = _stats["parsed"] + _stats["fallback"]
+        return {**_stats, "local_rate": _stats["parsed"] / total if total else 0.0}
+
+
+register_stats("parser", get_parser_stats, "LOG statements parsed locally vs. sent to the LLM", gauges=("local_rate",))
+
+
+def parse_activity(text: str) -> Optional[Dict]:
+    """
+    Parses a single farm activity statement without the LLM.
+
+    Args:
+        text: User's natural language description of farm activity
+
+    Returns:
+        Dict with action, item and any of quantity/unit/value_usd/note,
+        or None if the statement doesn't match a confident pattern
+    """
+    result = _parse(text)
+    _record(result is not None)
+    return result
+
+
+def split_activities(text: str) -> List[str]:
+    """
+    Splits a message into one clause per activity verb, at commas, semicolons,
+    "and" or "then" before each verb. Returns [text] when there is one verb or
+    a verb isn't preceded by a clause break.
+    """
+    verbs = list(_ACTION_PATTERN.finditer(text))
+    if len(verbs) < 2:
+        return [text]
+    clauses = []
+    start = 0
+    for verb in verbs[1:]:
+        head = text[start:verb.start()]
+        match = _CLAUSE_BREAK.search(head)
+        if not match:
+            return [text]
+        clauses.append(head[:match.start()].strip())
+        start = verb.start()
+    clauses.append(text[start:].strip())
+    return clauses
+
+
+def parse_activities(text: str) -> Optional[List[Dict]]:
+    """
+    Parses a message that may list several activities without the LLM.
+
+    Returns:
+        One dict per activity (see parse_activity), or None if any clause
+        doesn't match a confident pattern
+    """
+    if "?" in text or re.search(r"\b(not|didn't|didnt|never|haven't|won't)\b", text, re.IGNORECASE):
+        _record(False)
+        return None
+    results = [_parse(clause) for clause in split_activities(text)]
+    parsed = all(result is not None for result in results)
+    _record(parsed)
+    return results if parsed else None
+
+
+def _parse(text: str) -> Optional[Dict]:
+    if "?" in text or re.search(r"\b(not|didn't|didnt|never|haven't|won't)\b", text, re.IGNORECASE):
+        return None
+    if _FRACTION_PATTERN.search(text):
+        return None
+    if _PHRASAL_PATTERN.search(text):
+        return None
+
+    # 1. Exactly one activity verb
+    actions = _ACTION_PATTERN.findall(text)
+    if len({_ACTION_WORDS[a.lower()] for a in actions}) != 1 or len(actions) > 1:
+        return None
+    verb = _ACTION_PATTERN.search(text)
+    data = {"action": _ACTION_WORDS[verb.group(1).lower()]}
+
+    # 2. At most one dollar amount
+    money = list(_MONEY_PATTERN.finditer(text))
+    if len(money) > 1:
+        return None
+    remaining = text[verb.end():]
+    if money and _UNIT_PRICE_PATTERN.match(text[money[0].end():]):
+        return None  # Unit price: the total needs arithmetic the LLM can do from context
+    if money:
+        data["value_usd"] = float((money[0].group(1) or money[0].group(2)).replace(",", ""))
+        if money[0].start() >= verb.end():
+            start, end = money[0].start() - verb.end(), money[0].end() - verb.end()
+            remaining = remaining[:start] + " " + remaining[end:]
+
+    # 3. Quantity and unit ("50 lbs of", "2 dozen", "a bag of")
+    remaining = remaining.strip()
+    words = remaining.split()
+    while words and words[0].lower() in ("on", "for", "some"):
+        words.pop(0)
+    remaining = " ".join(words)
+
+    match = _QUANTITY_PATTERN.match(remaining)
+    if match:
+        number, unit_word = match.group(1).lower(), (match.group(2) or "").lower()
+        unit = _UNIT_ALIASES.get(unit_word)
+        if unit:
+            data["quantity"] = _to_number(number)
+            data["unit"] = unit
+            remaining = remaining[match.end():]
+        elif number not in ("a", "an"):
+            # Number without a recognized unit: "sold 24 eggs"
+            data["quantity"] = _to_number(number)
+            remaining = remaining[len(match.group(1)):]
+
+    # 4. Item noun phrase: words up to the first stop word or punctuation
+    tokens = re.findall(r"[A-Za-z0-9][A-Za-z0-9'\-]*|[,.;!]", remaining)
+    item_words = []
+    index = 0
+    while index < len(tokens) and tokens[index].lower() in _LEADING_FILLER:
+        index += 1
+    while index < len(tokens):
+        token = tokens[index]
+        if token.lower() == "and" and item_words:
+            return None  # "feed and hay": compound items are left to the LLM
+        if token in ",.;!" or token.lower() in _STOP_WORDS:
+            break
+        item_words.append(token.lower())
+        index += 1
+
+    if not item_words or len(item_words) > _MAX_ITEM_WORDS:
+        return None
+    if item_words[0] in ("it", "them", "that", "this", "stuff", "things"):
+        return None
+    if any(word in _UNIT_ALIASES for word in item_words):
+        return None  # "sold 5 lbs for $10": a unit where the item should be
+    data["item"] = " ".join(item_words)
+
+    # 5. Trailing details ("from the west field", "to the local restaurant") become the note
+    tail = tokens[index:]
+    if tail and tail[0].lower() in _NOTE_PREPOSITIONS:
+        note_words = []
+        for token in tail:
+            if token in ",.;!" or token.lower() in ("today", "yesterday", "tonight"):
+                break
+            note_words.append(token)
+        if len(note_words) > 1:
+            data["note"] = " ".join(note_words)
+
+    # Same key order as the LLM extraction prompt
+    fields = ("action", "item", "quantity", "unit", "value_usd", "note")
+    return {field: data[field] for field in fields if field in data}
@@ -4,57 +4,66 @@ Answers questions about logged data using RAG (Retrieval-Augmented Generation).
 Retrieves user's logs and provides them as context to LLM for accurate answers.
 Uses SQLite for efficient data retrieval and pre-computed aggregations.
 """
-import json
+import asyncio
+from typing import Dict, Iterator, Optional, Tuple
 from langchain_config import get_llm_instance
-from db_storage import read_logs, get_summary_stats, get_item_summary
+from result_cache import lookup, store
+from db_storage import get_summary_stats, get_item_summary
+from workflows.query_planner import answer_query
+from workflows.context_builder import build_context, estimate_tokens
+from workflows.date_parser import parse_date_range, strip_date
+from workflows.retrieval import retrieve_logs
+from metrics import instrumented
 
-def query_flow(text: str, user_id: str) -> str:
+def _prepare(text: str, user_id: str, context: Optional[Dict] = None) -> Tuple[Optional[str], Optional[str]]:
     """
-    Answers questions about user's farm data using RAG pattern.
+    Answers directly when possible, otherwise builds the RAG prompt.
+    Uses a prefetched context (see prefetch.py) instead of reading the DB when given.
     
-    Args:
-        text: User's question about their logged data
-        user_id: User identifier for data retrieval
-        
     Returns:
-        Answer based on user's actual logged data
+        (answer, None) for direct answers, or (None, prompt) when the LLM is needed
     """
-    # 1. Retrieve user's logs (most recent 100 entries)
-    logs = read_logs(user_id=user_id, limit=100)
-    if not logs:
-        return "👋 You don't have any logged data yet. Try logging an activity first!\n\nExample: 'I sold 50 lbs of tomatoes for $75'"
-
-    # 2. Get pre-computed statistics for accurate aggregations
-    stats = get_summary_stats(user_id)
-    item_summary = get_item_summary(user_id)
-    
-    # 3. Create enhanced RAG prompt with both raw logs and computed stats
-    logs_json_string = json.dumps(logs[:20], indent=2)  # Show recent 20 for context
-    
-    # Format statistics nicely
-    stats_summary = f"""
-SUMMARY STATISTICS:
-- Total Sales Revenue: ${stats['total_sales']:.2f}
-- Total Expenses: ${stats['total_expenses']:.2f}
-- Total Log Entries: {stats['total_entries']}
+    # 1. Check the user has data (O(1) rollup read)
+    stats = context['stats'] if context else get_summary_stats(user_id)
+    if not stats['total_entries']:
+        return "👋 You don't have any logged data yet. Try logging an activity first!\n\nExample: 'I sold 50 lbs of tomatoes for $75'", None
 
-Breakdown by Action:
-{json.dumps(stats['by_action'], indent=2)}
+    # 2. Answer common aggregate questions (totals, counts, max/min) directly from SQL
+    answer = answer_query(text, user_id)
+    if answer is not None:
+        return answer, None
 
-Top Items:
-{json.dumps([{"item": r[0], "action": r[1], "count": r[2], "total_value": r[4]} for r in item_summary[:10]], indent=2)}
-"""
+    # 3. Open-ended question: retrieve the logs relevant to it (plus a few recent ones)
+    #    and item aggregations, limited in SQL to the question's time window (if any)
+    window = parse_date_range(text)
+    start, end = (window['start'], window['end']) if window else (None, None)
+    if window:
+        stats = get_summary_stats(user_id, start, end)
+        item_summary = get_item_summary(user_id, start=start, end=end)
+    elif context:
+        item_summary = context['item_summary']
+    else:
+        item_summary = get_item_summary(user_id)
+    recent_logs = context['logs'] if context and not window else None
+    logs = retrieve_logs(user_id, strip_date(text, window), recent_logs, start=start, end=end)
     
+    # 4. Create enhanced RAG prompt with compact stats and the selected logs
     prompt_template = """You are a helpful farm assistant. Answer the user's question based *only* on the provided data.
 
 You have access to:
 1. Pre-computed statistics (use these for totals, sums, counts - they are accurate!)
-2. Recent activity logs (for specific details and context)
+2. Activity logs relevant to the question, plus the most recent ones (for specific details and context)
+
+DATA PERIOD: {period}
+
+SUMMARY STATISTICS:
+{stats}
 
-{stats_summary}
+TOP ITEMS:
+{items}
 
-RECENT ACTIVITY LOGS (last 20 entries):
-{logs_json_string}
+ACTIVITY LOGS (most relevant to the question first, then most recent):
+{logs}
 
 INSTRUCTIONS:
 - Use the pre-computed statistics for any calculations (they're accurate SQL aggregations)
@@ -66,15 +75,84 @@ USER'S QUESTION: {question}
 
 ANSWER:"""
     
+    data = build_context(stats, item_summary, logs, model_type="small", item_limit=10, max_rows=20,
+                         reserved_tokens=estimate_tokens(prompt_template) + estimate_tokens(text))
     prompt = prompt_template.format(
-        stats_summary=stats_summary,
-        logs_json_string=logs_json_string,
+        period=window['label'] if window else "all time",
+        stats=data['stats'],
+        items=data['items'],
+        logs=data['logs'],
         question=text
     )
 
-    # 4. Get answer from LLM
+    return None, prompt
+
+
+@instrumented("workflow")
+def query_flow(text: str, user_id: str, context: Optional[Dict] = None) -> str:
+    """
+    Answers questions about user's farm data.
+    Common aggregate questions are answered from SQL; the rest use the RAG pattern.
+    LLM answers are cached until the user's data changes (see result_cache.py).
+    
+    Args:
+        text: User's question about their logged data
+        user_id: User identifier for data retrieval
+        context: Optional prefetched data (logs, stats, item_summary)
+        
+    Returns:
+        Answer based on user's actual logged data
+    """
+    key, version, cached = lookup(user_id, "QUERY", "small", text, context and context.get('data_version'))
+    if cached is not None:
+        return cached
+
+    answer, prompt = _prepare(text, user_id, context)
+    if answer is not None:
+        return answer
+
+    # Get answer from LLM
     llm = get_llm_instance("small")  # Use fast model for queries
     answer = llm.invoke(prompt)
+    store(key, user_id, version, answer)
     return answer
 
 
+@instrumented("workflow")
+def query_flow_stream(text: str, user_id: str, context: Optional[Dict] = None) -> Iterator[str]:
+    """Streaming variant of query_flow: yields answer tokens as they arrive."""
+    key, version, cached = lookup(user_id, "QUERY", "small", text, context and context.get('data_version'))
+    if cached is not None:
+        yield cached
+        return
+
+    answer, prompt = _prepare(text, user_id, context)
+    if answer is not None:
+        yield answer
+        return
+    llm = get_llm_instance("small")
+    chunks = []
+    for chunk in llm.stream(prompt):
+        chunks.append(chunk)
+        yield chunk
+    store(key, user_id, version, "".join(chunks))  # Only reached if the stream completed
+
+
+@instrumented("workflow")
+async def aquery_flow(text: str, user_id: str, context: Optional[Dict] = None) -> str:
+    """
+    Async variant of query_flow.
+    Data retrieval runs in a worker thread (one hop for all reads); the LLM call uses ainvoke.
+    """
+    key, version, cached = await asyncio.to_thread(
+        lookup, user_id, "QUERY", "small", text, context and context.get('data_version'))
+    if cached is not None:
+        return cached
+
+    answer, prompt = await asyncio.to_thread(_prepare, text, user_id, context)
+    if answer is not None:
+        return answer
+    llm = get_llm_instance("small")
+    answer = await llm.ainvoke(prompt)
+    await asyncio.to_thread(store, key, user_id, version, answer)
+    return answer
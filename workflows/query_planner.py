@@ -0,0 +1,292 @@
+"""
+Structured Query Planner
+Answers common aggregate questions directly from SQL, without the LLM.
+Example: "how many pounds of tomatoes did I sell last month?" →
+    plan {metric: quantity, actions: [sale], item: tomato, window: last month} →
+    aggregate_logs(...) → "🌾 You sold 80 pounds of tomatoes last month (3 entries)."
+
+Supported shapes: totals (sales, expenses, net income), counts, largest/smallest
+entries, and per-item sums, each with an optional time window. Anything else
+returns None so query_flow can fall back to the LLM.
+"""
+import re
+import threading
+import datetime as dt
+from typing import Dict, List, Optional
+
+from db_storage import aggregate_logs, find_extreme_log, get_summary_stats
+from workflows.date_parser import parse_date_range, has_unparsed_date, strip_date
+from metrics import register_stats
+
+EXPENSE_ACTIONS = ["expense", "purchase"]
+
+_VERB_ACTIONS = {
+    "sell": ["sale"], "sold": ["sale"], "sale": ["sale"], "sales": ["sale"],
+    "earn": ["sale"], "earned": ["sale"], "make": ["sale"], "made": ["sale"],
+    "revenue": ["sale"], "income": ["sale"], "earnings": ["sale"],
+    "harvest": ["harvest"], "harvested": ["harvest"], "harvests": ["harvest"],
+    "collect": ["harvest"], "collected": ["harvest"], "pick": ["harvest"], "picked": ["harvest"],
+    "buy": ["purchase"], "bought": ["purchase"], "purchase": ["purchase"], "purchases": ["purchase"],
+    "purchased": ["purchase"],
+    "spend": EXPENSE_ACTIONS, "spent": EXPENSE_ACTIONS, "expense": EXPENSE_ACTIONS,
+    "expenses": EXPENSE_ACTIONS, "cost": EXPENSE_ACTIONS, "costs": EXPENSE_ACTIONS,
+}
+_ACTION_LABELS = {"sale": "sale", "harvest": "harvest", "purchase": "purchase", "expense": "expense"}
+_PAST_TENSE = {"sale": "sold", "harvest": "harvested", "purchase": "bought", "expense": "spent"}
+
+_UNIT_WORDS = r"(pounds?|lbs?|kilograms?|kgs?|dozens?|bags?|gallons?|bushels?|boxes|crates?|heads?|bunches|tons?)"
+
+# Words that end an item phrase in a question
+_ITEM_STOP = {
+    "did", "do", "have", "i", "we", "in", "this", "last", "today", "yesterday", "since",
+    "during", "for", "over", "total", "so", "far", "all", "time", "ever", "altogether", "between",
+    "overall", "on", "at", "to", "from", "past", "the", "year", "month", "week",
+} | set(_VERB_ACTIONS)
+_ITEM_FILLER = {"my", "the", "any", "all", "of", "some", "our"}
+# Words between "how much" and the verb that don't name an item ("how much money did i make")
+_VALUE_FILLER = {"money", "cash", "dollars", "in", "altogether"}
+# Verbs that end the phrase after "how much" ("how much fertilizer was bought")
+_VALUE_STOP = {"was", "were", "is", "are", "has", "does"}
+# Other words a count question may contain without naming anything to filter on
+_COUNT_FILLER = {"how", "many", "times", "entries", "logs", "activities", "record", "recorded", "log", "logged"}
+
+# Questions that need the LLM (open-ended or about details SQL can't summarize)
+_OPEN_ENDED = re.compile(r"^\s*(who|where|why|which|was|were|what did|tell me about|describe|explain)\b|\bcash\b|\bcustomer\b", re.IGNORECASE)
+
+# Counters: questions answered from SQL vs. sent to the LLM
+_stats_lock = threading.Lock()
+_stats = {"sql": 0, "llm": 0}
+
+
+def get_planner_stats() -> Dict:
+    """Returns how many QUERY requests were answered from SQL vs. the LLM."""
+    with _stats_lock:
+        total = _stats["sql"] + _stats["llm"]
+        return {**_stats, "sql_rate": _stats["sql"] / total if total else 0.0}
+
+
+register_stats("planner", get_planner_stats, "QUERY requests answered from SQL vs. the LLM", gauges=("sql_rate",))
+
+
+# === Planning ===
+
+def _extract_item(text: str, after: str) -> Optional[str]:
+    """Returns the item phrase following `after` (e.g. 'from', 'of', 'on')."""
+    match = re.search(rf"\b{after}\s+(.+)", text, re.IGNORECASE)
+    if not match:
+        return None
+    words = []
+    for word in re.findall(r"[a-z][a-z'\-]*|[?.,!]", match.group(1).lower()):
+        if not words and word in _ITEM_FILLER:
+            continue
+        if word in _ITEM_STOP or word in "?.,!":
+            break
+        words.append(word)
+    if not words or len(words) > 3:
+        return None
+    return " ".join(words)
+
+
+def _value_head(text: str) -> Optional[str]:
+    """
+    Returns the item named between "how much" and the verb ("how much fertilizer did i
+    buy" → 'fertilizer'), '' if there is none, or None if the phrase can't be read.
+    """
+    match = re.search(r"\bhow much\s+(.*)", text)
+    if not match:
+        return ""
+    words = []
+    for word in re.findall(r"[a-z][a-z'\-]*|[?.,!]", match.group(1)):
+        if word in _ITEM_STOP or word in _VALUE_STOP or word in "?.,!":
+            break
+        if word not in _ITEM_FILLER and word not in _VALUE_FILLER:
+            words.append(word)
+    if len(words) > 3:
+        return None
+    return " ".join(words)
+
+
+def _item_stem(item: str) -> str:
+    """Singularizes the last word so 'tomatoes' also matches 'tomato'."""
+    for suffix in ("oes", "es", "s"):
+        if item.endswith(suffix) and len(item) > len(suffix) + 2:
+            return item[: -len(suffix)] if suffix != "oes" else item[:-2]
+    return item
+
+
+def actions_in(text: str) -> Optional[List[str]]:
+    """Returns the actions named by the first action verb in text ('sold' → ['sale']), or None."""
+    for word in re.findall(r"[a-z]+", text.lower()):
+        if word in _VERB_ACTIONS:
+            return _VERB_ACTIONS[word]
+    return None
+
+
+def plan_query(text: str, now: Optional[dt.datetime] = None) -> Optional[Dict]:
+    """
+    Maps a question to a structured plan, or None if it isn't a supported shape.
+
+    Returns:
+        Dict with metric ('value', 'quantity', 'count', 'exists', 'max', 'min', 'net'),
+        actions, item, start, end and window label
+    """
+    lowered = text.lower().strip()
+    if _OPEN_ENDED.search(lowered):
+        return None
+
+    # Resolve the time window, then drop it so dates aren't read as items
+    window = parse_date_range(lowered, now)
+    if has_unparsed_date(lowered, window):
+        return None
+    lowered = strip_date(lowered, window)
+
+    plan = {
+        "actions": actions_in(lowered), "item": None,
+        "start": window["start"] if window else None,
+        "end": window["end"] if window else None,
+        "window": window["label"] if window else "",
+    }
+
+    if re.search(r"\b(net income|net profit|profit|net)\b", lowered) and not re.search(r"\bloss\b", lowered):
+        if _extract_item(lowered, "(?:from|on|for)"):
+            return None  # Net is farm-wide; "profit from tomatoes" needs per-item costs
+        plan["metric"] = "net"
+        return plan
+
+    if re.search(r"\b(biggest|largest|highest|most expensive|best)\b", lowered):
+        plan["metric"] = "max"
+    elif re.search(r"\b(smallest|lowest|cheapest|least)\b", lowered):
+        plan["metric"] = "min"
+    elif re.search(r"^\s*(did|have) (i|we)\b.*\bany\b", lowered):
+        plan["metric"] = "exists"
+        plan["item"] = _extract_item(lowered, "any")
+    elif re.search(rf"\bhow many {_UNIT_WORDS}\b|\b(number|amount) of\b(?!.*\b(sales|entries|times)\b)", lowered):
+        plan["metric"] = "quantity"
+        plan["item"] = _extract_item(lowered, "of")
+    elif re.search(r"\bhow many (times|sales|harvests|purchases|expenses|entries|logs|activities)\b", lowered):
+        plan["metric"] = "count"
+        # "how many harvests of tomatoes" / "how many times did i harvest tomatoes"
+        plan["item"] = _extract_item(lowered, "of") or _extract_item(lowered, r"(?:i|we)\s+[a-z]+")
+        known = _ITEM_STOP | _ITEM_FILLER | _COUNT_FILLER | set((plan["item"] or "").split())
+        if any(word not in known for word in re.findall(r"[a-z][a-z'\-]*", lowered)):
+            return None  # names something we can't filter on ("did i go to the market")
+    elif re.search(r"\bhow many\b", lowered):
+        # "how many eggs did i collect" → quantity of the noun after "how many"
+        plan["metric"] = "quantity"
+        plan["item"] = _extract_item(lowered, "how many")
+    elif re.search(r"\b(how much|total|sum)\b", lowered):
+        plan["metric"] = "value"
+        plan["item"] = _extract_item(lowered, "(?:from|on|for)")
+        # "how much fertilizer did i buy" → item between "how much" and the verb
+        head = _value_head(lowered)
+        if head is None or (head and plan["item"] and head != plan["item"]):
+            return None
+        plan["item"] = plan["item"] or head or None
+    else:
+        return None
+
+    if plan["metric"] in ("value", "max", "min", "exists", "quantity", "count") and not plan["actions"]:
+        if plan["metric"] in ("value", "max", "min", "quantity"):
+            return None  # "how much"/"how many cows do i have" without an action verb is ambiguous
+        plan["actions"] = None
+    if plan["metric"] in ("quantity", "exists") and not plan["item"]:
+        return None
+    return plan
+
+
+# === Execution and rendering ===
+
+def _money(value: float) -> str:
+    return f"-${-value:,.2f}" if value < 0 else f"${value:,.2f}"
+
+
+def _quantities(quantities: Dict, item: str) -> str:
+    """Formats per-unit totals: '80 pounds of tomatoes and 42 tomatoes'."""
+    parts = [f"{q:g} {unit} of {item}" if unit else f"{q:g} {item}" for unit, q in quantities.items()]
+    return " and ".join(parts)
+
+
+def _suffix(plan: Dict) -> str:
+    parts = []
+    if plan.get("item"):
+        parts.append(f" of {plan['item']}")
+    if plan.get("window"):
+        parts.append(f" {plan['window']}")
+    return "".join(parts)
+
+
+def _entries(count: int) -> str:
+    return f"{count} entr{'y' if count == 1 else 'ies'}"
+
+
+def execute_plan(plan: Dict, user_id: str) -> str:
+    """Runs the plan against the user's data and renders a templated answer."""
+    actions, start, end = plan["actions"], plan["start"], plan["end"]
+    item = _item_stem(plan["item"]) if plan.get("item") else None
+    window = f" {plan['window']}" if plan["window"] else ""
+
+    if plan["metric"] == "net":
+        if start or end:
+            sales = aggregate_logs(user_id, ["sale"], start=start, end=end)["total_value"]
+            expenses = aggregate_logs(user_id, EXPENSE_ACTIONS, start=start, end=end)["total_value"]
+        else:
+            stats = get_summary_stats(user_id)  # all-time: read from rollups
+            sales, expenses = stats["total_sales"], stats["total_expenses"]
+        return (f"📊 Your net income{window} is {_money(sales - expenses)} "
+                f"(sales {_money(sales)} − expenses {_money(expenses)}).")
+
+    if plan["metric"] in ("max", "min"):
+        row = find_extreme_log(user_id, plan["metric"] == "max", actions, item, start, end)
+        label = "expense" if actions == EXPENSE_ACTIONS else _ACTION_LABELS[actions[0]]
+        if row is None:
+            return f"I don't see any {label} entries with a dollar value{_suffix(plan)}."
+        size = "biggest" if plan["metric"] == "max" else "smallest"
+        detail = f"{row['quantity']:g} {row['unit'] or ''} ".replace("  ", " ") if row.get("quantity") else ""
+        return (f"📈 Your {size} {label}{window} was {_money(row['value_usd'])}: "
+                f"{detail}{row['item']} on {row['timestamp'][:10]}.")
+
+    result = aggregate_logs(user_id, actions, item, start, end)
+    count = result["count"]
+
+    if plan["metric"] == "exists":
+        verb = _PAST_TENSE[actions[0]] if actions else "logged"
+        if count == 0:
+            return f"No, I don't see any {plan['item']} {verb}{window}."
+        value = f", totaling {_money(result['total_value'])}" if result["total_value"] else ""
+        return f"Yes, you {verb} {plan['item']} {count} time{'s' if count != 1 else ''}{window}{value}."
+
+    if plan["metric"] == "count":
+        label = f"{_ACTION_LABELS[actions[0]]} " if actions and actions != EXPENSE_ACTIONS else ("expense " if actions else "")
+        return f"📝 You have {_entries(count).replace('entr', label + 'entr')}{_suffix(plan)}."
+
+    if plan["metric"] == "quantity":
+        verb = _PAST_TENSE[actions[0]] if actions else "logged"
+        if not result["quantities"]:
+            return f"I don't see any quantities of {plan['item']} {verb}{window}."
+        return f"🌾 You {verb} {_quantities(result['quantities'], plan['item'])}{window} ({_entries(count)})."
+
+    # metric == "value"
+    if actions == EXPENSE_ACTIONS or actions == ["purchase"]:
+        target = f" on {plan['item']}" if plan.get("item") else ""
+        return f"💸 You spent {_money(result['total_value'])}{target}{window} across {_entries(count)}."
+    if actions == ["sale"]:
+        source = f" from {plan['item']}" if plan.get("item") else ""
+        return f"💰 Your total sales{source}{window} come to {_money(result['total_value'])} across {_entries(count)}."
+    return f"Total value{_suffix(plan)}: {_money(result['total_value'])} across {_entries(count)}."
+
+
+def answer_query(text: str, user_id: str, now: Optional[dt.datetime] = None) -> Optional[str]:
+    """
+    Answers the question from SQL if it matches a supported shape.
+
+    Returns:
+        Templated answer, or None if the LLM should handle the question
+    """
+    plan = plan_query(text, now)
+    if plan is None:
+        with _stats_lock:
+            _stats["llm"] += 1
+        return None
+    with _stats_lock:
+        _stats["sql"] += 1
+    return execute_plan(plan, user_id)
@@ -4,61 +4,60 @@ Generates summaries and analytical reports from logged data.
 Uses RAG pattern to analyze all user logs and create formatted reports.
 Uses granite-13b-chat-v2 for detailed, well-formatted reports.
 """
-import json
+import asyncio
+from typing import Dict, Iterator, Optional, Tuple
 from langchain_config import get_llm_instance
+from result_cache import lookup, store
 from db_storage import read_logs, get_summary_stats, get_item_summary
+from workflows.context_builder import build_context, estimate_tokens
+from workflows.date_parser import parse_date_range
+from metrics import instrumented
 
-def report_flow(text: str, user_id: str) -> str:
+def _prepare(text: str, user_id: str, context: Optional[Dict] = None) -> Tuple[Optional[str], Optional[str]]:
     """
-    Generates formatted reports from user's farm data.
-    Uses granite-13b-chat-v2 for detailed, comprehensive reports.
+    Builds the report prompt from the user's data.
+    Uses a prefetched context (see prefetch.py) instead of reading the DB when given.
     
-    Args:
-        text: User's report request (e.g., "sales report for this month")
-        user_id: User identifier for data retrieval
-        
     Returns:
-        Formatted report with sections, totals, and summaries
+        (message, None) if there is no data to report on, otherwise (None, prompt)
     """
-    # 1. Retrieve user's logs
-    logs = read_logs(user_id=user_id, limit=200)  # Get more logs for comprehensive reports
+    # 1. Retrieve user's logs, limited in SQL to the requested period (if any)
+    window = parse_date_range(text)
+    if window:
+        start, end = window['start'], window['end']
+        logs = read_logs(user_id=user_id, limit=200, start=start, end=end)
+    elif context:
+        logs = context['logs'][:200]
+    else:
+        logs = read_logs(user_id=user_id, limit=200)  # Get more logs for comprehensive reports
     if not logs:
-        return "👋 You don't have any logged data yet. Try logging some activities first!\n\nExample: 'I sold 50 lbs of tomatoes for $75'"
+        if window and (context['stats'] if context else get_summary_stats(user_id))['total_entries']:
+            return f"📭 No activity logged {window['label']}. Try a different period.", None
+        return "👋 You don't have any logged data yet. Try logging some activities first!\n\nExample: 'I sold 50 lbs of tomatoes for $75'", None
 
-    # 2. Get pre-computed statistics and aggregations
-    stats = get_summary_stats(user_id)
-    item_summary = get_item_summary(user_id)
-    
-    # 3. Create enhanced RAG prompt with structured data
-    logs_json_string = json.dumps(logs, indent=2)
-    
-    # Format item summary for better readability
-    item_breakdown = []
-    for row in item_summary:
-        item_breakdown.append({
-            "item": row[0],
-            "action": row[1],
-            "count": row[2],
-            "total_quantity": row[3],
-            "total_value_usd": row[4]
-        })
+    # 2. Get pre-computed statistics and aggregations (for the same period)
+    if window:
+        stats = get_summary_stats(user_id, start, end)
+        item_summary = get_item_summary(user_id, start=start, end=end)
+    elif context:
+        stats, item_summary = context['stats'], context['item_summary']
+    else:
+        stats = get_summary_stats(user_id)
+        item_summary = get_item_summary(user_id)
     
+    # 3. Create enhanced RAG prompt with compact, token-budgeted data
     prompt_template = """You are a professional farm business analyst. Generate a comprehensive, well-formatted report based on the user's request using the provided farm data.
 
-SUMMARY STATISTICS:
-- Total Sales Revenue: ${total_sales:.2f}
-- Total Expenses: ${total_expenses:.2f}
-- Net Income: ${net_income:.2f}
-- Total Activities Logged: {total_entries}
+REPORT PERIOD: {period}
 
-ACTION BREAKDOWN:
-{action_breakdown}
+SUMMARY STATISTICS:
+{stats}
 
 ITEM-LEVEL BREAKDOWN:
-{item_breakdown}
+{items}
 
-ALL ACTIVITY LOGS:
-{logs_json_string}
+ACTIVITY LOGS (most recent first, older entries summarized):
+{logs}
 
 USER'S REPORT REQUEST: {request}
 
@@ -72,20 +71,84 @@ INSTRUCTIONS:
 
 REPORT:"""
     
+    data = build_context(stats, item_summary, logs, model_type="large", item_limit=15,  # Top 15 items
+                         reserved_tokens=estimate_tokens(prompt_template) + estimate_tokens(text))
     prompt = prompt_template.format(
-        total_sales=stats['total_sales'],
-        total_expenses=stats['total_expenses'],
-        net_income=stats['total_sales'] - stats['total_expenses'],
-        total_entries=stats['total_entries'],
-        action_breakdown=json.dumps(stats['by_action'], indent=2),
-        item_breakdown=json.dumps(item_breakdown[:15], indent=2),  # Top 15 items
-        logs_json_string=logs_json_string,
+        period=window['label'] if window else "all time",
+        stats=data['stats'],
+        items=data['items'],
+        logs=data['logs'],
         request=text
     )
 
-    # 4. Get report from LARGE model (granite-13b-chat-v2) for detailed output
+    return None, prompt
+
+
+@instrumented("workflow")
+def report_flow(text: str, user_id: str, context: Optional[Dict] = None) -> str:
+    """
+    Generates formatted reports from user's farm data.
+    Uses granite-13b-chat-v2 for detailed, comprehensive reports.
+    Reports are cached until the user's data changes (see result_cache.py).
+    
+    Args:
+        text: User's report request (e.g., "sales report for this month")
+        user_id: User identifier for data retrieval
+        context: Optional prefetched data (logs, stats, item_summary)
+        
+    Returns:
+        Formatted report with sections, totals, and summaries
+    """
+    key, version, cached = lookup(user_id, "REPORT", "large", text, context and context.get('data_version'))
+    if cached is not None:
+        return cached
+
+    message, prompt = _prepare(text, user_id, context)
+    if message is not None:
+        return message
+
+    # Get report from LARGE model (granite-13b-chat-v2) for detailed output
     llm = get_llm_instance("large")
     report = llm.invoke(prompt)
+    store(key, user_id, version, report)
     return report
 
 
+@instrumented("workflow")
+def report_flow_stream(text: str, user_id: str, context: Optional[Dict] = None) -> Iterator[str]:
+    """Streaming variant of report_flow: yields report tokens as they arrive."""
+    key, version, cached = lookup(user_id, "REPORT", "large", text, context and context.get('data_version'))
+    if cached is not None:
+        yield cached
+        return
+
+    message, prompt = _prepare(text, user_id, context)
+    if message is not None:
+        yield message
+        return
+    llm = get_llm_instance("large")
+    chunks = []
+    for chunk in llm.stream(prompt):
+        chunks.append(chunk)
+        yield chunk
+    store(key, user_id, version, "".join(chunks))  # Only reached if the stream completed
+
+
+@instrumented("workflow")
+async def areport_flow(text: str, user_id: str, context: Optional[Dict] = None) -> str:
+    """
+    Async variant of report_flow.
+    Data retrieval runs in a worker thread (one hop for all reads); the LLM call uses ainvoke.
+    """
+    key, version, cached = await asyncio.to_thread(
+        lookup, user_id, "REPORT", "large", text, context and context.get('data_version'))
+    if cached is not None:
+        return cached
+
+    message, prompt = await asyncio.to_thread(_prepare, text, user_id, context)
+    if message is not None:
+        return message
+    llm = get_llm_instance("large")
+    report = await llm.ainvoke(prompt)
+    await asyncio.to_thread(store, key, user_id, version, report)
+    return report
@@ -0,0 +1,105 @@
+"""
+Relevance Retrieval for QUERY Prompts
+Picks the log rows that matter to a question instead of just the most recent ones.
+Example: "who did I sell carrots to?" → BM25 top-k for "carrots" over item/note,
+restricted to sales → merged with the 5 most recent logs → prompt table.
+
+Ranking uses the per-user FTS5 index (db_storage.search_logs), which triggers
+update on every write, so there is no separate index to build, cache or refresh.
+"""
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from db_storage import read_logs, search_logs
+from workflows.query_planner import actions_in
+from metrics import register_stats
+
+RETRIEVAL_TOP_K = int(os.getenv("AGRI_RETRIEVAL_TOP_K", "15"))
+RETRIEVAL_RECENT = int(os.getenv("AGRI_RETRIEVAL_RECENT", "5"))
+
+# Question words and filler that carry no lexical signal for log rows
+_STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "as", "at", "be", "been", "by", "can",
+    "could", "did", "do", "does", "each", "ever", "for", "from", "get", "got", "had", "has", "have",
+    "how", "i", "if", "in", "into", "is", "it", "its", "me", "many", "much", "my", "of", "on", "or",
+    "our", "show", "so", "some", "tell", "than", "that", "the", "their", "them", "then", "there",
+    "these", "they", "this", "those", "to", "total", "us", "was", "we", "were", "what", "when",
+    "where", "which", "who", "whom", "why", "will", "with", "would", "you", "your",
+    "activity", "activities", "entries", "entry", "log", "logged", "logs", "time", "times",
+}
+
+_stats_lock = threading.Lock()
+_stats = {"retrievals": 0, "keyword_searches": 0, "relevant_rows": 0, "recent_rows": 0}
+
+
+def extract_keywords(text: str) -> List[str]:
+    """
+    Content words of a question: no stopwords, action verbs (they become an
+    action filter instead), numbers or one-letter words.
+    """
+    keywords = []
+    for word in re.findall(r"[a-z][a-z'\-]*", text.lower()):
+        word = word.strip("'-")
+        if len(word) < 2 or word in _STOPWORDS or actions_in(word) or word in keywords:
+            continue
+        keywords.append(word)
+    return keywords
+
+
+def retrieve_logs(user_id: str, question: str, recent_logs: Optional[Sequence[Dict]] = None,
+                  start: Optional[str] = None, end: Optional[str] = None,
+                  top_k: int = RETRIEVAL_TOP_K, recent: int = RETRIEVAL_RECENT) -> List[Dict]:
+    """
+    Selects the logs to show the LLM for a question.
+
+    Args:
+        user_id: User identifier
+        question: The user's question (time phrases already stripped, ideally)
+        recent_logs: Most recent logs if already loaded (e.g. prefetched); read otherwise
+        start: Optional inclusive ISO timestamp lower bound
+        end: Optional exclusive ISO timestamp upper bound
+        top_k: Max rows ranked by relevance
+        recent: Most recent rows always included for general context
+
+    Returns:
+        Relevant logs (best match first) followed by recent logs not already included
+    """
+    relevant: List[Dict] = []
+    keywords = extract_keywords(question)
+    if keywords and top_k > 0:
+        actions = actions_in(question)
+        query = " ".join(keywords)
+        relevant = search_logs(user_id, query, limit=top_k, actions=actions, match_any=True, start=start, end=end)
+        if not relevant and actions:
+            # The verb may not match how the entry was logged; retry across all actions
+            relevant = search_logs(user_id, query, limit=top_k, match_any=True, start=start, end=end)
+
+    if recent_logs is None:
+        recent_logs = read_logs(user_id=user_id, limit=recent, start=start, end=end) if recent > 0 else []
+
+    merged = []
+    seen = set()
+    for log in list(relevant) + list(recent_logs[:recent]):
+        if log["id"] in seen:
+            continue
+        seen.add(log["id"])
+        merged.append(log)
+
+    with _stats_lock:
+        _stats["retrievals"] += 1
+        _stats["keyword_searches"] += 1 if keywords else 0
+        _stats["relevant_rows"] += len(relevant)
+        _stats["recent_rows"] += len(merged) - len(relevant)
+    return merged
+
+
+def get_retrieval_stats() -> Dict:
+    """Returns retrieval counts and the average number of relevant rows per keyword search."""
+    with _stats_lock:
+        searches = _stats["keyword_searches"]
+        return {**_stats, "avg_relevant_rows": _stats["relevant_rows"] / searches if searches else 0.0}
+
+
+register_stats("retrieval", get_retrieval_stats, "QUERY context retrieval", gauges=("avg_relevant_rows",))
@@ -0,0 +1,48 @@
+"""
+Streaming Helpers
+Wraps workflow token streams to record time-to-first-token and total time
+(exported as agri_stream_first_token_seconds / agri_stream_seconds, see metrics.py).
+"""
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+from metrics import record_stream
+
+
+def timed_stream(chunks: Iterable[str], intent: str, started_at: Optional[float] = None,
+                 timing: Optional[Dict] = None) -> Iterator[str]:
+    """
+    Yields chunks unchanged while timing the stream.
+
+    Args:
+        chunks: Token/text chunks from a workflow stream
+        intent: Workflow label recorded with the timing
+        started_at: time.perf_counter() at request start (defaults to now),
+                    so time-to-first-token can include classification
+        timing: Optional dict filled in with the results when the stream ends
+
+    Records: intent, ttft_s (time to first non-empty chunk), total_s, chunks, chars
+    """
+    started_at = time.perf_counter() if started_at is None else started_at
+    first_at = None
+    count = 0
+    chars = 0
+    try:
+        for chunk in chunks:
+            if chunk and first_at is None:
+                first_at = time.perf_counter()
+            count += 1
+            chars += len(chunk)
+            yield chunk
+    finally:
+        finished_at = time.perf_counter()
+        record = {
+            "intent": intent,
+            "ttft_s": (first_at - started_at) if first_at is not None else None,
+            "total_s": finished_at - started_at,
+            "chunks": count,
+            "chars": chars,
+        }
+        record_stream(intent, record["ttft_s"], record["total_s"])
+        if timing is not None:
+            timing.update(record)